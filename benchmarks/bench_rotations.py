@@ -0,0 +1,15 @@
+# (C) 2020 University of Colorado AES-CCAR-SEDA (Space Environment Data Analysis) Group
+# Written by Liam M. Kilcommons
+from geospacepy import rotations
+from benchmarks.common import SIZES,random_state,ecef_positions
+
+class Rot(object):
+    params = [SIZES,[0,1,2]]
+    param_names = ['n','axis']
+
+    def setup(self,n,axis):
+        self.angles = random_state().uniform(-3.,3.,n)
+        self.vecs = ecef_positions(n)
+
+    def time_rot(self,n,axis):
+        rotations.rot(self.angles,axis,self.vecs)
@@ -0,0 +1,77 @@
+# (C) 2020 University of Colorado AES-CCAR-SEDA (Space Environment Data Analysis) Group
+# Written by Liam M. Kilcommons
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from geospacepy import satplottools
+from benchmarks.common import (SIZES,random_state,
+                                skip_if_python_loop_too_large)
+
+def _polar_pass(n):
+    """Times (second of day), latitudes and longitudes of a 
+    simple polar pass (one point per second, wrapping around the pole)"""
+    t = np.arange(n,dtype=float)
+    lats = 60.+25.*np.sin(np.pi*np.mod(t,3000.)/3000.)
+    lons = np.mod(-60.+120.*np.mod(t,3000.)/3000.,360.)-180.
+    return np.mod(t,86400.),lats,lons
+
+class Sathat(object):
+    params = [SIZES]
+    param_names = ['n']
+
+    def setup(self,n):
+        self.ut,lats,lons = _polar_pass(n)
+        self.pos = np.column_stack((lats,lons))
+
+    def time_sathat(self,n):
+        satplottools.sathat(self.ut,self.pos)
+
+class PolarPlots(object):
+    params = [SIZES]
+    param_names = ['n']
+
+    def setup(self,n):
+        skip_if_python_loop_too_large(n)
+        ut,self.lats,lons = _polar_pass(n)
+        self.lts = np.mod(lons/15.,24.)
+        self.values = random_state().normal(size=n)
+        self.fig = plt.figure()
+        self.ax = self.fig.add_subplot(111)
+
+    def teardown(self,n):
+        plt.close(self.fig)
+
+    def time_hairplot(self,n):
+        satplottools.hairplot(self.ax,self.lats,self.lts,self.values,'N')
+
+    def time_crosstrackplot(self,n):
+        satplottools.crosstrackplot(self.ax,self.lats,self.lts,
+                                    self.values,'N')
+
+class PolarBinPlot(object):
+    params = [SIZES]
+    param_names = ['n']
+
+    def setup(self,n):
+        skip_if_python_loop_too_large(n)
+        #One bin per element (polarbinplot creates one patch per bin)
+        nlats = int(np.sqrt(n/24))+1
+        nlts = n//nlats
+        lat_edges = np.linspace(50.,90.,nlats+1)
+        lt_edges = np.linspace(0.,24.,nlts+1)
+        lat_starts,lt_starts = np.meshgrid(lat_edges[:-1],lt_edges[:-1],
+                                           indexing='ij')
+        lat_ends,lt_ends = np.meshgrid(lat_edges[1:],lt_edges[1:],
+                                       indexing='ij')
+        self.bin_edges = np.column_stack((lat_starts.ravel(),lat_ends.ravel(),
+                                          lt_starts.ravel(),lt_ends.ravel()))
+        self.bin_values = random_state().normal(size=len(self.bin_edges))
+        self.fig = plt.figure()
+        self.ax = self.fig.add_subplot(111)
+
+    def teardown(self,n):
+        plt.close(self.fig)
+
+    def time_polarbinplot(self,n):
+        satplottools.polarbinplot(self.ax,self.bin_edges,self.bin_values)
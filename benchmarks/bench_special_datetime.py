@@ -0,0 +1,31 @@
+# (C) 2020 University of Colorado AES-CCAR-SEDA (Space Environment Data Analysis) Group
+# Written by Liam M. Kilcommons
+import numpy as np
+from geospacepy import special_datetime
+from benchmarks.common import (SIZES,datetimes,
+                                skip_if_python_loop_too_large)
+
+class DatetimeArr2JD(object):
+    params = [SIZES]
+    param_names = ['n']
+
+    def setup(self,n):
+        self.dts = datetimes(n)
+
+    def time_datetimearr2jd(self,n):
+        special_datetime.datetimearr2jd(self.dts)
+
+class FastMatchTimes(object):
+    params = [SIZES]
+    param_names = ['n']
+
+    def setup(self,n):
+        skip_if_python_loop_too_large(n)
+        self.primary_dts = datetimes(n)
+        #Secondary times offset by a fraction of the cadence
+        self.dts = self.primary_dts+np.timedelta64(300,'ms').astype(object)
+
+    def time_fastMatchTimes(self,n):
+        special_datetime.fastMatchTimes(self.primary_dts,self.dts,
+                                        fail_on_duplicates=False,
+                                        allow_duplicates=True)
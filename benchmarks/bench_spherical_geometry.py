@@ -0,0 +1,112 @@
+# (C) 2020 University of Colorado AES-CCAR-SEDA (Space Environment Data Analysis) Group
+# Written by Liam M. Kilcommons
+import numpy as np
+from geospacepy import spherical_geometry,conjunctions
+from benchmarks.common import SIZES,lats_lons
+
+class GreatCircleDistance(object):
+    params = [SIZES,['lawofcosines','haversine']]
+    param_names = ['n','algorithm']
+
+    def setup(self,n,algorithm):
+        self.lats1,self.lons1 = lats_lons(n)
+        self.lats2,self.lons2 = self.lats1[::-1].copy(),self.lons1[::-1].copy()
+
+    def time_great_circle_distance(self,n,algorithm):
+        spherical_geometry.great_circle_distance(self.lats1,self.lons1,
+                                                 self.lats2,self.lons2,
+                                                 'deg',algorithm=algorithm)
+
+class GridSurfaceIntegral(object):
+    params = [SIZES]
+    param_names = ['n']
+
+    def setup(self,n):
+        #Approximately square grid with n points
+        nlats = int(np.sqrt(n/2))
+        nlons = n//nlats
+        lats = np.linspace(-89.,89.,nlats)
+        lons = np.linspace(-180.,180.,nlons,endpoint=False)
+        self.grid_lats,self.grid_lons = np.meshgrid(lats,lons,indexing='ij')
+        self.grid_values = np.cos(np.radians(self.grid_lats))
+
+    def time_grid_surface_integral(self,n):
+        spherical_geometry.grid_surface_integral(self.grid_lats,
+                                                 self.grid_lons,
+                                                 self.grid_values,
+                                                 6371.2e3,'deg')
+
+class GreatCircleDistanceMatrix(object):
+    """Distances between a track of n/100 locations and 100 stations
+    (n distances in total)"""
+    params = [SIZES,['float64','float32'],[None,.1]]
+    param_names = ['n','dtype','max_distance']
+
+    def setup(self,n,dtype,max_distance):
+        self.track_lats,self.track_lons = lats_lons(n//100)
+        self.station_lats,self.station_lons = lats_lons(100)
+
+    def time_great_circle_distance_matrix(self,n,dtype,max_distance):
+        spherical_geometry.great_circle_distance_matrix(self.track_lats,
+                                                        self.track_lons,
+                                                        self.station_lats,
+                                                        self.station_lons,
+                                                        'deg',
+                                                        dtype=dtype,
+                                                        max_distance=max_distance)
+
+class GreatCircleDistanceBroadcast(object):
+    """The same distances as GreatCircleDistanceMatrix by broadcasting 
+    great_circle_distance"""
+    params = [SIZES]
+    param_names = ['n']
+
+    def setup(self,n):
+        self.track_lats,self.track_lons = lats_lons(n//100)
+        self.station_lats,self.station_lons = lats_lons(100)
+
+    def time_broadcast_great_circle_distance(self,n):
+        spherical_geometry.great_circle_distance(self.track_lats.reshape(-1,1),
+                                                 self.track_lons.reshape(-1,1),
+                                                 self.station_lats.reshape(1,-1),
+                                                 self.station_lons.reshape(1,-1),
+                                                 'deg',algorithm='haversine')
+
+class SphericalIndexQueries(object):
+    """Building an index of n locations, and queries of 1000
+    locations against it"""
+    params = [SIZES]
+    param_names = ['n']
+
+    def setup(self,n):
+        lats,lons = lats_lons(n)
+        self.index = spherical_geometry.SphericalIndex(lats,lons)
+        self.query_lats,self.query_lons = lats_lons(1000)
+
+    def time_build_index(self,n):
+        self.index.rebuild()
+
+    def time_query_nearest(self,n):
+        self.index.query(self.query_lats,self.query_lons,k=1)
+
+    def time_query_within_distance(self,n):
+        self.index.query_within_distance(self.query_lats,self.query_lons,.01)
+
+class FindConjunctions(object):
+    """Conjunctions of two tracks of n samples (one per second)"""
+    params = [SIZES]
+    param_names = ['n']
+
+    def setup(self,n):
+        self.times = (np.datetime64('2010-05-29T00:00:00','us')
+                      +np.arange(n)*np.timedelta64(1,'s'))
+        phases = 2*np.pi*np.arange(n)/6000.
+        self.lats1 = np.degrees(np.arcsin(.99*np.sin(phases)))
+        self.lons1 = np.mod(.3*np.degrees(phases),360.)-180.
+        self.lats2 = np.degrees(np.arcsin(.95*np.sin(1.02*phases)))
+        self.lons2 = np.mod(.31*np.degrees(phases)+40.,360.)-180.
+
+    def time_find_conjunctions(self,n):
+        conjunctions.find_conjunctions(self.times,self.lats1,self.lons1,
+                                       self.times,self.lats2,self.lons2,
+                                       np.radians(2.))
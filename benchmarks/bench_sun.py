@@ -0,0 +1,15 @@
+# (C) 2020 University of Colorado AES-CCAR-SEDA (Space Environment Data Analysis) Group
+# Written by Liam M. Kilcommons
+from geospacepy import sun
+from benchmarks.common import SIZES,jds,lats_lons
+
+class SolarZenithAngle(object):
+    params = [SIZES]
+    param_names = ['n']
+
+    def setup(self,n):
+        self.jds = jds(n)
+        self.lats,self.lons = lats_lons(n)
+
+    def time_solar_zenith_angle(self,n):
+        sun.solar_zenith_angle(self.jds,self.lats,self.lons)
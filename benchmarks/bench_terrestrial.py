@@ -0,0 +1,87 @@
+# (C) 2020 University of Colorado AES-CCAR-SEDA (Space Environment Data Analysis) Group
+# Written by Liam M. Kilcommons
+from geospacepy import terrestrial_spherical,terrestrial_ellipsoidal
+from geospacepy.array_management import ArrayCache
+from benchmarks.common import SIZES,jds,lats_lons,ecef_positions
+
+class ECEF2ECI(object):
+    params = [SIZES]
+    param_names = ['n']
+
+    def setup(self,n):
+        self.R_ECEF = ecef_positions(n)
+        self.jds = jds(n)
+
+    def time_ecef2eci(self,n):
+        terrestrial_spherical.ecef2eci(self.R_ECEF,self.jds)
+
+class ECEF2ENU(object):
+    params = [SIZES]
+    param_names = ['n']
+
+    def setup(self,n):
+        self.R_ECEF = ecef_positions(n)
+        self.lats,self.lons = lats_lons(n)
+
+    def time_ecef2enu(self,n):
+        terrestrial_spherical.ecef2enu(self.R_ECEF,self.lats,self.lons)
+
+class ECEFCart2Geodetic(object):
+    params = [SIZES]
+    param_names = ['n']
+
+    def setup(self,n):
+        self.R_ECEF = ecef_positions(n)
+
+    def time_ecef_cart2geodetic(self,n):
+        terrestrial_ellipsoidal.ecef_cart2geodetic(self.R_ECEF)
+
+class ECIECEFTransformThreeArrays(object):
+    """Transforming three arrays (e.g. position, velocity, field)
+    for the same times with a cached transform"""
+    params = [SIZES]
+    param_names = ['n']
+
+    def setup(self,n):
+        self.R_ECEF = ecef_positions(n)
+        self.jds = jds(n)
+        self.transforms = ArrayCache(maxsize=1)
+
+    def time_cached_transform(self,n):
+        transform = terrestrial_spherical.ECIECEFTransform.cached(self.jds,
+                                                                  self.transforms)
+        transform.to_eci(self.R_ECEF,self.R_ECEF,self.R_ECEF)
+
+class ECEFCart2GeodeticClosedForm(object):
+    params = [SIZES]
+    param_names = ['n']
+
+    def setup(self,n):
+        self.R_ECEF = ecef_positions(n)
+
+    def time_ecef_cart2geodetic_vermeille(self,n):
+        terrestrial_ellipsoidal.ecef_cart2geodetic(self.R_ECEF,
+                                                   method='vermeille')
+
+class Geodetic2ECEF(object):
+    params = [SIZES]
+    param_names = ['n']
+
+    def setup(self,n):
+        self.lats,self.lons = lats_lons(n)
+
+    def time_geodetic2ecef(self,n):
+        terrestrial_ellipsoidal.geodetic2ecef(self.lats,self.lons,8.5e5)
+
+class ECEFCart2GeodeticInChunks(object):
+    params = [SIZES,[1,4]]
+    param_names = ['n','workers']
+
+    def setup(self,n,workers):
+        self.R_ECEF = ecef_positions(n)
+
+    def time_ecef_cart2geodetic_vermeille_in_chunks(self,n,workers):
+        terrestrial_ellipsoidal.ecef_cart2geodetic(self.R_ECEF,
+                                                   method='vermeille',
+                                                   chunksize=65536,
+                                                   workers=workers)
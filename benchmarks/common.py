@@ -0,0 +1,44 @@
+# (C) 2020 University of Colorado AES-CCAR-SEDA (Space Environment Data Analysis) Group
+# Written by Liam M. Kilcommons
+"""Shared sizes and input data for the benchmarks"""
+import datetime
+import numpy as np
+
+#Number of elements (times, positions, etc.) used by each benchmark
+SIZES = [1000,100000,10000000]
+
+#Largest size used for benchmarks of functions which loop in Python
+#(or draw with matplotlib), larger sizes are skipped
+MAX_PYTHON_LOOP_SIZE = 100000
+
+def skip_if_python_loop_too_large(n):
+    """Raising NotImplementedError in setup tells asv (and run.py)
+    to skip the benchmark for this parameter"""
+    if n > MAX_PYTHON_LOOP_SIZE:
+        raise NotImplementedError('Skipping, {} elements is too '.format(n)
+                                  +'many for a Python loop')
+
+def random_state():
+    return np.random.RandomState(1234)
+
+def datetimes(n,cadence_seconds=1.):
+    """n Python datetimes starting at 2010-05-29 with a fixed cadence"""
+    dt64s = (np.datetime64('2010-05-29T00:00:00','us')
+             +(np.arange(n)*cadence_seconds*1e6).astype('timedelta64[us]'))
+    return dt64s.astype(object)
+
+def jds(n):
+    """n julian dates (one per second) starting on 2010-05-29"""
+    return 2455345.5+np.arange(n)/86400.
+
+def lats_lons(n):
+    rs = random_state()
+    return rs.uniform(-90.,90.,n),rs.uniform(-180.,180.,n)
+
+def ecef_positions(n,r=6378137.+8.5e5):
+    """n random positions at constant radius (default 850 km altitude)"""
+    lats,lons = lats_lons(n)
+    lats,lons = np.radians(lats),np.radians(lons)
+    return r*np.column_stack((np.cos(lats)*np.cos(lons),
+                              np.cos(lats)*np.sin(lons),
+                              np.sin(lats)))
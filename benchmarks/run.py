@@ -0,0 +1,206 @@
+# (C) 2020 University of Colorado AES-CCAR-SEDA (Space Environment Data Analysis) Group
+# Written by Liam M. Kilcommons
+"""Run the benchmarks without asv (no network access or virtualenvs needed)
+and append the results to a JSON lines history file, so that timings
+can be compared between releases. 
+
+The benchmarks follow asv's conventions (classes with params, param_names,
+setup, teardown and time_* methods) so they can also be run with
+asv run (see asv.conf.json in the repository root).
+
+Usage
+-----
+
+python -m benchmarks.run [--filter REGEX] [--sizes N [N ...]]
+                         [--history FILE] [--compare VERSION]
+"""
+import os
+import re
+import sys
+import json
+import glob
+import timeit
+import platform
+import argparse
+import datetime
+import importlib
+import itertools
+import subprocess
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_HISTORY_FILE = os.path.join(BENCHMARK_DIR,'results','history.jsonl')
+
+def _benchmark_classes():
+    """Find the (module_name,class) of every benchmark class
+    (a class with at least one time_* method) in the bench_*.py modules"""
+    classes = []
+    for filename in sorted(glob.glob(os.path.join(BENCHMARK_DIR,'bench_*.py'))):
+        module_name = os.path.splitext(os.path.basename(filename))[0]
+        module = importlib.import_module('benchmarks.'+module_name)
+        for name in sorted(dir(module)):
+            obj = getattr(module,name)
+            if isinstance(obj,type) and obj.__module__ == module.__name__ \
+                    and _timing_methods(obj):
+                classes.append((module_name,obj))
+    return classes
+
+def _timing_methods(cls):
+    return [name for name in sorted(dir(cls)) if name.startswith('time_')]
+
+def _parameter_combinations(cls,sizes=None):
+    params = getattr(cls,'params',[])
+    param_names = getattr(cls,'param_names',[])
+    if params and not isinstance(params[0],list):
+        params = [params]
+    params = [list(values) for values in params]
+    if sizes is not None and 'n' in param_names:
+        params[param_names.index('n')] = sizes
+    return list(itertools.product(*params))
+
+def _time_call(func,repeat,min_run_time=.2):
+    """Time func like timeit's command line interface, calling it enough
+    times per repeat to take at least min_run_time seconds (or once, if
+    a single call is slower than that). Returns times per call in seconds"""
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_run_time or number >= 1000:
+            break
+        number *= 10
+    times = [elapsed]+timer.repeat(repeat=repeat-1,number=number)
+    return [t/number for t in times]
+
+def run_benchmarks(name_filter=None,sizes=None,repeat=3,verbose=True):
+    """Run the benchmarks
+
+    Parameters
+    ----------
+    name_filter : str, optional
+        Regular expression, only benchmarks with matching names 
+        (module.Class.time_method) are run
+    sizes : list, optional
+        Override the number of elements (the 'n' parameter)
+    repeat : int, optional
+        Number of timing repeats for each benchmark
+
+    Returns
+    -------
+    results : dict
+        Keyed by benchmark name, values are lists of dicts with keys
+        params, min, median (seconds per call) or skipped (True)
+    """
+    results = {}
+    for module_name,cls in _benchmark_classes():
+        param_names = getattr(cls,'param_names',[])
+        for method_name in _timing_methods(cls):
+            name = '.'.join([module_name,cls.__name__,method_name])
+            if name_filter is not None and not re.search(name_filter,name):
+                continue
+            results[name] = []
+            for params in _parameter_combinations(cls,sizes):
+                result = {'params':dict(zip(param_names,params))}
+                bench = cls()
+                try:
+                    if hasattr(bench,'setup'):
+                        bench.setup(*params)
+                except NotImplementedError:
+                    result['skipped'] = True
+                    results[name].append(result)
+                    continue
+                method = getattr(bench,method_name)
+                try:
+                    times = _time_call(lambda : method(*params),repeat)
+                finally:
+                    if hasattr(bench,'teardown'):
+                        bench.teardown(*params)
+                result['min'] = float(np.min(times))
+                result['median'] = float(np.median(times))
+                results[name].append(result)
+                if verbose:
+                    print('{} {}: {:.3e} s'.format(name,result['params'],
+                                                   result['median']))
+    return results
+
+def _git_commit():
+    try:
+        output = subprocess.check_output(['git','rev-parse','HEAD'],
+                                         cwd=BENCHMARK_DIR,
+                                         stderr=subprocess.DEVNULL)
+        return output.decode().strip()
+    except (OSError,subprocess.CalledProcessError):
+        return None
+
+def _package_version():
+    try:
+        from importlib import metadata
+        return metadata.version('geospacepy')
+    except Exception:
+        return None
+
+def history_record(results):
+    """Wrap benchmark results with the information needed to 
+    compare them later (versions, commit, machine)"""
+    return {'timestamp':datetime.datetime.utcnow().isoformat(),
+            'version':_package_version(),
+            'commit':_git_commit(),
+            'python':platform.python_version(),
+            'numpy':np.__version__,
+            'machine':platform.machine(),
+            'processor':platform.processor(),
+            'results':results}
+
+def append_to_history(record,history_file=DEFAULT_HISTORY_FILE):
+    history_dir = os.path.dirname(history_file)
+    if history_dir and not os.path.exists(history_dir):
+        os.makedirs(history_dir)
+    with open(history_file,'a') as f:
+        f.write(json.dumps(record)+'\n')
+
+def read_history(history_file=DEFAULT_HISTORY_FILE):
+    """Read all records from a history file (oldest first)"""
+    with open(history_file,'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def compare(reference,record):
+    """Print the ratio of the median times of record to those 
+    of reference (a ratio > 1 means record is slower)"""
+    for name,results in sorted(record['results'].items()):
+        reference_results = reference['results'].get(name,[])
+        for result in results:
+            matches = [r for r in reference_results 
+                       if r['params'] == result['params']]
+            if not matches or 'median' not in result \
+                    or 'median' not in matches[0]:
+                continue
+            ratio = result['median']/matches[0]['median']
+            print('{:6.2f}x {} {}'.format(ratio,name,result['params']))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--filter',default=None,
+                        help='Regular expression to select benchmarks')
+    parser.add_argument('--sizes',type=int,nargs='+',default=None,
+                        help='Override the number of elements')
+    parser.add_argument('--repeat',type=int,default=3)
+    parser.add_argument('--history',default=DEFAULT_HISTORY_FILE,
+                        help='JSON lines file results are appended to')
+    parser.add_argument('--compare',default=None,metavar='VERSION',
+                        help=('Compare to the latest result in the history'
+                              +' with this version or commit'))
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.filter,args.sizes,args.repeat)
+    record = history_record(results)
+    if args.compare is not None:
+        references = [r for r in read_history(args.history)
+                      if args.compare in (r['version'],r['commit'])]
+        if not references:
+            print('No results for {} in {}'.format(args.compare,args.history))
+        else:
+            compare(references[-1],record)
+    append_to_history(record,args.history)
+
+if __name__ == '__main__':
+    main()
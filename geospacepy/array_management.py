@@ -3,6 +3,11 @@
 import numpy as np
 import inspect
 import functools
+import collections
+import contextlib
+import contextvars
+import hashlib
+import concurrent.futures
 
 def is_number_or_len_one_array(number):
     """Deterimine if a given value is either, one, a python numerical primative
@@ -33,25 +38,89 @@ def is_number_or_len_one_array(number):
         else:
             return False
 
+#How much checking the decorators in this module do on each call,
+#see set_validation_mode. A context variable, so each thread (and each
+#asyncio task) has its own mode
+_VALIDATION_MODES = ('strict','fast','off')
+_validation_mode = contextvars.ContextVar('validation_mode',default='strict')
+
+def _set_validation_mode(mode):
+    """Set the validation mode, returning the token which
+    restores the previous mode"""
+    if mode not in _VALIDATION_MODES:
+        raise ValueError(('Invalid validation mode {},'.format(mode)
+                          +' valid values are {}'.format(_VALIDATION_MODES)))
+    return _validation_mode.set(mode)
+
+def set_validation_mode(mode):
+    """Set how thoroughly decorated functions check their inputs
+
+    PARAMETERS
+    ----------
+
+        mode : str
+            'strict' (default) checks types and shapes of inputs with
+            informative errors, 'fast' only checks the shapes of 
+            3-component vector inputs, and 'off' does no checks (invalid
+            inputs will produce errors from numpy, or wrong results).
+            Inputs are broadcast to a common shape in all modes.
+
+    Notes
+    -----
+
+        The mode is set for the current thread only. Chunks processed
+        on worker threads (see ProcessInputsInChunks) use the mode of
+        the thread which called the decorated function.
+    """
+    _set_validation_mode(mode)
+
+def get_validation_mode():
+    """The current validation mode (see set_validation_mode)"""
+    return _validation_mode.get()
+
+@contextlib.contextmanager
+def validation_mode(mode):
+    """Context manager which sets the validation mode 
+    (see set_validation_mode) and restores the previous mode on exit
+
+    Example
+    -------
+
+        with validation_mode('fast'):
+            for R_ECEF in passes:
+                ecef2enu(R_ECEF,lats,lons)
+    """
+    token = _set_validation_mode(mode)
+    try:
+        yield
+    finally:
+        _validation_mode.reset(token)
+
+def _broadcast_shape(arg):
+    """Shape of an input for BroadcastLenOneInputsToMatchArrayInputs
+    (single values are shape (1,))"""
+    try:
+        if arg.size == 1:
+            return (1,)
+        return arg.shape
+    except AttributeError:
+        if isinstance(arg,(int,float)):
+            return (1,)
+        raise
+
 def BroadcastLenOneInputsToMatchArrayInputs(wrapped_func):
     """Decorator which broadcasts any single valued input 
     (numerical primative or array of length 1) into a numpy array
     which matches the size of the other inputs before passing
-    the inputs to the wrapped function"""
+    the inputs to the wrapped function. Broadcast inputs are read-only
+    views (np.broadcast_to), so no memory is allocated for them"""
     @functools.wraps(wrapped_func)
     def wrapper(*args,**kwargs):
-        args_shapes = []
-        unique_shapes = []
-        for arg in args:
-            if is_number_or_len_one_array(arg):
-                arg_shape = (1,)
-            else:
-                arg_shape = arg.shape
-            args_shapes.append(arg_shape)
-            if arg_shape not in unique_shapes:
-                unique_shapes.append(arg_shape)
-
-        unique_nonsingle_shapes = [shape for shape in unique_shapes if shape!=(1,)]
+        args_shapes = [_broadcast_shape(arg) for arg in args]
+        unique_nonsingle_shapes = []
+        for arg_shape in args_shapes:
+            if arg_shape != (1,) and arg_shape not in unique_nonsingle_shapes:
+                unique_nonsingle_shapes.append(arg_shape)
 
         if len(unique_nonsingle_shapes)>1:
             raise ValueError(('Unable to broadcast inputs '
@@ -63,16 +132,240 @@ def BroadcastLenOneInputsToMatchArrayInputs(wrapped_func):
         else:
             common_shape = unique_nonsingle_shapes[0]
             
+        #Single values take the floating point type of the array inputs
+        #(so they don't promote float32 arrays to float64)
+        fill_dtype = result_float_dtype(*[arg for arg,shape 
+                                          in zip(args,args_shapes)
+                                          if shape != (1,)])
         broadcasted_args = []
         for arg,shape in zip(args,args_shapes):
             if shape == common_shape:
                 broadcasted_args.append(arg)
             else:
-                broadcasted_args.append(np.ones(common_shape)*arg)
+                #Single values (as float arrays, like np.ones(shape)*arg)
+                single_value = np.asarray(arg).reshape(())
+                if single_value.dtype.kind in 'biu' or fill_dtype == np.float32:
+                    single_value = single_value.astype(fill_dtype)
+                broadcasted_args.append(np.broadcast_to(single_value,
+                                                        common_shape))
         
         return wrapped_func(*broadcasted_args,**kwargs)
     return wrapper
 
+#Default number of samples processed at once by ProcessInputsInChunks
+#(small enough that the temporaries of one chunk stay in the CPU cache)
+DEFAULT_CHUNKSIZE = 65536
+
+_EXECUTORS = {'thread':concurrent.futures.ThreadPoolExecutor,
+              'process':concurrent.futures.ProcessPoolExecutor}
+
+def _iter_leaf_inputs(inputs):
+    for inpt in inputs:
+        if isinstance(inpt,tuple):
+            for leaf in _iter_leaf_inputs(inpt):
+                yield leaf
+        else:
+            yield inpt
+
+def _is_sample_array(inpt):
+    """Is an input an array (or array-like, such as a 
+    special_datetime.Timeline) of more than one sample"""
+    shape = getattr(inpt,'shape',None)
+    return (hasattr(inpt,'__getitem__') and shape is not None 
+            and len(shape) >= 1 and getattr(inpt,'size',0) > 1)
+
+def _sample_count(inputs):
+    """Number of samples (length along axis 0) of the largest array input,
+    or None if there are no array inputs"""
+    lengths = [inpt.shape[0] for inpt in _iter_leaf_inputs(inputs)
+               if _is_sample_array(inpt)]
+    return max(lengths) if lengths else None
+
+def _take_chunk(inpt,n_samples,start,stop):
+    """Samples start to stop of an input, inputs which are not arrays
+    of n_samples samples (single values, settings) are unchanged"""
+    if isinstance(inpt,tuple):
+        return tuple([_take_chunk(item,n_samples,start,stop) for item in inpt])
+    if _is_sample_array(inpt) and inpt.shape[0] == n_samples:
+        return inpt[start:stop]
+    return inpt
+
+def _chunk_bounds(n_samples,chunksize,workers):
+    if chunksize is None:
+        #Enough chunks to keep every worker busy
+        chunksize = min(DEFAULT_CHUNKSIZE,-(-n_samples//workers))
+    if chunksize < 1:
+        raise ValueError('chunksize must be a positive integer')
+    return [(start,min(start+chunksize,n_samples)) 
+            for start in range(0,n_samples,chunksize)]
+
+def _allocate_chunked_outputs(out,first_results,n_samples):
+    """Arrays for the results for all samples, shaped like the results 
+    for the first chunk (or the arrays passed as out=, validated)"""
+    shapes = [(n_samples,)+np.shape(result)[1:] for result in first_results]
+    if out is None:
+        return tuple([np.empty(shape,dtype=np.asarray(result).dtype)
+                      for shape,result in zip(shapes,first_results)])
+    if isinstance(out,np.ndarray):
+        out = (out,)
+    if len(out) != len(first_results):
+        raise ValueError(('{} output arrays are required'.format(len(first_results))
+                          +' not {}'.format(len(out))))
+    return tuple([prepare_output(o,shape,None) for o,shape in zip(out,shapes)])
+
+def _accepts_out(func):
+    try:
+        return 'out' in inspect.signature(func).parameters
+    except (TypeError,ValueError):
+        return False
+
+def _validate_chunked_out(out,n_samples):
+    """Output arrays passed as out= (an array or a tuple of arrays), 
+    which must have a row for each sample"""
+    outputs = out if isinstance(out,tuple) else (out,)
+    for output in outputs:
+        if not isinstance(output,np.ndarray) or output.ndim == 0 \
+                or output.shape[0] != n_samples:
+            raise ValueError(('Output arrays must have {} '.format(n_samples)
+                              +'rows (one for each sample), not '
+                              +'{}'.format(np.shape(output))))
+    return outputs
+
+def _chunk_views(outputs,start,stop):
+    """Rows start to stop of each output array, passed to the
+    wrapped function as out="""
+    return tuple([output[start:stop] for output in outputs])
+
+def _store_chunk(outputs,results,start,stop,views=None):
+    for i_output,(output,result) in enumerate(zip(outputs,results)):
+        if views is not None and result is views[i_output]:
+            #The function wrote the chunk directly into the output
+            continue
+        if np.ndim(result) == 0 or np.shape(result)[0] != stop-start:
+            raise ValueError(('Function result of shape {} '.format(np.shape(result))
+                              +'for {} samples, only functions '.format(stop-start)
+                              +'which return a value for each sample can'
+                              +' be processed in chunks'))
+        output[start:stop] = result
+
+def _run_in_chunks(func,args,kwargs,chunksize,workers,executor):
+    """Call func on chunks of the samples of its array inputs and
+    store the results in arrays for all samples (see ProcessInputsInChunks)"""
+    if executor not in _EXECUTORS:
+        raise ValueError(('Invalid executor {},'.format(executor)
+                          +' valid values are {}'.format(list(_EXECUTORS))))
+    workers = 1 if workers is None else workers
+    if workers < 1:
+        raise ValueError('workers must be a positive integer')
+    out = kwargs.pop('out',None)
+    n_samples = _sample_count(list(args)+list(kwargs.values()))
+    if n_samples is None:
+        if out is not None:
+            kwargs['out'] = out
+        return func(*args,**kwargs)
+
+    def chunk_inputs(start,stop):
+        chunk_args = [_take_chunk(arg,n_samples,start,stop) for arg in args]
+        chunk_kwargs = {name:_take_chunk(value,n_samples,start,stop) 
+                        for name,value in kwargs.items()}
+        return chunk_args,chunk_kwargs
+
+    def as_tuple(results):
+        return results if isinstance(results,tuple) else (results,)
+
+    bounds = _chunk_bounds(n_samples,chunksize,workers)
+    #Functions which accept out= write each chunk directly into 
+    #views of the outputs (as long as the outputs are floating point, 
+    #which out= requires)
+    write_to_views = _accepts_out(func)
+    if out is not None and write_to_views:
+        outputs = _validate_chunked_out(out,n_samples)
+        returns_tuple = isinstance(out,tuple)
+        remaining_bounds = bounds
+    else:
+        #The first chunk determines the number, type and shape of the outputs
+        chunk_args,chunk_kwargs = chunk_inputs(*bounds[0])
+        first_results = func(*chunk_args,**chunk_kwargs)
+        returns_tuple = isinstance(first_results,tuple)
+        outputs = _allocate_chunked_outputs(out,as_tuple(first_results),n_samples)
+        _store_chunk(outputs,as_tuple(first_results),*bounds[0])
+        remaining_bounds = bounds[1:]
+        write_to_views = write_to_views and all([output.dtype.kind == 'f'
+                                                 for output in outputs])
+
+    def process_chunk(start,stop):
+        chunk_args,chunk_kwargs = chunk_inputs(start,stop)
+        views = None
+        if write_to_views:
+            views = _chunk_views(outputs,start,stop)
+            chunk_kwargs['out'] = views if returns_tuple else views[0]
+        _store_chunk(outputs,as_tuple(func(*chunk_args,**chunk_kwargs)),
+                     start,stop,views)
+
+    if workers == 1 or len(remaining_bounds) <= 1:
+        for start,stop in remaining_bounds:
+            process_chunk(start,stop)
+    elif executor == 'thread':
+        #Numpy releases the GIL in ufuncs, so threads run in parallel
+        #and each writes its chunk directly into the outputs. Each chunk
+        #runs in a copy of the caller's context (validation mode)
+        with _EXECUTORS[executor](max_workers=workers) as pool:
+            futures = [pool.submit(contextvars.copy_context().run,
+                                   process_chunk,start,stop)
+                       for start,stop in remaining_bounds]
+            for future in futures:
+                future.result()
+    else:
+        #Chunks of the inputs are copied to the worker processes
+        #and the results copied back
+        with _EXECUTORS[executor](max_workers=workers) as pool:
+            futures = {}
+            for start,stop in remaining_bounds:
+                chunk_args,chunk_kwargs = chunk_inputs(start,stop)
+                futures[pool.submit(func,*chunk_args,**chunk_kwargs)] = (start,stop)
+            for future in concurrent.futures.as_completed(futures):
+                _store_chunk(outputs,as_tuple(future.result()),*futures[future])
+    return outputs if returns_tuple else outputs[0]
+
+def ProcessInputsInChunks(wrapped_func):
+    """Decorator which lets the caller of the wrapped function process
+    large arrays in chunks of samples (along axis 0), optionally on
+    several threads or processes, by passing the keyword arguments:
+
+        chunksize : int, optional
+            Number of samples in each chunk (default DEFAULT_CHUNKSIZE, 
+            or fewer if needed to give each worker a chunk)
+        workers : int, optional
+            Number of threads or processes which process chunks (default 1,
+            the chunks are processed one after the other)
+        executor : str, optional
+            'thread' (default) or 'process'. Numpy releases the GIL in 
+            most array operations, so threads are usually the better 
+            choice, processes must copy the inputs and results between
+            processes
+
+    If neither chunksize or workers are passed the wrapped function is
+    called as usual. Inputs with the same number of samples as the largest
+    array input (including the parts of tuples, like two-part julian dates)
+    are split into chunks, other inputs are passed unchanged to each chunk.
+    The results are written into arrays for all samples which are 
+    allocated once (or passed as out=). Functions which accept out= are 
+    passed views of the rows of these arrays for each chunk, so they 
+    write each chunk directly into the results.
+
+    This decorator must be the outermost decorator of the wrapped 
+    function, so that the other decorators (e.g. input checks and 
+    broadcasting) are applied to each chunk.
+    """
+    @functools.wraps(wrapped_func)
+    def wrapper(*args,chunksize=None,workers=None,executor='thread',**kwargs):
+        if chunksize is None and workers is None:
+            return wrapped_func(*args,**kwargs)
+        #The wrapper (not wrapped_func) is called on each chunk so that
+        #it can be pickled by name for worker processes
+        return _run_in_chunks(wrapper,args,kwargs,chunksize,workers,executor)
+    return wrapper
+
 def _check_follows_3_component_vector_convention(inpt):
     """Determine if an given object is a numpy array with n rows and
     3 columns (geospacepy-lite convention for a 3 component vector)
@@ -152,9 +445,180 @@ class CheckInputsAreThreeComponentVectors(object):
         
         @functools.wraps(func) 
         def wrapper(*args,**kwargs):
-            for iarg in argnums_to_check:
-                _check_follows_3_component_vector_convention(args[iarg])
+            mode = _validation_mode.get()
+            if mode == 'strict':
+                for iarg in argnums_to_check:
+                    _check_follows_3_component_vector_convention(args[iarg])
+            elif mode == 'fast':
+                for iarg in argnums_to_check:
+                    shape = getattr(args[iarg],'shape',())
+                    if len(shape) != 2 or shape[1] != 3:
+                        #Raise the informative error
+                        _check_follows_3_component_vector_convention(args[iarg])
             return func(*args,**kwargs)
         
         return wrapper
 
+def result_float_dtype(*inputs):
+    """Floating point type of the outputs of a function of inputs. 
+    Outputs are float32 only if every array input is float32 (python 
+    numbers do not count), otherwise they are float64 
+
+    PARAMETERS
+    ----------
+
+        *inputs : np.ndarray, float or int
+            The inputs to the function
+
+    RETURNS
+    -------
+
+        dtype : np.dtype
+            np.float32 or np.float64
+    """
+    dtypes = [inpt.dtype for inpt in inputs if isinstance(inpt,np.ndarray)]
+    if dtypes and all([dtype.kind == 'f' and dtype.itemsize <= 4 
+                       for dtype in dtypes]):
+        return np.dtype(np.float32)
+    return np.dtype(np.float64)
+
+def prepare_output(out,shape,dtype):
+    """Validate an output array passed to a function as out=, or 
+    allocate one if none was passed
+
+    PARAMETERS
+    ----------
+
+        out : np.ndarray or None
+            The array passed as out= (None to allocate a new array)
+        shape : tuple
+            The shape of the output
+        dtype : np.dtype
+            The type of the newly allocated output (see result_float_dtype)
+
+    RETURNS
+    -------
+
+        out : np.ndarray
+            The (validated) output array
+
+    RAISES
+    ------
+
+        TypeError
+            If out is not a floating point numpy array
+        ValueError
+            If out is not the right shape
+    """
+    if out is None:
+        return np.empty(shape,dtype=dtype)
+    if not isinstance(out,np.ndarray) or out.dtype.kind != 'f':
+        raise TypeError(('Output arrays must be floating point numpy arrays'
+                         +' not {}'.format(getattr(out,'dtype',type(out)))))
+    if out.shape != tuple(shape):
+        raise ValueError(('Output array shape {} '.format(out.shape)
+                          +'does not match the shape of the result '
+                          +'{}'.format(tuple(shape))))
+    return out
+
+def validate_output(out,*inputs):
+    """Validate an output array passed as out= against the broadcast
+    shape of a function's inputs (for functions which otherwise let 
+    numpy allocate their results, so None is returned unchanged and
+    single valued inputs still give single valued results)"""
+    if out is None:
+        return None
+    return prepare_output(out,np.broadcast(*inputs).shape,
+                          result_float_dtype(*inputs))
+
+def prepare_outputs(out,n_outputs,shape,dtype):
+    """Validate (or allocate) the output arrays of a function which 
+    returns several arrays of the same shape, which are passed as 
+    a tuple out=(out1,out2,...) (individual arrays can be None)"""
+    if out is None:
+        out = (None,)*n_outputs
+    if len(out) != n_outputs:
+        raise ValueError(('{} output arrays are required'.format(n_outputs)
+                          +' not {}'.format(len(out))))
+    return tuple([prepare_output(o,shape,dtype) for o in out])
+
+class ArrayCache(object):
+    """Least-recently-used cache of values computed from numpy arrays
+    (or other objects, such as floats or lists), so that the computation 
+    does not need to be repeated when the same array is used again.
+
+    Arrays can be recognized either by identity (the same object,
+    which is very fast, but will return stale results if the array
+    is modified in place), or by contents (hashing the array's data, which
+    is much cheaper than most computations but does scale with array size)
+    """
+    def __init__(self,maxsize=8,by='identity'):
+        """
+        PARAMETERS
+        ----------
+
+        maxsize : int
+            Maximum number of values to keep in the cache
+        by : str
+            'identity' or 'contents', how to recognize a cached array
+        """
+        if by not in ('identity','contents'):
+            raise ValueError(('Invalid value for by {},'.format(by)
+                              +' valid values are identity or contents'))
+        self.maxsize = maxsize
+        self.by = by
+        self._cache = collections.OrderedDict()
+
+    def _key(self,objs):
+        if self.by == 'identity':
+            return tuple([id(obj) for obj in objs])
+        key = []
+        for obj in objs:
+            arr = np.ascontiguousarray(obj)
+            if arr.dtype.kind == 'O':
+                digest = hash(tuple(arr.ravel().tolist()))
+            else:
+                digest = hashlib.blake2b(arr.view(np.uint8).ravel(),
+                                         digest_size=16).digest()
+            key.append((arr.shape,arr.dtype.str,digest))
+        return tuple(key)
+
+    def get(self,objs,compute):
+        """Return the cached value for an object (or a tuple of objects),
+        or compute it, cache it, and return it if it is not in the cache
+        
+        PARAMETERS
+        ----------
+
+        objs : object or tuple
+            The object (e.g. numpy array) the cached value was computed
+            from, or a tuple of objects if the value was computed from
+            several
+        compute : callable
+            Called with no arguments to compute the value on a cache miss
+
+        RETURNS
+        -------
+
+        value : object
+            The cached (or newly computed) value
+        """
+        if not isinstance(objs,tuple):
+            objs = (objs,)
+        key = self._key(objs)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key][1]
+        value = compute()
+        #A reference to the objects is kept so their ids are not reused
+        self._cache[key] = (objs,value)
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return value
+
+    def clear(self):
+        """Remove all cached values"""
+        self._cache.clear()
+
+    def __len__(self):
+        return len(self._cache)
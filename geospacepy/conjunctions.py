@@ -0,0 +1,275 @@
+# (C) 2020 University of Colorado AES-CCAR-SEDA (Space Environment Data Analysis) Group
+# Written by Liam M. Kilcommons
+import numpy as np
+from geospacepy.array_management import DEFAULT_CHUNKSIZE
+from geospacepy.special_datetime import (datetimearr2datetime64,
+                                        _nearest_within_tolerance)
+from geospacepy.spherical_geometry import (_unit_vectors,
+                                           _great_circle_distance_haversine_chords,
+                                           _angles_to_distances,
+                                           _distances_to_angles)
+
+#Type of the array returned by find_conjunctions, one element
+#for each conjunction
+CONJUNCTION_DTYPE = np.dtype([('start_time','datetime64[us]'),
+                              ('end_time','datetime64[us]'),
+                              ('start_index','i8'),
+                              ('stop_index','i8'),
+                              ('min_time','datetime64[us]'),
+                              ('min_index1','i8'),
+                              ('min_index2','i8'),
+                              ('min_distance','f8'),
+                              ('time_offset','f8')])
+
+def _as_datetime64(times):
+    """Times as a numpy datetime64 array (numpy arrays, including
+    np.memmap, are not copied)"""
+    if isinstance(times,np.ndarray) and np.issubdtype(times.dtype,np.datetime64):
+        return times
+    return datetimearr2datetime64(times)
+
+def _epoch_us(dt64s):
+    return dt64s.astype('datetime64[us]').view(np.int64)
+
+#Number of samples at the start of track 1 from which the default
+#max_gap is computed (independent of the chunk size)
+_MAX_GAP_SAMPLES = 10000
+
+def _default_max_gap_us(times1):
+    """Three times the median spacing of the first _MAX_GAP_SAMPLES samples
+    of track 1 (representative of its cadence). Infinite if track 1 
+    has fewer than 2 samples (there are no gaps to split at)"""
+    epoch_us = _epoch_us(times1[:_MAX_GAP_SAMPLES])
+    if epoch_us.size < 2:
+        return np.iinfo(np.int64).max
+    return 3*int(np.median(np.diff(epoch_us)))
+
+def _check_sorted(epoch_us,name,previous_us=None):
+    if np.any(np.diff(epoch_us) < 0) or \
+            (previous_us is not None and epoch_us[0] < previous_us):
+        raise ValueError(('{} must be sorted in time order'.format(name)))
+
+class _ConjunctionRun(object):
+    """A run of consecutive samples of track 1 closer than the maximum
+    distance to the aligned samples of track 2"""
+    def __init__(self,start,stop,first_us,last_us,i_min,j_min,min_angle,
+                 time_offset_us):
+        self.start,self.stop = start,stop
+        self.first_us,self.last_us = first_us,last_us
+        self.i_min,self.j_min = i_min,j_min
+        self.min_angle = min_angle
+        self.time_offset_us = time_offset_us
+
+    def continues_into(self,other,max_gap_us):
+        """True if other starts at the sample after this run stops, and
+        the time between them is not more than max_gap_us"""
+        return other.start == self.stop \
+                    and other.first_us-self.last_us <= max_gap_us
+
+    def merge(self,other):
+        """Extend this run with the run which continues it"""
+        self.stop,self.last_us = other.stop,other.last_us
+        if other.min_angle < self.min_angle:
+            self.i_min,self.j_min = other.i_min,other.j_min
+            self.min_angle = other.min_angle
+            self.time_offset_us = other.time_offset_us
+
+def _runs_in_chunk(close_positions,epoch_us,angles,j_inds,time_offsets_us,
+                   offset,max_gap_us):
+    """Runs of consecutive positions (sorted indices of the samples of
+    track 1 in the chunk which are within the maximum distance), which are
+    also split where the time between samples is more than max_gap_us"""
+    runs = []
+    if close_positions.size == 0:
+        return runs
+    breaks = np.flatnonzero((np.diff(close_positions) != 1)
+                            | (np.diff(epoch_us) > max_gap_us))+1
+    starts = np.concatenate(([0],breaks))
+    stops = np.concatenate((breaks,[close_positions.size]))
+    for start,stop in zip(starts,stops):
+        i_min = start+np.argmin(angles[start:stop])
+        runs.append(_ConjunctionRun(close_positions[start]+offset,
+                                    close_positions[stop-1]+offset+1,
+                                    epoch_us[start],epoch_us[stop-1],
+                                    close_positions[i_min]+offset,
+                                    j_inds[i_min],angles[i_min],
+                                    time_offsets_us[i_min]))
+    return runs
+
+def find_conjunctions(times1,lats1,azis1,times2,lats2,azis2,max_distance,
+                      aziunit='deg',max_time_offset=1.,distunit='rad',r=None,
+                      max_gap=None,chunksize=DEFAULT_CHUNKSIZE):
+    """Find the conjunctions of two spacecraft (or a spacecraft and a
+    location on the ground), the intervals during which they are
+    closer than a maximum (great circle) distance.
+
+    Each sample of track 1 is paired with the closest in time sample
+    of track 2 (if it is within max_time_offset). Samples of track 1
+    which are closer than max_distance to their paired sample of track 2
+    are grouped into conjunctions (runs of consecutive samples, which
+    are split at gaps in the data of track 1 longer than max_gap).
+
+    The tracks are processed in chunks of chunksize samples of track 1,
+    and only the corresponding samples of track 2 are read, so the memory
+    used is bounded by the chunk size (the inputs can be memory-mapped
+    arrays of multi-year tracks).
+
+    PARAMETERS
+    ----------
+
+    times1 : np.ndarray
+        Times (numpy datetime64, or Python datetimes) of the samples
+        of track 1, sorted in time order
+    lats1 : np.ndarray
+        Latitudes of the samples of track 1 (degrees)
+    azis1 : np.ndarray
+        Azimuths (longitudes or localtimes) of the samples of track 1
+    times2 : np.ndarray or None
+        Times of the samples of track 2, sorted in time order, or
+        None if track 2 is a single location (e.g. a ground station)
+    lats2 : np.ndarray or float
+        Latitudes of the samples of track 2 (degrees)
+    azis2 : np.ndarray or float
+        Azimuths (longitudes or localtimes) of the samples of track 2
+    max_distance : float
+        Maximum distance between the tracks during a conjunction
+    aziunit : str, optional
+        Unit of the azimuths, valid values: hour, deg (default) or rad
+    max_time_offset : float, optional
+        Maximum difference in time (in seconds) between paired samples
+        of track 1 and track 2 (default 1 second)
+    distunit : str, optional
+        Unit of max_distance and the returned distances (angles),
+        valid values: rad (default), deg or hour
+    r : float, optional
+        Radius of the sphere, if passed max_distance and the returned
+        distances are arc lengths in the units of r instead of angles
+    max_gap : float, optional
+        Longest time (in seconds) between consecutive samples of track 1
+        in the same conjunction. Default is three times the median
+        time between the first 10000 samples of track 1
+    chunksize : int, optional
+        Number of samples of track 1 processed at once
+
+    RETURNS
+    -------
+
+    conjunctions : np.ndarray
+        Structured array (dtype CONJUNCTION_DTYPE) with an element for
+        each conjunction, in time order, with fields:
+
+        start_time, end_time
+            Times of the first and last samples of track 1 in
+            the conjunction
+        start_index, stop_index
+            Indices of the first and one after the last samples of track 1
+        min_time
+            Time of the sample of track 1 closest to track 2
+        min_index1, min_index2
+            Indices of the closest samples of track 1 and track 2
+            (min_index2 is 0 if track 2 is a single location)
+        min_distance
+            Distance between the closest samples
+        time_offset
+            Time of the closest sample of track 2 minus time of the
+            closest sample of track 1 (seconds)
+
+    Notes
+    -----
+
+    The difference in latitude of two locations is a lower bound on
+    the great circle distance between them, so samples are first
+    pruned by latitude difference (which needs no trigonometry), and
+    distances are only computed for the remaining candidate samples.
+    """
+    if chunksize < 1:
+        raise ValueError('chunksize must be a positive integer')
+    max_angle = float(_distances_to_angles(max_distance,distunit,r))
+    max_angle_deg = np.degrees(max_angle)
+    times1 = _as_datetime64(times1)
+    fixed_location = times2 is None
+    if fixed_location:
+        station_vector = _unit_vectors(lats2,azis2,aziunit,np.float64)
+        if station_vector.shape[0] != 1:
+            raise ValueError(('If times2 is None, track 2 must be a single '
+                              +'location, not {}'.format(station_vector.shape[0])))
+    else:
+        times2 = _as_datetime64(times2)
+    tol_us = int(round(max_time_offset*1e6))
+    if max_gap is None:
+        max_gap_us = _default_max_gap_us(times1)
+    else:
+        max_gap_us = int(round(max_gap*1e6))
+
+    runs = []
+    previous_us = None
+    n_samples = times1.shape[0]
+    for start in range(0,n_samples,chunksize):
+        stop = min(start+chunksize,n_samples)
+        chunk_lats1 = np.asarray(lats1[start:stop],dtype=np.float64)
+        chunk_azis1 = np.asarray(azis1[start:stop],dtype=np.float64)
+        epoch_us1 = _epoch_us(times1[start:stop])
+        _check_sorted(epoch_us1,'times1',previous_us)
+        previous_us = epoch_us1[-1]
+        if fixed_location:
+            j_inds = np.zeros((stop-start,),dtype=np.int64)
+            time_offsets_us = np.zeros((stop-start,),dtype=np.int64)
+            candidates = np.flatnonzero(np.abs(chunk_lats1-lats2) <= max_angle_deg)
+        else:
+            #Time-align with the samples of track 2 which could
+            #pair with this chunk (a vectorized merge)
+            first_time = times1[start]-np.timedelta64(tol_us,'us')
+            last_time = times1[stop-1]+np.timedelta64(tol_us,'us')
+            lo = np.searchsorted(times2,first_time,side='left')
+            hi = np.searchsorted(times2,last_time,side='right')
+            if hi <= lo:
+                continue
+            epoch_us2 = _epoch_us(times2[lo:hi])
+            _check_sorted(epoch_us2,'times2')
+            inds,deltas,matched = _nearest_within_tolerance(epoch_us2,epoch_us1,
+                                                            tol_us+1)
+            j_inds = inds+lo
+            time_offsets_us = epoch_us2[inds]-epoch_us1
+            chunk_lats2 = np.asarray(lats2[lo:hi],dtype=np.float64)[inds]
+            #Prune by latitude difference (a lower bound of the distance)
+            candidates = np.flatnonzero(matched & (np.abs(chunk_lats1-chunk_lats2)
+                                                   <= max_angle_deg))
+        if candidates.size == 0:
+            continue
+        vectors1 = _unit_vectors(chunk_lats1[candidates],chunk_azis1[candidates],
+                                 aziunit,np.float64)
+        if fixed_location:
+            vectors2 = np.broadcast_to(station_vector,vectors1.shape)
+        else:
+            vectors2 = _unit_vectors(chunk_lats2[candidates],
+                                     np.asarray(azis2[lo:hi],dtype=np.float64)[
+                                                            inds[candidates]],
+                                     aziunit,np.float64)
+        angles = _great_circle_distance_haversine_chords(vectors1,vectors2)
+        close = angles <= max_angle
+        close_positions = candidates[close]
+        chunk_runs = _runs_in_chunk(close_positions,epoch_us1[close_positions],
+                                    angles[close],j_inds[close_positions],
+                                    time_offsets_us[close_positions],start,
+                                    max_gap_us)
+        #Conjunctions which continue across the boundary between chunks
+        if runs and chunk_runs and runs[-1].continues_into(chunk_runs[0],
+                                                           max_gap_us):
+            runs[-1].merge(chunk_runs.pop(0))
+        runs.extend(chunk_runs)
+
+    conjunctions = np.zeros((len(runs),),dtype=CONJUNCTION_DTYPE)
+    if not runs:
+        return conjunctions
+    for field,attr in [('start_index','start'),('stop_index','stop'),
+                       ('min_index1','i_min'),('min_index2','j_min')]:
+        conjunctions[field] = [getattr(run,attr) for run in runs]
+    conjunctions['start_time'] = times1[conjunctions['start_index']]
+    conjunctions['end_time'] = times1[conjunctions['stop_index']-1]
+    conjunctions['min_time'] = times1[conjunctions['min_index1']]
+    conjunctions['min_distance'] = _angles_to_distances(
+                                        np.array([run.min_angle for run in runs]),
+                                        distunit,r)
+    conjunctions['time_offset'] = np.array([run.time_offset_us
+                                            for run in runs])/1e6
+    return conjunctions
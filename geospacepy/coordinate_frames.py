@@ -0,0 +1,322 @@
+# (C) 2020 University of Colorado AES-CCAR-SEDA (Space Environment Data Analysis) Group
+# Written by Liam M. Kilcommons
+import heapq
+import numpy as np
+from geospacepy.array_management import _check_follows_3_component_vector_convention
+from geospacepy.rotations import RotationSequence
+from geospacepy.sun import greenwich_mean_siderial_time
+from geospacepy.terrestrial_spherical import (ecef_cart2spherical,
+                                            ecef_spherical2cart)
+from geospacepy.terrestrial_ellipsoidal import ecef_cart2geodetic,geodetic2ecef
+from geospacepy.ellipsoids import WGS84
+
+class _Transform(object):
+    """One edge of the frame graph, either a rotation (a function
+    returning the axes and angles of a sequence of elementary rotations,
+    which can be fused with neighbouring rotations), or any other
+    function of the vectors"""
+    def __init__(self,from_frame,to_frame,rotation=None,func=None,
+                 cost=1.,requires=()):
+        if (rotation is None) == (func is None):
+            raise ValueError('Exactly one of rotation or func must be passed')
+        self.from_frame = from_frame
+        self.to_frame = to_frame
+        self.rotation = rotation
+        self.func = func
+        self.cost = cost
+        self.requires = tuple(requires)
+
+    @property
+    def is_rotation(self):
+        return self.rotation is not None
+
+    def check_context(self,context):
+        for name in self.requires:
+            if context.get(name) is None:
+                raise ValueError(('Transforming from {} '.format(self.from_frame)
+                                  +'to {} requires {}='.format(self.to_frame,name)))
+
+class TransformPlan(object):
+    """The planned path between two frames. Consecutive rotations along
+    the path are fused into one rotation (one pass over the vectors, and
+    no arrays of vectors in the intermediate frames)
+
+    Attributes
+    ----------
+    frames : list
+        Frames along the path (including the start and end frames)
+    steps : list
+        (kind,frames) for each pass over the vectors, kind is
+        'rotation' for fused rotations or 'function' otherwise
+    cost : float
+        Total cost of the transforms along the path
+    """
+    def __init__(self,transforms):
+        self.transforms = transforms
+        self.frames = [transforms[0].from_frame]+[t.to_frame for t in transforms]
+        self.cost = sum([t.cost for t in transforms])
+        self._groups = []
+        for transform in transforms:
+            if transform.is_rotation and self._groups \
+                    and self._groups[-1][0].is_rotation:
+                self._groups[-1].append(transform)
+            else:
+                self._groups.append([transform])
+        self.steps = []
+        for group in self._groups:
+            kind = 'rotation' if group[0].is_rotation else 'function'
+            frames = [group[0].from_frame]+[t.to_frame for t in group]
+            self.steps.append((kind,frames))
+
+    @property
+    def n_passes(self):
+        """Number of passes over the vectors"""
+        return len(self.steps)
+
+    @property
+    def avoided_frames(self):
+        """Intermediate frames for which no array of vectors is created
+        (because they are inside a fused rotation)"""
+        return [frame for kind,frames in self.steps for frame in frames[1:-1]]
+
+    def __repr__(self):
+        lines = ['TransformPlan {} (cost {}, {} pass(es))'.format(
+                    ' -> '.join(self.frames),self.cost,self.n_passes)]
+        for kind,frames in self.steps:
+            lines.append('  {}: {}'.format(kind,' -> '.join(frames)))
+        if self.avoided_frames:
+            lines.append('  no arrays for: {}'.format(', '.join(self.avoided_frames)))
+        return '\n'.join(lines)
+
+    def rotation_sequence(self,group,context):
+        """Fuse the rotations of a group of transforms into
+        one RotationSequence (adjacent rotations about the same
+        axis are combined by adding their angles)"""
+        axes,angles = [],[]
+        for transform in group:
+            transform.check_context(context)
+            for axis,angle in zip(*transform.rotation(context)):
+                if axes and axes[-1] == axis:
+                    angles[-1] = angles[-1]+angle
+                else:
+                    axes.append(axis)
+                    angles.append(angle)
+        return RotationSequence(axes,angles)
+
+    def execute(self,vecs,**context):
+        """Transform vecs (shape=(n,3)) along the planned path"""
+        for group in self._groups:
+            if group[0].is_rotation:
+                vecs = self.rotation_sequence(group,context).apply(vecs)
+            else:
+                for transform in group:
+                    transform.check_context(context)
+                    vecs = transform.func(vecs,context)
+        return vecs
+
+class FrameGraph(object):
+    """Registry of coordinate frames and the transforms between them,
+    which plans the cheapest path (Dijkstra's algorithm, using the
+    costs of the transforms) between any two frames"""
+    def __init__(self):
+        self._transforms = {}
+        self._plans = {}
+
+    @staticmethod
+    def _frame_name(frame):
+        return frame.upper()
+
+    @property
+    def frames(self):
+        return sorted(self._transforms.keys())
+
+    def register_frame(self,frame):
+        """Add a frame (with no transforms yet)"""
+        self._transforms.setdefault(self._frame_name(frame),{})
+
+    def register_transform(self,from_frame,to_frame,rotation=None,func=None,
+                           cost=1.,requires=()):
+        """Add a transform from one frame to another (registering the
+        frames if needed). Replaces any existing transform between the frames.
+
+        Parameters
+        ----------
+        from_frame,to_frame : str
+            Names of the frames (case insensitive)
+        rotation : callable, optional
+            For transforms which are rotations of the coordinate axes,
+            a function of a dict of the keyword arguments passed to transform
+            which returns (axes,angles) of a sequence of elementary rotations
+            (see rotations.RotationSequence). Rotations can be fused with
+            other rotations
+        func : callable, optional
+            For other transforms, a function (vecs,context) returning the
+            transformed vectors (shape=(n,3)), where context is a dict of
+            the keyword arguments passed to transform
+        cost : float, optional
+            Relative cost of the transform (used to choose between paths)
+        requires : list, optional
+            Names of keyword arguments which must be passed to transform
+            to use this transform (e.g. 'times')
+        """
+        from_frame,to_frame = self._frame_name(from_frame),self._frame_name(to_frame)
+        self.register_frame(from_frame)
+        self.register_frame(to_frame)
+        self._transforms[from_frame][to_frame] = _Transform(from_frame,to_frame,
+                                                            rotation=rotation,
+                                                            func=func,cost=cost,
+                                                            requires=requires)
+        self._plans.clear()
+
+    def plan(self,from_frame,to_frame):
+        """Find the cheapest path between two frames
+
+        Returns
+        -------
+        plan : TransformPlan
+            The plan (print it to see the path and which rotations
+            are fused)
+        """
+        from_frame,to_frame = self._frame_name(from_frame),self._frame_name(to_frame)
+        for frame in (from_frame,to_frame):
+            if frame not in self._transforms:
+                raise ValueError(('Unknown frame {}, '.format(frame)
+                                  +'known frames are {}'.format(self.frames)))
+        if from_frame == to_frame:
+            raise ValueError('Frames are the same ({})'.format(from_frame))
+        if (from_frame,to_frame) not in self._plans:
+            self._plans[(from_frame,to_frame)] = self._shortest_path(from_frame,
+                                                                     to_frame)
+        return self._plans[(from_frame,to_frame)]
+
+    def _shortest_path(self,from_frame,to_frame):
+        costs = {from_frame:0.}
+        previous = {}
+        #Entries are (cost,tiebreaker,frame)
+        queue = [(0.,0,from_frame)]
+        n_pushed = 1
+        while queue:
+            cost,_,frame = heapq.heappop(queue)
+            if frame == to_frame:
+                break
+            if cost > costs[frame]:
+                continue
+            for next_frame,transform in self._transforms[frame].items():
+                next_cost = cost+transform.cost
+                if next_cost < costs.get(next_frame,np.inf):
+                    costs[next_frame] = next_cost
+                    previous[next_frame] = transform
+                    heapq.heappush(queue,(next_cost,n_pushed,next_frame))
+                    n_pushed += 1
+        if to_frame not in previous:
+            raise ValueError(('No transforms connect {} '.format(from_frame)
+                              +'to {}'.format(to_frame)))
+        transforms = []
+        frame = to_frame
+        while frame != from_frame:
+            transforms.insert(0,previous[frame])
+            frame = previous[frame].from_frame
+        return TransformPlan(transforms)
+
+    def transform(self,vecs,from_frame,to_frame,**context):
+        """Transform vectors between two frames along the cheapest path
+
+        Parameters
+        ----------
+        vecs : np.ndarray
+            Array of n 3-component vectors (shape=(n,3)) in from_frame
+        from_frame,to_frame : str
+            Names of the frames (case insensitive)
+        **context
+            Information needed by the transforms along the path, for the
+            built-in frames: times (julian dates, for ECI<->ECEF),
+            lats and lons (location(s) of the ENU coordinates), gdlats 
+            (geodetic latitude(s) of the ENU_GEODETIC coordinates) and
+            optionally ellipsoid (model of the earth's shape for
+            GEODETIC, default WGS84)
+
+        Returns
+        -------
+        transformed_vecs : np.ndarray
+            Array of n 3-component vectors (shape=(n,3)) in to_frame
+        """
+        _check_follows_3_component_vector_convention(vecs)
+        return self.plan(from_frame,to_frame).execute(vecs,**context)
+
+def _eci2ecef_rotation(context):
+    return [2],[np.asarray(greenwich_mean_siderial_time(context['times'])).flatten()]
+
+def _ecef2eci_rotation(context):
+    axes,angles = _eci2ecef_rotation(context)
+    return axes,[-1*angles[0]]
+
+def _ecef2enu_rotation(context):
+    #Same rotations as terrestrial_spherical.ecef2enu
+    lonrot = np.mod(90.+np.asarray(context['lons'],dtype=float),360.)
+    colat = 90.-np.asarray(context['lats'],dtype=float)
+    return [2,0],[np.radians(lonrot).flatten(),np.radians(colat).flatten()]
+
+def _enu2ecef_rotation(context):
+    axes,angles = _ecef2enu_rotation(context)
+    return axes[::-1],[-1*angle for angle in angles[::-1]]
+
+def _ecef2spherical(vecs,context):
+    return np.column_stack(ecef_cart2spherical(vecs))
+
+def _spherical2ecef(vecs,context):
+    return ecef_spherical2cart(vecs[:,0],vecs[:,1],vecs[:,2])
+
+def _ecef2geodetic(vecs,context):
+    return np.column_stack(ecef_cart2geodetic(vecs,method='vermeille',
+                                    ellipsoid=context.get('ellipsoid',WGS84)))
+
+def _geodetic2ecef(vecs,context):
+    return geodetic2ecef(vecs[:,0],vecs[:,1],vecs[:,2],
+                         ellipsoid=context.get('ellipsoid',WGS84))
+
+def _ecef2enu_geodetic_rotation(context):
+    return _ecef2enu_rotation({'lats':context['gdlats'],'lons':context['lons']})
+
+def _enu_geodetic2ecef_rotation(context):
+    return _enu2ecef_rotation({'lats':context['gdlats'],'lons':context['lons']})
+
+frame_graph = FrameGraph()
+frame_graph.register_transform('ECI','ECEF',rotation=_eci2ecef_rotation,
+                               requires=['times'])
+frame_graph.register_transform('ECEF','ECI',rotation=_ecef2eci_rotation,
+                               requires=['times'])
+frame_graph.register_transform('ECEF','ENU',rotation=_ecef2enu_rotation,
+                               requires=['lats','lons'])
+frame_graph.register_transform('ENU','ECEF',rotation=_enu2ecef_rotation,
+                               requires=['lats','lons'])
+frame_graph.register_transform('ECEF','ENU_GEODETIC',
+                               rotation=_ecef2enu_geodetic_rotation,
+                               requires=['gdlats','lons'])
+frame_graph.register_transform('ENU_GEODETIC','ECEF',
+                               rotation=_enu_geodetic2ecef_rotation,
+                               requires=['gdlats','lons'])
+frame_graph.register_transform('ECEF','SPHERICAL',func=_ecef2spherical,cost=2.)
+frame_graph.register_transform('SPHERICAL','ECEF',func=_spherical2ecef,cost=2.)
+frame_graph.register_transform('ECEF','GEODETIC',func=_ecef2geodetic,cost=3.)
+frame_graph.register_transform('GEODETIC','ECEF',func=_geodetic2ecef,cost=3.)
+
+def register_frame(frame):
+    """Add a frame to the default frame graph (see FrameGraph.register_frame)"""
+    frame_graph.register_frame(frame)
+
+def register_transform(from_frame,to_frame,rotation=None,func=None,
+                       cost=1.,requires=()):
+    """Add a transform to the default frame graph
+    (see FrameGraph.register_transform)"""
+    frame_graph.register_transform(from_frame,to_frame,rotation=rotation,
+                                   func=func,cost=cost,requires=requires)
+
+def plan(from_frame,to_frame):
+    """Plan the path between two frames of the default frame graph
+    (see FrameGraph.plan)"""
+    return frame_graph.plan(from_frame,to_frame)
+
+def transform(vecs,from_frame,to_frame,**context):
+    """Transform vectors between two frames of the default frame graph
+    (see FrameGraph.transform)"""
+    return frame_graph.transform(vecs,from_frame,to_frame,**context)
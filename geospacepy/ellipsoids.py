@@ -0,0 +1,105 @@
+# (C) 2020 University of Colorado AES-CCAR-SEDA (Space Environment Data Analysis) Group
+# Written by Liam M. Kilcommons
+import numpy as np
+
+class Ellipsoid(object):
+    """Oblate ellipsoid of revolution (spheroid) model of the earth's
+    shape. The constants derived from the semi-major axis and flattening
+    are computed once, when the model is created, so the conversion
+    functions which are passed a model do not recompute them.
+
+    Attributes
+    ----------
+    a : float
+        Semi-major (equatorial) axis in meters
+    f : float
+        Flattening (a-b)/a
+    b : float
+        Semi-minor (polar) axis in meters
+    e2 : float
+        First eccentricity squared (a^2-b^2)/a^2
+    ep2 : float
+        Second eccentricity squared (a^2-b^2)/b^2
+    one_minus_e2 : float
+        1-e2 (b^2/a^2)
+    e4 : float
+        e2 squared
+    a_e2 : float
+        a*e2
+    """
+    def __init__(self,a,f=None,inv_f=None,name=None):
+        """
+        Parameters
+        ----------
+        a : float
+            Semi-major (equatorial) axis in meters
+        f : float, optional
+            Flattening (pass either f or inv_f, 0 for a sphere)
+        inv_f : float, optional
+            Inverse flattening 1/f
+        name : str, optional
+            Name of the model
+        """
+        if (f is None) == (inv_f is None):
+            raise ValueError('Exactly one of f or inv_f must be passed')
+        if f is None:
+            f = 1./inv_f
+        if not 0. <= f < 1.:
+            raise ValueError('Invalid flattening {}'.format(f))
+        self.name = name
+        self.a = float(a)
+        self.f = float(f)
+        self.b = self.a*(1.-self.f)
+        self.e2 = self.f*(2.-self.f)
+        self.one_minus_e2 = 1.-self.e2
+        self.ep2 = self.e2/self.one_minus_e2
+        self.e4 = self.e2**2
+        self.a_e2 = self.a*self.e2
+
+    def __setattr__(self,name,value):
+        if hasattr(self,'a_e2'):
+            raise AttributeError(('Ellipsoid models can not be modified '
+                                  +'(derived constants would be stale), '
+                                  +'create a new Ellipsoid instead'))
+        object.__setattr__(self,name,value)
+
+    @property
+    def is_sphere(self):
+        return self.f == 0.
+
+    def prime_vertical_radius(self,sin_gdlats,out=None):
+        """Radius of curvature in the prime vertical (Vallado's C_earth),
+        a/sqrt(1-e^2*sin(gdlat)^2)
+
+        Parameters
+        ----------
+        sin_gdlats : float or np.ndarray
+            Sines of the geodetic latitudes (the callers have
+            usually already computed them)
+        out : np.ndarray, optional
+            Array (the shape of sin_gdlats) to store the result in
+
+        Returns
+        -------
+        N : np.ndarray
+            Radius in meters
+        """
+        N = np.multiply(sin_gdlats,sin_gdlats,out=out)
+        N *= -1*self.e2
+        N += 1.
+        np.sqrt(N,out=N)
+        np.divide(self.a,N,out=N)
+        return N
+
+    def __repr__(self):
+        name = self.name if self.name is not None else 'Ellipsoid'
+        return '{}(a={},f={})'.format(name,self.a,self.f)
+
+#World Geodetic System 1984 (GPS)
+WGS84 = Ellipsoid(6378137.,inv_f=298.257223563,name='WGS84')
+
+#Geodetic Reference System 1980
+GRS80 = Ellipsoid(6378137.,inv_f=298.257222101,name='GRS80')
+
+#Spherical earth with the mean radius used in terrestrial_spherical
+SPHERE = Ellipsoid(6371200.,f=0.,name='SPHERE')
@@ -0,0 +1,239 @@
+# (C) 2020 University of Colorado AES-CCAR-SEDA (Space Environment Data Analysis) Group
+# Written by Liam M. Kilcommons
+import sys
+import time
+import numpy as np
+from geospacepy.array_management import DEFAULT_CHUNKSIZE,_accepts_out
+
+def open_input(source):
+    """Open an input for a Pipeline without reading it into memory
+
+    PARAMETERS
+    ----------
+
+    source : str or np.ndarray
+        Path to a .npy file (which is memory-mapped read-only), or an
+        array (e.g. an np.memmap of a flat binary file), which is
+        returned unchanged
+
+    RETURNS
+    -------
+
+    array : np.ndarray
+    """
+    if isinstance(source,str):
+        return np.load(source,mmap_mode='r')
+    return source
+
+def print_progress(n_done,n_total,elapsed):
+    """Default progress report of Pipeline.run (one line to stderr
+    after each chunk)"""
+    rate = n_done/elapsed if elapsed > 0. else float('inf')
+    sys.stderr.write('\r{}/{} samples ({:.0f}%) {:.3g} samples/s'.format(
+                                                n_done,n_total,
+                                                100.*n_done/n_total,rate))
+    if n_done == n_total:
+        sys.stderr.write('\n')
+    sys.stderr.flush()
+
+class _Step(object):
+    """A function applied to named columns of a Pipeline"""
+    def __init__(self,func,inputs,outputs,kwargs):
+        self.func = func
+        self.inputs = inputs
+        self.outputs = outputs
+        self.kwargs = kwargs
+        self.accepts_out = _accepts_out(func)
+        #Output buffers for one chunk, allocated on the first chunk
+        self.scratch = None
+
+    def __call__(self,args,n_chunk):
+        if self.scratch is not None:
+            out = tuple([buffer[:n_chunk] for buffer in self.scratch])
+            results = self.func(*args,out=out if len(out)>1 else out[0],
+                                **self.kwargs)
+        else:
+            results = self.func(*args,**self.kwargs)
+        if not isinstance(results,tuple):
+            results = (results,)
+        if len(results) != len(self.outputs):
+            raise ValueError(('{} returned {} '.format(self.func.__name__,
+                                                       len(results))
+                              +'results, but {} output '.format(len(self.outputs))
+                              +'names were given ({})'.format(self.outputs)))
+        return results
+
+    def allocate_scratch(self,results,chunksize):
+        """Reuse buffers like the results of the first chunk for all
+        later chunks (only for functions which accept out=)"""
+        if not self.accepts_out:
+            return
+        dtypes = [np.asarray(result).dtype for result in results]
+        if not all([dtype.kind == 'f' for dtype in dtypes]):
+            return
+        self.scratch = tuple([np.empty((chunksize,)+np.shape(result)[1:],
+                                       dtype=dtype)
+                              for result,dtype in zip(results,dtypes)])
+
+class Pipeline(object):
+    """A chain of functions (e.g. coordinate transforms) applied to
+    arrays which are too large for memory (e.g. memory-mapped .npy files
+    of years of spacecraft positions), one chunk of samples at a time.
+
+    Each step of the pipeline reads named columns (the inputs, or outputs
+    of earlier steps) and produces named columns. Only one chunk of each
+    column is in memory at once, and steps whose function accepts out=
+    write each chunk into the same buffers, so the memory used does not
+    depend on the length of the inputs.
+
+    Example
+    -------
+
+    .. code-block:: python
+
+        pipeline = Pipeline({'R_ECI':'r_eci.npy','jds':'jds.npy'})
+        pipeline.add_step(eci2ecef,['R_ECI','jds'],['R_ECEF'])
+        pipeline.add_step(ecef_cart2geodetic,['R_ECEF'],
+                          ['gdlats','glons','h_ellps'],method='vermeille')
+        results = pipeline.run({'gdlats':'gdlats.npy','h_ellps':'h.npy'},
+                               progress=True)
+    """
+    def __init__(self,inputs,chunksize=DEFAULT_CHUNKSIZE):
+        """
+        PARAMETERS
+        ----------
+
+        inputs : dict
+            Names of the input columns and the arrays (or paths to .npy
+            files, see open_input). All inputs must have the same
+            number of samples (length along axis 0)
+        chunksize : int, optional
+            Number of samples processed at once
+        """
+        if chunksize < 1:
+            raise ValueError('chunksize must be a positive integer')
+        self.chunksize = chunksize
+        self.inputs = {name:open_input(source)
+                       for name,source in inputs.items()}
+        lengths = set([len(arr) for arr in self.inputs.values()])
+        if len(lengths) != 1:
+            raise ValueError(('Inputs must have the same number of samples,'
+                              +' lengths were {}'.format(
+                                {name:len(arr) for name,arr
+                                 in self.inputs.items()})))
+        self.n_samples = lengths.pop()
+        self.steps = []
+
+    @property
+    def columns(self):
+        """Names of the inputs and the outputs of all steps"""
+        columns = list(self.inputs)
+        for step in self.steps:
+            columns += step.outputs
+        return columns
+
+    def add_step(self,func,inputs,outputs,**kwargs):
+        """Add a function to the end of the pipeline
+
+        PARAMETERS
+        ----------
+
+        func : callable
+            Function called with a chunk of each input column (in order)
+            as positional arguments, which returns an array (or a tuple
+            of arrays) with a value for each sample of the chunk
+        inputs : list
+            Names of the input columns
+        outputs : list
+            Names for the results of func
+        **kwargs
+            Passed unchanged to func for every chunk
+
+        RETURNS
+        -------
+
+        pipeline : Pipeline
+            This pipeline (so calls to add_step can be chained)
+        """
+        inputs,outputs = list(inputs),list(outputs)
+        columns = self.columns
+        for name in inputs:
+            if name not in columns:
+                raise ValueError(('No column {} (the columns '.format(name)
+                                  +'are {})'.format(columns)))
+        self.steps.append(_Step(func,inputs,outputs,kwargs))
+        return self
+
+    def _process_chunk(self,start,stop):
+        values = {name:arr[start:stop] for name,arr in self.inputs.items()}
+        for step in self.steps:
+            first_chunk = step.scratch is None
+            results = step([values[name] for name in step.inputs],stop-start)
+            if first_chunk:
+                step.allocate_scratch(results,self.chunksize)
+            values.update(zip(step.outputs,results))
+        return values
+
+    @staticmethod
+    def _open_output(destination,value,n_samples):
+        shape = (n_samples,)+np.shape(value)[1:]
+        dtype = np.asarray(value).dtype
+        if isinstance(destination,str):
+            return np.lib.format.open_memmap(destination,mode='w+',
+                                             dtype=dtype,shape=shape)
+        if destination.shape != shape:
+            raise ValueError(('Output array shape {} '.format(destination.shape)
+                              +'does not match the shape of the result '
+                              +'{}'.format(shape)))
+        return destination
+
+    def run(self,outputs,progress=None):
+        """Run the pipeline on all samples
+
+        PARAMETERS
+        ----------
+
+        outputs : dict
+            Names of the columns to save and where to save them, either
+            a path to a .npy file (which is created as a memory-mapped
+            array, with the type of the column) or an array (e.g. an
+            np.memmap) with a row for each sample
+        progress : bool or callable, optional
+            True to report progress and throughput after each chunk
+            (see print_progress), or a function called after each chunk as
+            progress(n_done,n_total,elapsed_seconds)
+
+        RETURNS
+        -------
+
+        results : dict
+            The output arrays (memory-mapped for .npy paths)
+        """
+        columns = self.columns
+        for name in outputs:
+            if name not in columns:
+                raise ValueError(('No column {} (the columns '.format(name)
+                                  +'are {})'.format(columns)))
+        if progress is True:
+            progress = print_progress
+        for step in self.steps:
+            step.scratch = None
+
+        results = {}
+        t_start = time.perf_counter()
+        for start in range(0,self.n_samples,self.chunksize):
+            stop = min(start+self.chunksize,self.n_samples)
+            values = self._process_chunk(start,stop)
+            if start == 0:
+                results = {name:self._open_output(destination,values[name],
+                                                  self.n_samples)
+                           for name,destination in outputs.items()}
+            for name,arr in results.items():
+                arr[start:stop] = values[name]
+            if progress:
+                progress(stop,self.n_samples,time.perf_counter()-t_start)
+
+        for arr in results.values():
+            if isinstance(arr,np.memmap):
+                arr.flush()
+        return results
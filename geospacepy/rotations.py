@@ -3,7 +3,9 @@
 import numpy as np
 
 from geospacepy.array_management import (is_number_or_len_one_array,
-                                        CheckInputsAreThreeComponentVectors)
+                                        CheckInputsAreThreeComponentVectors,
+                                        _check_follows_3_component_vector_convention,
+                                        result_float_dtype,prepare_output)
 
 def rotmat(angle,axis):
     """Return 3x3 elementary rotation matrix (`M`),
@@ -53,7 +55,7 @@ def rotmat(angle,axis):
     return M
 
 @CheckInputsAreThreeComponentVectors('vecs')
-def rot(angles,axis,vecs):
+def rot(angles,axis,vecs,out=None):
     """Return representation of 3-component vectors vecs in a
     coordinate systems which has been rotated an angle (angle), about
     axis (axis)
@@ -72,41 +74,406 @@ def rot(angles,axis,vecs):
         Array of *n* 3-component vectors for which the components in the
         rotated coordinate frame will be returned (shape=(*n*,3))
 
+    out : np.ndarray, optional
+        Array (shape=(*n*,3)) to store the result in. Can be `vecs` 
+        itself to rotate in place
+
     Returns
     -------
     
     rotated_vecs : np.ndarray
-        The components of `vecs` in the rotated frame (shape=(*n*,3))
+        The components of `vecs` in the rotated frame (shape=(*n*,3)),
+        float32 if `vecs` is float32, otherwise float64
+
+    Notes
+    -----
+        The result is the same as pre-multiplying each vector by 
+        rotmat(angle,axis), but all vectors are rotated at once with
+        array arithmetic instead of building a matrix for each vector
 
     """
+    if axis not in [0,1,2]:
+        raise ValueError('Invalid value for axis, valid values are 0,1 and 2')
+
     n_vecs = vecs.shape[0]
     if is_number_or_len_one_array(angles):
-        angles_for_rot = angles*np.ones((n_vecs,))
+        angles_for_rot = np.asarray(angles).flatten()
     elif angles.size == n_vecs:
         angles_for_rot = angles.flatten()
     else:
         raise ValueError('Cannot map {} angle to {} vectors'.format(angles.size,
                                                                     n_vecs))
-    
-    rotated_vecs = np.full_like(vecs, np.nan)
-    for i_vec in range(n_vecs):
-        M = rotmat(angles_for_rot[i_vec],axis)
-        v = vecs[i_vec,:].T
-        rotated_vecs[i_vec,:] = np.dot(M,v)
 
-    return rotated_vecs
+    out = prepare_output(out,vecs.shape,result_float_dtype(vecs))
+
+    #Components perpendicular to the rotation axis, in right handed order
+    i,j = (axis+1)%3,(axis+2)%3
+    #Cosines and sines in the output type (float32 vectors stay float32)
+    c = np.cos(angles_for_rot).astype(out.dtype,copy=False)
+    s = np.sin(angles_for_rot).astype(out.dtype,copy=False)
+    v_i,v_j = vecs[:,i],vecs[:,j]
+    rotated_i = c*v_i+s*v_j
+    rotated_j = c*v_j-s*v_i
+    if out is not vecs:
+        out[:,axis] = vecs[:,axis]
+    out[:,i] = rotated_i
+    out[:,j] = rotated_j
+    return out
 
-def rot1(angles,vecs):
+def rot1(angles,vecs,out=None):
     """Shorthand for rotation about axis 0 (x / I / e1)"""
-    return rot(angles,0,vecs)
+    return rot(angles,0,vecs,out=out)
 
-def rot2(angles,vecs):
+def rot2(angles,vecs,out=None):
     """Shorthand for rotation about axis 1 (y / J / e2)"""
-    return rot(angles,1,vecs)
+    return rot(angles,1,vecs,out=out)
 
-def rot3(angles,vecs):
+def rot3(angles,vecs,out=None):
     """Shorthand for rotation about axis 2 (z / K / e3)"""
-    return rot(angles,2,vecs)
+    return rot(angles,2,vecs,out=out)
+
+def _elementary_rotation_entries(angles,axis):
+    """Entries (3x3 nested list) of the elementary rotation matrices
+    for angles about axis, each entry either an array of one
+    value per angle, or exactly 0 or 1 (so that they can be 
+    skipped when rotations are composed or applied)"""
+    i,j = (axis+1)%3,(axis+2)%3
+    c,s = np.cos(angles),np.sin(angles)
+    M = [[0,0,0],[0,0,0],[0,0,0]]
+    M[axis][axis] = 1
+    M[i][i] = c
+    M[i][j] = s
+    M[j][i] = -1*s
+    M[j][j] = c
+    return M
+
+def _multiply_entries(a,b):
+    if _is_exactly(a,0) or _is_exactly(b,0):
+        return 0
+    if _is_exactly(a,1):
+        return b
+    if _is_exactly(b,1):
+        return a
+    return a*b
+
+def _add_entries(a,b):
+    if _is_exactly(a,0):
+        return b
+    if _is_exactly(b,0):
+        return a
+    return a+b
+
+def _is_exactly(entry,value):
+    return isinstance(entry,int) and entry == value
+
+def _compose_entries(M2,M1):
+    """Entries of the matrix product M2 * M1"""
+    M = [[0,0,0],[0,0,0],[0,0,0]]
+    for k in range(3):
+        for l in range(3):
+            for m in range(3):
+                M[k][l] = _add_entries(M[k][l],
+                                       _multiply_entries(M2[k][m],M1[m][l]))
+    return M
+
+class RotationSequence(object):
+    """A sequence of elementary rotations of the coordinate axes
+    (e.g. an Euler angle sequence), composed into a single rotation
+    matrix (for each vector) so that rotating vectors through the whole 
+    sequence only requires one pass over the vectors.
+
+    Rotations are applied in the order given, so 
+    RotationSequence([2,0],[angles_z,angles_x]).apply(vecs) is equivalent
+    to rot1(angles_x,rot3(angles_z,vecs)). The composed matrices are
+    kept, and only recomputed when set_angles is called with different
+    angles, so reusing a sequence avoids recomputing the trigonometry.
+    """
+    def __init__(self,axes,angles):
+        """
+        Parameters
+        ----------
+        axes : list
+            The axis (0,1,2) of each rotation
+        angles : list
+            The angle(s) (in radians) of each rotation, each a float 
+            (same angle for all vectors) or an np.ndarray of n angles
+            (one for each vector)
+        """
+        for axis in axes:
+            if axis not in [0,1,2]:
+                raise ValueError(('Invalid value for axis {},'.format(axis)
+                                  +' valid values are 0,1 and 2'))
+        self.axes = list(axes)
+        self._angles = None
+        self._entries = None
+        self.set_angles(*angles)
+
+    def set_angles(self,*angles):
+        """Change the angles of the rotations (one float or array
+        for each axis). The composed matrices are only recomputed 
+        if the angles differ from the current angles"""
+        if len(angles) != len(self.axes):
+            raise ValueError(('{} angles passed for '.format(len(angles))
+                              +'{} rotations'.format(len(self.axes))))
+        angles = [np.array(angle,dtype=float).flatten() for angle in angles]
+        if self._angles is not None and all([
+                    old.shape == new.shape and np.array_equal(old,new)
+                    for old,new in zip(self._angles,angles)]):
+            return
+        sizes = set([angle.size for angle in angles if angle.size != 1])
+        if len(sizes) > 1:
+            raise ValueError(('Cannot compose rotations with different '
+                              +'numbers of angles {}'.format(sorted(sizes))))
+        self._angles = angles
+        self._entries = None
+
+    @property
+    def angles(self):
+        return self._angles
+
+    def _composed_entries(self):
+        """Entries of the composed matrices, the elementary rotations
+        are multiplied entry by entry, skipping the zeros and ones,
+        so no (n,3,3) array is needed"""
+        if self._entries is None:
+            entries = _elementary_rotation_entries(self._angles[0],self.axes[0])
+            for angle,axis in zip(self._angles[1:],self.axes[1:]):
+                entries = _compose_entries(
+                            _elementary_rotation_entries(angle,axis),entries)
+            self._entries = entries
+        return self._entries
+
+    @property
+    def matrices(self):
+        """Composed rotation matrices, shape=(n,3,3) (or (1,3,3) if
+        all rotations have a single angle)"""
+        entries = self._composed_entries()
+        n = max([angle.size for angle in self._angles])
+        M = np.zeros((n,3,3))
+        for k in range(3):
+            for l in range(3):
+                M[:,k,l] = entries[k][l]
+        return M
+
+    def inverse(self):
+        """The sequence which undoes this one (the reversed sequence
+        of rotations through the negated angles)"""
+        return RotationSequence(self.axes[::-1],
+                                [-1*angle for angle in self._angles[::-1]])
+
+    def apply(self,vecs,out=None):
+        """Return representation of 3-component vectors vecs in the
+        coordinate system produced by the sequence of rotations
+        
+        Parameters
+        ----------
+        vecs : np.ndarray
+            Array of *n* 3-component vectors (shape=(*n*,3))
+        out : np.ndarray, optional
+            Array (shape=(*n*,3)) to store the result in. Can be `vecs` 
+            itself to rotate in place
+
+        Returns
+        -------
+        rotated_vecs : np.ndarray
+            The components of `vecs` in the rotated frame (shape=(*n*,3))
+        """
+        _check_follows_3_component_vector_convention(vecs)
+        n_angles = max([angle.size for angle in self._angles])
+        if n_angles not in (1,vecs.shape[0]):
+            raise ValueError(('Cannot map {} angle to '.format(n_angles)
+                              +'{} vectors'.format(vecs.shape[0])))
+        M = self._composed_entries()
+        out = prepare_output(out,vecs.shape,result_float_dtype(vecs))
+        components = [vecs[:,0],vecs[:,1],vecs[:,2]]
+        rotated = []
+        for k in range(3):
+            rotated_k = 0
+            for l in range(3):
+                rotated_k = _add_entries(rotated_k,
+                                         _multiply_entries(M[k][l],
+                                                           components[l]))
+            rotated.append(rotated_k)
+        for k in range(3):
+            out[:,k] = rotated[k]
+        return out
+
+def _quaternion_product(p,q):
+    """Hamilton product of arrays of scalar-last quaternions
+    (shape=(n,4) or (1,4))"""
+    px,py,pz,pw = p[:,0],p[:,1],p[:,2],p[:,3]
+    qx,qy,qz,qw = q[:,0],q[:,1],q[:,2],q[:,3]
+    return np.column_stack((pw*qx+px*qw+py*qz-pz*qy,
+                            pw*qy-px*qz+py*qw+pz*qx,
+                            pw*qz+px*qy-py*qx+pz*qw,
+                            pw*qw-px*qx-py*qy-pz*qz))
+
+class Quaternion(object):
+    """Array of n rotations of the coordinate axes stored as unit
+    quaternions (shape=(n,4), scalar last: x,y,z,w). 
+    
+    The rotation convention is the same as rotmat, rot and 
+    RotationSequence, i.e. applying a quaternion to a vector returns the
+    components of the vector in the rotated coordinate system, and
+    Quaternion.from_axis_angle(angles,axis).apply(vecs) is equivalent
+    to rot(angles,axis,vecs). Composing k rotations of n vectors costs
+    O(n*k), with no per-vector matrices.
+    """
+    def __init__(self,q,normalize=True):
+        """
+        Parameters
+        ----------
+        q : np.ndarray
+            Quaternions (shape=(n,4) or (4,)), scalar last
+        normalize : bool, optional
+            Scale q to unit length (default True)
+        """
+        q = np.array(q,dtype=float).reshape(-1,4)
+        if normalize:
+            q /= np.sqrt(np.sum(q**2,axis=1)).reshape(-1,1)
+        self.q = q
+
+    @classmethod
+    def identity(cls,n=1):
+        q = np.zeros((n,4))
+        q[:,3] = 1.
+        return cls(q,normalize=False)
+
+    @classmethod
+    def from_axis_angle(cls,angles,axis):
+        """Quaternion(s) equivalent to rotmat(angle,axis) for each angle
+
+        Parameters
+        ----------
+        angles : float or np.ndarray
+            The angle(s) (in radians) to rotate the coordinate axes by
+        axis : int
+            The axis (0,1,2) about which the rotation should be performed
+        """
+        if axis not in [0,1,2]:
+            raise ValueError('Invalid value for axis, valid values are 0,1 and 2')
+        half_angles = np.array(angles,dtype=float).flatten()/2.
+        q = np.zeros((half_angles.size,4))
+        #Rotating the coordinate axes by an angle rotates
+        #vectors by the opposite angle
+        q[:,axis] = -1*np.sin(half_angles)
+        q[:,3] = np.cos(half_angles)
+        return cls(q,normalize=False)
+
+    @classmethod
+    def from_sequence(cls,axes,angles):
+        """Quaternion(s) equivalent to the sequence of elementary rotations 
+        of RotationSequence(axes,angles) (rotations are applied in the 
+        order given)"""
+        quaternion = cls.from_axis_angle(angles[0],axes[0])
+        for angle,axis in zip(angles[1:],axes[1:]):
+            quaternion = quaternion.compose(cls.from_axis_angle(angle,axis))
+        return quaternion
+
+    def __len__(self):
+        return self.q.shape[0]
+
+    def __getitem__(self,key):
+        return Quaternion(self.q[key].reshape(-1,4),normalize=False)
+
+    def __repr__(self):
+        return 'Quaternion({})'.format(self.q)
+
+    def compose(self,other):
+        """The rotation which is this rotation followed by other
+        (so self.compose(other).apply(vecs) is other.apply(self.apply(vecs)))
+        
+        Parameters
+        ----------
+        other : Quaternion
+            The rotation to apply second, with 1 or the same number
+            of quaternions as this one
+        """
+        return Quaternion(_quaternion_product(other.q,self.q),normalize=False)
+
+    def inv(self):
+        """The inverse rotation(s)"""
+        q = self.q.copy()
+        q[:,:3] *= -1
+        return Quaternion(q,normalize=False)
+
+    def apply(self,vecs,out=None):
+        """Return representation of 3-component vectors vecs in the
+        rotated coordinate system(s)
+        
+        Parameters
+        ----------
+        vecs : np.ndarray
+            Array of *n* 3-component vectors (shape=(*n*,3))
+        out : np.ndarray, optional
+            Array (shape=(*n*,3)) to store the result in. Can be `vecs` 
+            itself to rotate in place
+
+        Returns
+        -------
+        rotated_vecs : np.ndarray
+            The components of `vecs` in the rotated frame (shape=(*n*,3))
+        """
+        _check_follows_3_component_vector_convention(vecs)
+        if len(self) not in (1,vecs.shape[0]):
+            raise ValueError(('Cannot map {} rotations to '.format(len(self))
+                              +'{} vectors'.format(vecs.shape[0])))
+        out = prepare_output(out,vecs.shape,result_float_dtype(vecs))
+        u,w = self.q[:,:3],self.q[:,3:]
+        #v' = v + 2w(u x v) + 2u x (u x v)
+        t = 2*np.cross(u,vecs)
+        out[:] = vecs+w*t+np.cross(u,t)
+        return out
+
+    def slerp(self,other,fractions):
+        """Spherical linear interpolation between this rotation
+        (fraction 0) and other (fraction 1)
+
+        Parameters
+        ----------
+        other : Quaternion
+            Rotation(s) to interpolate towards
+        fractions : float or np.ndarray
+            Fraction(s) of the way from this rotation to other
+
+        Returns
+        -------
+        interpolated : Quaternion
+            The interpolated rotation(s)
+        """
+        fractions = np.array(fractions,dtype=float).reshape(-1,1)
+        q0,q1 = self.q,other.q
+        cos_omega = np.sum(q0*q1,axis=1).reshape(-1,1)
+        #q and -q are the same rotation, take the shorter path
+        q1 = np.where(cos_omega<0.,-1*q1,q1)
+        cos_omega = np.clip(np.abs(cos_omega),0.,1.)
+        omega = np.arccos(cos_omega)
+        sin_omega = np.sin(omega)
+        #Use linear interpolation where the rotations are almost the
+        #same (normalizing afterwards)
+        nearly_same = sin_omega < 1e-8
+        safe_sin_omega = np.where(nearly_same,1.,sin_omega)
+        w0 = np.where(nearly_same,1.-fractions,
+                      np.sin((1.-fractions)*omega)/safe_sin_omega)
+        w1 = np.where(nearly_same,fractions,
+                      np.sin(fractions*omega)/safe_sin_omega)
+        return Quaternion(w0*q0+w1*q1)
+
+    def as_matrix(self):
+        """Equivalent rotation matrices (shape=(n,3,3)), such that
+        the matrix pre-multiplying a vector is the same as apply"""
+        x,y,z,w = self.q[:,0],self.q[:,1],self.q[:,2],self.q[:,3]
+        M = np.empty((len(self),3,3))
+        M[:,0,0] = 1.-2*(y*y+z*z)
+        M[:,0,1] = 2*(x*y-z*w)
+        M[:,0,2] = 2*(x*z+y*w)
+        M[:,1,0] = 2*(x*y+z*w)
+        M[:,1,1] = 1.-2*(x*x+z*z)
+        M[:,1,2] = 2*(y*z-x*w)
+        M[:,2,0] = 2*(x*z-y*w)
+        M[:,2,1] = 2*(y*z+x*w)
+        M[:,2,2] = 1.-2*(x*x+y*y)
+        return M
 
 if __name__ == '__main__':
 
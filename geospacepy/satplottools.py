@@ -10,6 +10,8 @@ from matplotlib.colors import Normalize, LogNorm
 from geospacepy.spherical_geometry import (angle_difference,
                                             angle_midpoint,
                                             great_circle_distance)
+from geospacepy.terrestrial_ellipsoidal import (geocentric2geodetic,
+                                                geodetic2geocentric)
 
 def dipole_tilt_angle(dts):
     """
@@ -82,21 +84,15 @@ def sathat(ut,pos,secondCoord='Longitude',lattype='geocentric',up_is_geodetic=Fa
     is accurate enough.
     """
     import random
-    #Define some useful constants and lambdas
-    ecc_earth=.081819221456
-
-    #Geocentric to Geodetic
-    gc2gd = lambda gclat: np.arctan2(np.tan(gclat/180*np.pi),(1.-ecc_earth**2.))/np.pi*180
-
-    #Geodetic to Geocentric
-    gd2gc = lambda gdlat: np.arctan2(np.tan(gdlat/180*np.pi),1./(1.-ecc_earth**2.))/np.pi*180
 
+    #Latitudes are converted assuming positions on the surface
+    #of the ellipsoid
     if lattype=='geocentric':
         gclat = pos[:,0]
-        gdlat = gc2gd(gclat)
+        gdlat,h_ellp = geocentric2geodetic(gclat)
     elif lattype=='geodetic':
         gdlat = pos[:,0]
-        gclat = gd2gc(gdlat)
+        gclat,r = geodetic2geocentric(gdlat,0.)
     else:
         raise ValueError('%s is not a valid selection for lattype' % (lattype))
 
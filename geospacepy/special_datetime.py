@@ -2,6 +2,7 @@
 # Written by Liam M. Kilcommons
 import numpy as np
 import traceback, logging,textwrap
+import warnings
 from functools import wraps
 import datetime
 import bisect
@@ -24,92 +25,31 @@ def _update_vectorized_conversion_func_docstring(vectorized_conversion_func):
     newdoc = origdoc.replace(short_description,short_description+' (vectorized)')
     vectorized_conversion_func.__doc__ = newdoc
     
-def _vectorized_datetime2(conversion_func):
+def _vectorized_datetime2(conversion_func,datetime64_conversion_func):
     """Generates a vectorized version of a conversion function which converts
-    from datetime to something else"""
+    from datetime to something else. The collection of datetimes is converted
+    to a numpy datetime64 array in one bulk operation and then passed to
+    datetime64_conversion_func, which does the conversion
+    with array arithmetic"""
     @wraps(conversion_func)
-    def vectorized_conversion_func(datetimes,*args):
+    def vectorized_conversion_func(datetimes):
 
-        if isinstance(datetimes,datetime.datetime):
+        if isinstance(datetimes,(datetime.datetime,np.datetime64)):
             raise ValueError(('This functions is for lists/arrays of datetimes.'
                               +'Use {}'.format(conversion_func.__name__)
                               +'for single (scalar) datetime inputs'))
-        elif isinstance(datetimes,np.ndarray):
-            #Numpy array of datetimes passed
-            dts = datetimes.flatten().tolist()
-            converted_shape = datetimes.shape
-            converted_size = datetimes.size
-        else:
+        elif not isinstance(datetimes,np.ndarray):
             #Make sure it's indexable
             try:
                 dt = datetimes[0]
             except:
                 raise ValueError(('Datetime collection {}'.format(datetimes)
                                   +' is not indexable. Try an array or list.'))
-            #Assume things will work out and plan to return a flat array
-            dts = datetimes
-            converted_shape = (len(datetimes),)
-            converted_size = len(datetimes)
 
-        #Handle the arguments
-        #Strings are indexable but not a collection, so forbid using them
-        #as arguments to a time conversion function
-        if any([isinstance(arg,str) for arg in args]):
-            raise ValueError(('An argument of type str used in a time conversion'
-                              +'function. Since strings are indexable and'
-                              +'not easily distinguishable from "real"'
-                              +'collections, this is not an allowed input type'))
-
-        cleaned_args = []
-        arg_is_indexable = []
-        for iarg,arg in enumerate(args):
-            if isinstance(arg,np.ndarray):
-                #Passed argument is a np array
-                if len(arg)==1 or arg.size==converted_size:
-                    cleaned_arg = arg.flatten().tolist()
-                    if len(arg)==1:
-                        cleaned_args.append(cleaned_arg[0])
-                        arg_is_indexable.append(False)
-                    else:
-                        cleaned_args.append(cleaned_arg)
-                        arg_is_indexable.append(True)
-                else:
-                    raise ValueError(('Extra argument {} '.format(iarg)
-                                      +'unexpected shape '
-                                      +' ({}!={})'.format(arg.shape,
-                                                        converted_shape)))
-            elif isinstance(arg,float) or isinstance(arg,int):
-                #A scalar value was passed
-                cleaned_args.append(arg)
-                arg_is_indexable.append(False)
-            else:
-                try:
-                    a = arg[0]
-                    arglen = len(arg)
-                except:
-                    raise ValueError(('Argument {} is not indexable'.format(arg)
-                                      +' or does not have a length'
-                                      +' if it is meant to be a collection'
-                                      +' of inputs to a time conversion function'
-                                      +' try using an array or list'))
-                cleaned_args.append(arg)
-                arg_is_indexable.append(True)
-
-        #Finally do the conversion
-        converted_times = np.empty(converted_shape)
-        for i_t in range(len(dts)):
-            conversion_args = [dts[i_t]]
-            for arg,indexable in zip(cleaned_args,arg_is_indexable):
-                if indexable:
-                    conversion_args.append(arg[i_t])
-                else:
-                    conversion_args.append(arg)
-
-            #This is required to make outputing column arrays work
-            ind_tup = np.unravel_index(i_t,converted_shape)
-            converted_times[ind_tup] = conversion_func(*conversion_args)
-
-        return converted_times
+        #Output shape mirrors numpy array inputs, other collections
+        #produce a flat array
+        dt64s = datetimearr2datetime64(datetimes)
+        return datetime64_conversion_func(dt64s)
 
     vectorized_name = conversion_func.__name__.replace('datetime2','datetimearr2')
     vectorized_conversion_func.__name__ = vectorized_name
@@ -118,18 +58,21 @@ def _vectorized_datetime2(conversion_func):
     
     return vectorized_conversion_func
 
-def _vectorized_2datetime(conversion_func):
+def _vectorized_2datetime(conversion_func,datetime64_conversion_func):
     """Generates a function which converts a time into an
     np array of datetimes. If the inputs are np arrays, the output array
     will mirror the inputs' shape. If inputs aren't arrays, then the output
-    array will be flat"""
+    array will be flat. The conversion itself is done with array
+    arithmetic by datetime64_conversion_func"""
     @wraps(conversion_func)
     def vectorized_conversion_func(numerical_times,*args):
         #Strings are indexable but not a collection, so forbid using them
         #as arguments to a time conversion function
         if any([isinstance(arg,str) for arg in args]):
             raise ValueError(('An argument of type str used in a time conversion'
-                              +'function.'))
+                              +'function. Since strings are indexable and'
+                              +'not easily distinguishable from "real"'
+                              +'collections, this is not an allowed input type'))
 
         if isinstance(numerical_times,float) or isinstance(numerical_times,int):
             raise ValueError(('This function is for lists/arrays'
@@ -137,10 +80,8 @@ def _vectorized_2datetime(conversion_func):
                               +'for single (scalar) inputs'))
 
         elif isinstance(numerical_times,np.ndarray):
-            #Numpy array of datetimes passed
-            ts = numerical_times.flatten().tolist()
-            converted_shape = numerical_times.shape
-            converted_size = numerical_times.size
+            #Numpy array of times passed
+            ts = numerical_times
         else:
             #Make sure it's indexable and has a length
             try:
@@ -151,70 +92,39 @@ def _vectorized_2datetime(conversion_func):
                                   +' is not indexable or does not'
                                   +' have a length. Try an array or list.'))
             #Assume things will work out and plan to return a flat array
-            ts = numerical_times
-            converted_shape = (len(ts),)
-            converted_size = len(ts)
-
-        #Handle the arguments
-        #Strings are indexable but not a collection, so forbid using them
-        #as arguments to a time conversion function
-        if any([isinstance(arg,str) for arg in args]):
-            raise ValueError(('An argument of type str used in a time conversion'
-                              +'function. Since strings are indexable and'
-                              +'not easily distinguishable from "real"'
-                              +'collections, this is not an allowed input type'))
+            ts = np.asarray(numerical_times,dtype=float).flatten()
+        converted_shape = ts.shape
+        converted_size = ts.size
 
-        #Check the rest of the arguments
+        #Check the rest of the arguments, they must be single values
+        #or have one value for each time
         cleaned_args = []
-        arg_is_indexable = []
         for iarg,arg in enumerate(args):
-            if isinstance(arg,np.ndarray):
-                #Passed argument is a np array
-                if len(arg)==1 or arg.size==converted_size:
-                    cleaned_arg = arg.flatten().tolist()
-                    if len(arg)==1:
-                        cleaned_args.append(cleaned_arg[0])
-                        arg_is_indexable.append(False)
-                    else:
-                        cleaned_args.append(cleaned_arg)
-                        arg_is_indexable.append(True)
-                else:
-                    raise ValueError(('Extra argument {} '.format(iarg)
-                                      +'unexpected shape '
-                                      +' ({}!={})'.format(arg.shape,
-                                                        converted_shape)))
-            elif isinstance(arg,float) or isinstance(arg,int):
+            if isinstance(arg,float) or isinstance(arg,int):
                 #A scalar value was passed
                 cleaned_args.append(arg)
-                arg_is_indexable.append(False)
+                continue
+            try:
+                a = arg[0]
+                arglen = len(arg)
+            except:
+                raise ValueError(('Argument {} is not indexable'.format(arg)
+                                  +' or does not have a length'
+                                  +' if it is meant to be a collection'
+                                  +' of inputs to a time conversion function'
+                                  +' try using an array or list'))
+            arg = np.asarray(arg)
+            if arg.size == 1:
+                cleaned_args.append(arg.flatten()[0])
+            elif arg.size == converted_size:
+                cleaned_args.append(arg.reshape(converted_shape))
             else:
-                try:
-                    a = arg[0]
-                    arglen = len(arg)
-                except:
-                    raise ValueError(('Argument {} is not indexable'.format(arg)
-                                      +' or does not have a length'
-                                      +' if it is meant to be a collection'
-                                      +' of inputs to a time conversion function'
-                                      +' try using an array or list'))
-                cleaned_args.append(arg)
-                arg_is_indexable.append(True)
-
-        #Initialize the output array
-        converted_dts = np.empty(converted_shape,dtype='object')
-        print(converted_shape)
-        for i_t in range(len(ts)):
-            conversion_args = [ts[i_t]]
-            for arg,indexable in zip(cleaned_args,arg_is_indexable):
-                if indexable:
-                    conversion_args.append(arg[i_t])
-                else:
-                    conversion_args.append(arg)
-            #This is required to make outputing column arrays work
-            ind_tup = np.unravel_index(i_t,converted_shape)
-            converted_dts[ind_tup] = conversion_func(*conversion_args)
+                raise ValueError(('Extra argument {} '.format(iarg)
+                                  +'unexpected shape '
+                                  +' ({}!={})'.format(arg.shape,
+                                                    converted_shape)))
 
-        return converted_dts
+        return datetime64_conversion_func(ts,*cleaned_args,as_object=True)
 
     vectorized_name = conversion_func.__name__.replace('2datetime','arr2datetime')
     vectorized_conversion_func.__name__ = vectorized_name
@@ -223,6 +133,422 @@ def _vectorized_2datetime(conversion_func):
    
     return vectorized_conversion_func
 
+#Offsets of time types (in days) relative to the datetime64 (UNIX) epoch
+#(midnight on January 1, 1970)
+_JD_UNIX_EPOCH = 2440587.5
+_J2000_UNIX_EPOCH = _JD_UNIX_EPOCH-2451545.0
+_DATENUM_UNIX_EPOCH = 719529.
+
+def datetimearr2datetime64(datetimes):
+    """Converts a list or array of Python datetimes to a numpy datetime64
+    array in one bulk operation. Arrays which are already datetime64
+    with microsecond or nanosecond resolution are returned unchanged.
+
+    Parameters
+    ----------
+    datetimes : list or np.ndarray
+        Python datetimes (or numpy datetime64s). The timezones of
+        timezone-aware datetimes are ignored (their wall-clock time is
+        used, like datetime2jd and the other scalar conversions)
+
+    Returns
+    -------
+    dt64s : np.ndarray
+        datetime64 array. If the input was a numpy array, the output will
+        mirror its shape, otherwise the output array will be flat.
+        Missing values (None) become NaT
+    """
+    if isinstance(datetimes,np.ndarray) and datetimes.dtype.kind == 'M':
+        unit,count = np.datetime_data(datetimes.dtype)
+        if unit in ('us','ns') and count == 1:
+            return datetimes
+    #numpy converts timezone-aware datetimes to UTC (with a warning),
+    #but datetime2jd and the other scalar conversions use the wall-clock 
+    #time and ignore the timezone, so do the same here
+    with warnings.catch_warnings():
+        warnings.filterwarnings('error',category=UserWarning,
+                                message='no explicit representation of timezones')
+        try:
+            return np.asarray(datetimes,dtype='datetime64[us]')
+        except UserWarning:
+            pass
+    wall_clock = np.frompyfunc(_without_timezone,1,1)(np.asarray(datetimes,
+                                                                 dtype=object))
+    return np.asarray(wall_clock,dtype='datetime64[us]')
+
+def _without_timezone(dt):
+    """Datetime with the same wall-clock time and no timezone"""
+    if getattr(dt,'tzinfo',None) is not None:
+        return dt.replace(tzinfo=None)
+    return dt
+
+def _datetime64_ticks(dt64s):
+    """Integer ticks since the UNIX epoch of a datetime64 array, and the
+    number of ticks per second. Nanosecond resolution is retained, all
+    other resolutions are represented in microseconds"""
+    dt64s = datetimearr2datetime64(dt64s)
+    unit,count = np.datetime_data(dt64s.dtype)
+    ticks_per_second = 10**9 if unit == 'ns' else 10**6
+    return dt64s.view('int64'),ticks_per_second
+
+def _datetime64_day_and_fraction(dt64s):
+    """Splits a datetime64 array into integer days since the UNIX epoch
+    and the (float) fraction of the day elapsed. Splitting
+    before converting to floating point means no precision is lost
+    to the (large) day count"""
+    ticks,ticks_per_second = _datetime64_ticks(dt64s)
+    ticks_per_day = 86400*ticks_per_second
+    days,day_ticks = np.divmod(ticks,ticks_per_day)
+    fracs = day_ticks/ticks_per_day
+    return days,fracs
+
+def _nat_to_nan(dt64s,converted):
+    """Set converted values corresponding to NaT datetime64s to NaN"""
+    nat = np.isnat(dt64s)
+    if np.any(nat):
+        converted[nat] = np.nan
+    return converted
+
+def datetime64arr2jd(dt64s):
+    """Converts an array of numpy datetime64 to Julian Date
+    (days since 12:00 PM on January 1, 4713 B.C.)
+
+    Parameters
+    ----------
+    dt64s : np.ndarray
+        datetime64 array (any shape)
+
+    Returns
+    -------
+    jds : np.ndarray
+        Julian dates (same shape as dt64s, NaN where dt64s is NaT)
+    """
+    dt64s = datetimearr2datetime64(dt64s)
+    days,fracs = _datetime64_day_and_fraction(dt64s)
+    return _nat_to_nan(dt64s,(days+_JD_UNIX_EPOCH)+fracs)
+
+def datetime64arr2jdparts(dt64s,frac_dtype=np.float64):
+    """Converts an array of numpy datetime64 to two-part Julian Date
+    (integer julian day and fraction of the julian day), which
+    together represent the time much more precisely
+    than a single float64 julian date (~40 microseconds)
+
+    Parameters
+    ----------
+    dt64s : np.ndarray
+        datetime64 array (any shape)
+    frac_dtype : np.dtype, optional
+        Floating point type of the fractional part, float32 halves
+        the storage required, but only resolves about 5 miliseconds
+
+    Returns
+    -------
+    jd_days : np.ndarray
+        Integer julian days (int64, same shape as dt64s)
+    jd_fracs : np.ndarray
+        Fraction of the julian day in [0,1) (same shape as dt64s)
+    """
+    dt64s = datetimearr2datetime64(dt64s)
+    if np.any(np.isnat(dt64s)):
+        raise ValueError('NaT can not be converted to two-part julian date')
+    ticks,ticks_per_second = _datetime64_ticks(dt64s)
+    ticks_per_day = 86400*ticks_per_second
+    #Julian days start at noon
+    days,day_ticks = np.divmod(ticks+ticks_per_day//2,ticks_per_day)
+    jd_days = days+int(_JD_UNIX_EPOCH-.5)
+    jd_fracs = (day_ticks/ticks_per_day).astype(frac_dtype)
+    return jd_days,jd_fracs
+
+def datetime64arr2j2000(dt64s):
+    """Converts an array of numpy datetime64 to Julian date
+    relative to j2000 Epoch (Noon on Jan 1, 2000)
+
+    Parameters
+    ----------
+    dt64s : np.ndarray
+        datetime64 array (any shape)
+
+    Returns
+    -------
+    j2000s : np.ndarray
+        J2000 julian dates (same shape as dt64s, NaN where dt64s is NaT)
+    """
+    dt64s = datetimearr2datetime64(dt64s)
+    days,fracs = _datetime64_day_and_fraction(dt64s)
+    return _nat_to_nan(dt64s,(days+_J2000_UNIX_EPOCH)+fracs)
+
+def datetime64arr2datenum(dt64s):
+    """Converts an array of numpy datetime64 to matlab epoch (datenum)
+
+    Parameters
+    ----------
+    dt64s : np.ndarray
+        datetime64 array (any shape)
+
+    Returns
+    -------
+    mleps : np.ndarray
+        Matlab datenums (same shape as dt64s, NaN where dt64s is NaT)
+    """
+    dt64s = datetimearr2datetime64(dt64s)
+    days,fracs = _datetime64_day_and_fraction(dt64s)
+    return _nat_to_nan(dt64s,(days+_DATENUM_UNIX_EPOCH)+fracs)
+
+def _datetime64_ticks_since_year_start(dt64s):
+    """Integer ticks elapsed since midnight on January 1 of the year
+    of each datetime64, and the number of ticks per second"""
+    ticks,ticks_per_second = _datetime64_ticks(dt64s)
+    year_start_days = dt64s.astype('datetime64[Y]').astype('datetime64[D]')
+    year_start_ticks = year_start_days.view('int64')*(86400*ticks_per_second)
+    return ticks-year_start_ticks,ticks_per_second
+
+def datetime64arr2doy(dt64s):
+    """Converts an array of numpy datetime64 to (decimal) day of year
+
+    Parameters
+    ----------
+    dt64s : np.ndarray
+        datetime64 array (any shape)
+
+    Returns
+    -------
+    doys : np.ndarray
+        Days of year (same shape as dt64s, NaN where dt64s is NaT)
+    """
+    dt64s = datetimearr2datetime64(dt64s)
+    year_ticks,ticks_per_second = _datetime64_ticks_since_year_start(dt64s)
+    doys = year_ticks/(86400*ticks_per_second)+1.
+    return _nat_to_nan(dt64s,doys)
+
+def datetime64arr2soy(dt64s):
+    """Converts an array of numpy datetime64 to (decimal) second of year
+
+    Parameters
+    ----------
+    dt64s : np.ndarray
+        datetime64 array (any shape)
+
+    Returns
+    -------
+    soys : np.ndarray
+        Seconds of year (same shape as dt64s, NaN where dt64s is NaT)
+    """
+    dt64s = datetimearr2datetime64(dt64s)
+    year_ticks,ticks_per_second = _datetime64_ticks_since_year_start(dt64s)
+    return _nat_to_nan(dt64s,year_ticks/ticks_per_second)
+
+def datetime64arr2sod(dt64s):
+    """Converts an array of numpy datetime64 to (decimal) second of day
+
+    Parameters
+    ----------
+    dt64s : np.ndarray
+        datetime64 array (any shape)
+
+    Returns
+    -------
+    sods : np.ndarray
+        Seconds of day (same shape as dt64s, NaN where dt64s is NaT)
+    """
+    dt64s = datetimearr2datetime64(dt64s)
+    ticks,ticks_per_second = _datetime64_ticks(dt64s)
+    day_ticks = np.mod(ticks,86400*ticks_per_second)
+    return _nat_to_nan(dt64s,day_ticks/ticks_per_second)
+
+def _check_datetime64_unit(unit):
+    if unit not in ('us','ns'):
+        raise ValueError(('Invalid datetime64 unit {},'.format(unit)
+                          +' valid values are us or ns'))
+    return 10**6 if unit == 'us' else 10**9
+
+def _ticks2datetime64(ticks,nans,unit,as_object):
+    """Create a datetime64 array (or an object array of datetimes)
+    from integer ticks since the UNIX epoch, with NaT wherever nans is True"""
+    ticks = np.where(nans,np.iinfo(np.int64).min,ticks)
+    dt64s = ticks.view('datetime64[{}]'.format(unit))
+    if as_object:
+        #Python datetimes have microsecond resolution (NaT becomes None)
+        return dt64s.astype('datetime64[us]').astype(object)
+    return dt64s
+
+def _epoch_days2datetime64(epoch_days,unit,as_object):
+    """Convert floating point days since the UNIX epoch to datetime64.
+    The whole and fractional days are converted to integer ticks
+    separately, so that no precision is lost to the (large) day count"""
+    ticks_per_second = _check_datetime64_unit(unit)
+    ticks_per_day = 86400*ticks_per_second
+    nans = np.logical_not(np.isfinite(epoch_days))
+    epoch_days = np.where(nans,0.,epoch_days)
+    whole_days = np.floor(epoch_days)
+    day_ticks = np.rint((epoch_days-whole_days)*ticks_per_day)
+    ticks = whole_days.astype(np.int64)*ticks_per_day+day_ticks.astype(np.int64)
+    return _ticks2datetime64(ticks,nans,unit,as_object)
+
+def _seconds_after_days2datetime64(epoch_days,seconds,unit,as_object):
+    """Convert a number of seconds after a (integer) day since
+    the UNIX epoch to datetime64"""
+    ticks_per_second = _check_datetime64_unit(unit)
+    nans = np.logical_not(np.isfinite(seconds))
+    seconds = np.where(nans,0.,seconds)
+    ticks = (epoch_days.astype(np.int64)*(86400*ticks_per_second)
+             +np.rint(seconds*ticks_per_second).astype(np.int64))
+    return _ticks2datetime64(ticks,nans,unit,as_object)
+
+def _year_start_epoch_days(years):
+    """Days since the UNIX epoch of January 1 of each year"""
+    years = np.asarray(years).astype(np.int64)
+    return (years-1970).astype('datetime64[Y]').astype('datetime64[D]').view(np.int64)
+
+def _ymd_epoch_days(years,months,days):
+    """Days since the UNIX epoch of each year, month, day"""
+    years = np.asarray(years).astype(np.int64)
+    months = np.asarray(months).astype(np.int64)
+    days = np.asarray(days).astype(np.int64)
+    epoch_months = ((years-1970)*12+(months-1)).astype('datetime64[M]')
+    return epoch_months.astype('datetime64[D]').view(np.int64)+(days-1)
+
+def jdarr2datetime64(jds,unit='us',as_object=False):
+    """Converts an array of Julian Dates (days since 12:00 PM on
+    January 1, 4713 B.C.) to numpy datetime64
+
+    Parameters
+    ----------
+    jds : np.ndarray
+        Julian dates (any shape)
+    unit : str, optional
+        Resolution of the output, 'us' (microseconds, default)
+        or 'ns' (nanoseconds)
+    as_object : bool, optional
+        If True, return an object array of Python datetimes instead
+        (for legacy code, this is much slower and uses more memory)
+
+    Returns
+    -------
+    dt64s : np.ndarray
+        datetime64 array (same shape as jds, NaT where jds is not finite)
+    """
+    jds = np.asarray(jds,dtype=float)
+    return _epoch_days2datetime64(jds-_JD_UNIX_EPOCH,unit,as_object)
+
+def j2000arr2datetime64(j2000s,unit='us',as_object=False):
+    """Converts an array of Julian dates relative to j2000 Epoch 
+    (Noon on Jan 1, 2000) to numpy datetime64
+
+    Parameters
+    ----------
+    j2000s : np.ndarray
+        J2000 julian dates (any shape)
+    unit : str, optional
+        Resolution of the output, 'us' (microseconds, default)
+        or 'ns' (nanoseconds)
+    as_object : bool, optional
+        If True, return an object array of Python datetimes instead
+
+    Returns
+    -------
+    dt64s : np.ndarray
+        datetime64 array (same shape as j2000s)
+    """
+    j2000s = np.asarray(j2000s,dtype=float)
+    return _epoch_days2datetime64(j2000s-_J2000_UNIX_EPOCH,unit,as_object)
+
+def datenumarr2datetime64(mleps,unit='us',as_object=False):
+    """Converts an array of matlab epoch (datenum) to numpy datetime64
+
+    Parameters
+    ----------
+    mleps : np.ndarray
+        Matlab datenums (any shape)
+    unit : str, optional
+        Resolution of the output, 'us' (microseconds, default)
+        or 'ns' (nanoseconds)
+    as_object : bool, optional
+        If True, return an object array of Python datetimes instead
+
+    Returns
+    -------
+    dt64s : np.ndarray
+        datetime64 array (same shape as mleps)
+    """
+    mleps = np.asarray(mleps,dtype=float)
+    return _epoch_days2datetime64(mleps-_DATENUM_UNIX_EPOCH,unit,as_object)
+
+def doyarr2datetime64(doys,years,unit='us',as_object=False):
+    """Converts an array of (decimal) day of year to numpy datetime64
+
+    Parameters
+    ----------
+    doys : np.ndarray
+        Days of year
+    years : int or np.ndarray
+        Year, or years (must broadcast against doys)
+    unit : str, optional
+        Resolution of the output, 'us' (microseconds, default)
+        or 'ns' (nanoseconds)
+    as_object : bool, optional
+        If True, return an object array of Python datetimes instead
+
+    Returns
+    -------
+    dt64s : np.ndarray
+        datetime64 array (broadcast shape of doys and years)
+    """
+    doys = np.asarray(doys,dtype=float)
+    seconds = (doys-1.)*86400.
+    epoch_days = _year_start_epoch_days(years)
+    epoch_days,seconds = np.broadcast_arrays(epoch_days,seconds)
+    return _seconds_after_days2datetime64(epoch_days,seconds,unit,as_object)
+
+def soyarr2datetime64(soys,years,unit='us',as_object=False):
+    """Converts an array of (decimal) second of year to numpy datetime64
+
+    Parameters
+    ----------
+    soys : np.ndarray
+        Seconds of year
+    years : int or np.ndarray
+        Year, or years (must broadcast against soys)
+    unit : str, optional
+        Resolution of the output, 'us' (microseconds, default)
+        or 'ns' (nanoseconds)
+    as_object : bool, optional
+        If True, return an object array of Python datetimes instead
+
+    Returns
+    -------
+    dt64s : np.ndarray
+        datetime64 array (broadcast shape of soys and years)
+    """
+    seconds = np.asarray(soys,dtype=float)
+    epoch_days = _year_start_epoch_days(years)
+    epoch_days,seconds = np.broadcast_arrays(epoch_days,seconds)
+    return _seconds_after_days2datetime64(epoch_days,seconds,unit,as_object)
+
+def sodarr2datetime64(sods,years,months,days,unit='us',as_object=False):
+    """Converts an array of (decimal) second of day to numpy datetime64
+
+    Parameters
+    ----------
+    sods : np.ndarray
+        Seconds of day
+    years,months,days : int or np.ndarray
+        Date(s) (must broadcast against sods)
+    unit : str, optional
+        Resolution of the output, 'us' (microseconds, default)
+        or 'ns' (nanoseconds)
+    as_object : bool, optional
+        If True, return an object array of Python datetimes instead
+
+    Returns
+    -------
+    dt64s : np.ndarray
+        datetime64 array (broadcast shape of all inputs)
+    """
+    seconds = np.asarray(sods,dtype=float)
+    epoch_days = _ymd_epoch_days(years,months,days)
+    epoch_days,seconds = np.broadcast_arrays(epoch_days,seconds)
+    return _seconds_after_days2datetime64(epoch_days,seconds,unit,as_object)
+
 def datetime2jd(dt):
     """Converts between Python datetime and Julian Date
     (days since 12:00 PM on January 1, 4713 B.C.)
@@ -246,7 +572,7 @@ def datetime2jd(dt):
     jd = t1-t2+t3+t4+t5
     return jd
 
-datetimearr2jd = _vectorized_datetime2(datetime2jd)
+datetimearr2jd = _vectorized_datetime2(datetime2jd,datetime64arr2jd)
 
 def jd2datetime(jd):
     """Converts between Julian Date (days since 12:00 PM on January 1, 4713 B.C.)
@@ -275,7 +601,7 @@ def jd2datetime(jd):
     #doy = np.floor(days)
     return datetime.datetime(int(year),1,1,0,0,0)+datetime.timedelta(days=(days-1))
 
-jdarr2datetime = _vectorized_2datetime(jd2datetime)
+jdarr2datetime = _vectorized_2datetime(jd2datetime,jdarr2datetime64)
 
 def datetime2j2000(dt):
     """Datetime to Julian date relative to j2000 Epoch (Noon on Jan 1, 2000)
@@ -291,6 +617,8 @@ def datetime2j2000(dt):
     """
     return datetime2jd(dt)-datetime2jd(dt_j2000)
 
+datetimearr2j2000 = _vectorized_datetime2(datetime2j2000,datetime64arr2j2000)
+
 def j20002datetime(j2000):
     """Julian date relative to j2000 Epoch (Noon on Jan 1, 2000) to datetime
     
@@ -304,6 +632,8 @@ def j20002datetime(j2000):
     """
     return jd2datetime(j2000 + datetime2jd(dt_j2000))
 
+j2000arr2datetime = _vectorized_2datetime(j20002datetime,j2000arr2datetime64)
+
 def datetime2doy(dt):
     """Python datetime to (decimal) day of year
     
@@ -318,7 +648,7 @@ def datetime2doy(dt):
     """
     return dt.timetuple().tm_yday + dt.hour/24. + dt.minute/24./60. + dt.second/86400. + dt.microsecond/86400./1e6
 
-datetimearr2doy = _vectorized_datetime2(datetime2doy)
+datetimearr2doy = _vectorized_datetime2(datetime2doy,datetime64arr2doy)
 
 def doy2datetime(doy,year):
     """Day of year to python datetime
@@ -334,7 +664,7 @@ def doy2datetime(doy,year):
     """
     return datetime.datetime(int(year),1,1,0,0,0)+datetime.timedelta(days=doy-1.) #Returns floating point day of year
 
-doyarr2datetime = _vectorized_2datetime(doy2datetime)
+doyarr2datetime = _vectorized_2datetime(doy2datetime,doyarr2datetime64)
 
 def datetime2datenum(dt):
     """Python datetime to matlab epoch (datenum)
@@ -349,7 +679,7 @@ def datetime2datenum(dt):
     """
     return dt.toordinal() + 366. + dt.hour/24. + dt.minute/24./60. + dt.second/86400. + dt.microsecond/86400./1e6
 
-datetimearr2datenum = _vectorized_datetime2(datetime2datenum)
+datetimearr2datenum = _vectorized_datetime2(datetime2datenum,datetime64arr2datenum)
 
 def datenum2datetime(mlep):
     """Matlab epoch (datenum) to python datetime
@@ -364,7 +694,7 @@ def datenum2datetime(mlep):
     """
     return datetime.datetime.fromordinal(int(np.floor(mlep))) + datetime.timedelta(days=np.mod(mlep,1)) - datetime.timedelta(days = 366)
 
-datenumarr2datetime = _vectorized_2datetime(datenum2datetime)
+datenumarr2datetime = _vectorized_2datetime(datenum2datetime,datenumarr2datetime64)
 
 def datetime2sod(dt):
     """Python datetime to (decimal) second of day
@@ -379,7 +709,7 @@ def datetime2sod(dt):
     """
     return (dt-datetime.datetime.combine(dt.date(),datetime.time(0))).total_seconds()
 
-datetimearr2sod = _vectorized_datetime2(datetime2sod) #Not checked
+datetimearr2sod = _vectorized_datetime2(datetime2sod,datetime64arr2sod)
 
 def sod2datetime(sod,year,month,day):
     """Second of day to datetime
@@ -397,7 +727,7 @@ def sod2datetime(sod,year,month,day):
     """
     return datetime.datetime(year,month,day)+datetime.timedelta(seconds=sod)
 
-sodarr2datetime = _vectorized_2datetime(sod2datetime)
+sodarr2datetime = _vectorized_2datetime(sod2datetime,sodarr2datetime64)
 
 def datetime2soy(dt):
     """Datetime to second of year
@@ -412,6 +742,8 @@ def datetime2soy(dt):
     """
     return (dt-datetime.datetime(dt.year,1,1)).total_seconds()
 
+datetimearr2soy = _vectorized_datetime2(datetime2soy,datetime64arr2soy)
+
 def soy2datetime(soy,year):
     """Second of year to datetime
     
@@ -426,6 +758,8 @@ def soy2datetime(soy,year):
     """
     return datetime.datetime(year,1,1)+datetime.timedelta(seconds=np.floor(soy))
 
+soyarr2datetime = _vectorized_2datetime(soy2datetime,soyarr2datetime64)
+
 # def datetimearr2jd(datetimearr):
 #     """
 #     Converts a n x 1 or 1 x n or (n,) array of python datetimes
@@ -647,6 +981,13 @@ def fastMatchTimes(primary_dt,dt,tol_us=4e5,fail_on_duplicates=True,allow_duplic
             Array of len(dt) of indices into
             primary_dt or NaN if no match was found
             for a partiuclar dt value.
+
+    .. note::
+
+        matchTimes is a vectorized replacement for this function
+        which is much faster for large arrays, and returns a
+        boolean mask of matched values instead of NaN (which
+        cannot be represented in the integer output array)
     
     """
 
@@ -784,3 +1125,558 @@ def fastMatchTimes(primary_dt,dt,tol_us=4e5,fail_on_duplicates=True,allow_duplic
     log.info("%d/%d values are nan (unmatched)." % (len(naninds),len(inds)))
 
     return inds
+
+def _datetimes2epoch_us(datetimes):
+    """Flat int64 array of microseconds since the UNIX epoch of a list or
+    array of datetimes (Python datetime or numpy datetime64), and a mask
+    of which datetimes were NaT (or None)"""
+    dt64s = datetimearr2datetime64(datetimes).ravel()
+    return dt64s.astype('datetime64[us]').view(np.int64),np.isnat(dt64s)
+
+def _nearest_within_tolerance(primary_ep,ep,tol):
+    """For each value in ep, find the index of the closest value in the
+    sorted array primary_ep. When two values are equally close, the earlier
+    one is chosen. Returns the indices, the absolute differences and a mask
+    which is True where the difference is less than tol"""
+    n_primary = primary_ep.size
+    if n_primary == 0:
+        inds = np.zeros(ep.shape,dtype=np.int64)
+        return inds,np.zeros_like(ep),np.zeros(ep.shape,dtype=bool)
+    #First index in primary_ep which is >= each ep value
+    ind_after = np.searchsorted(primary_ep,ep,side='left')
+    ind_before = np.clip(ind_after-1,0,n_primary-1)
+    ind_after = np.clip(ind_after,0,n_primary-1)
+    delta_before = np.abs(ep-primary_ep[ind_before])
+    delta_after = np.abs(primary_ep[ind_after]-ep)
+    use_after = delta_after < delta_before
+    inds = np.where(use_after,ind_after,ind_before)
+    deltas = np.where(use_after,delta_after,delta_before)
+    return inds,deltas,deltas < tol
+
+def _discard_duplicate_matches(inds,deltas,matched,positions=None):
+    """Where more than one value was matched to the same index, keep only
+    the closest match (the earliest position, if equally close).
+    matched is modified in place and returned"""
+    if positions is None:
+        positions = np.arange(inds.size)
+    cands = np.flatnonzero(matched)
+    #Sort by matched index, then by closeness, then by position
+    order = np.lexsort((positions[cands],deltas[cands],inds[cands]))
+    cands = cands[order]
+    cand_inds = inds[cands]
+    duplicate = np.zeros(cands.shape,dtype=bool)
+    duplicate[1:] = cand_inds[1:] == cand_inds[:-1]
+    matched[cands[duplicate]] = False
+    return matched
+
+def matchTimes(primary_dt,dt,tol_us=4e5,allow_duplicates=False):
+    """Finds the closest timestamp in primary_dt 
+    within tolerance tol_us (given in microseconds)
+    for every value in dt. Fully vectorized version of fastMatchTimes.
+
+    Parameters
+    ----------
+
+        primary_dt - np.ndarray or list, size=m
+            The timestamps (Python datetime or numpy datetime64) which will 
+            be searched. Does not need to be sorted
+        dt - np.ndarray or list, size=n
+            The timestamps (Python datetime or numpy datetime64)
+            for which you want to find matches 
+        tol_us - float, optional
+            Maximum difference (exclusive) between matching timestamps 
+            in microseconds
+        allow_duplicates - bool, optional
+            If False (default), each value in primary_dt is matched to at 
+            most one value in dt (the closest one, or the earliest one
+            if equally close). If True, many values in dt can be matched to 
+            the same value of primary_dt
+
+    Returns
+    -------
+    
+        inds - np.ndarray, shape=(n,), dtype=int
+            Indices into primary_dt of the match for each value in dt
+            (-1 where no match was found)
+        matched - np.ndarray, shape=(n,), dtype=bool
+            True where a match was found
+    
+    .. note::
+
+        When a value in dt is equally close to two values in primary_dt,
+        the earlier value is chosen
+
+    """
+    primary_ep,primary_nat = _datetimes2epoch_us(primary_dt)
+    ep,nat = _datetimes2epoch_us(dt)
+
+    #Search only valid (non NaT) primary times, in sorted order
+    primary_order = None
+    if np.any(primary_nat) or np.any(np.diff(primary_ep)<0):
+        valid = np.flatnonzero(np.logical_not(primary_nat))
+        primary_order = valid[np.argsort(primary_ep[valid],kind='stable')]
+        primary_ep = primary_ep[primary_order]
+
+    inds,deltas,matched = _nearest_within_tolerance(primary_ep,ep,tol_us)
+    matched[nat] = False
+    if primary_order is not None and primary_order.size > 0:
+        inds = primary_order[inds]
+
+    if not allow_duplicates:
+        matched = _discard_duplicate_matches(inds,deltas,matched)
+
+    inds[np.logical_not(matched)] = -1
+    log.debug("%d/%d values were matched" % (np.count_nonzero(matched),
+                                            matched.size))
+    return inds,matched
+
+def _iterate_time_chunks(times,chunksize):
+    """Yield chunks of timestamps. Numpy arrays (including np.memmap)
+    are sliced into chunks of chunksize, anything else is assumed to 
+    already be an iterable of chunks"""
+    if isinstance(times,np.ndarray):
+        for i_start in range(0,times.shape[0],chunksize):
+            yield times[i_start:i_start+chunksize]
+    else:
+        for chunk in times:
+            yield chunk
+
+class StreamingTimeMatcher(object):
+    """Matches timestamps from two (sorted) streams of timestamp chunks,
+    with the same result as matchTimes on the complete arrays, but 
+    with memory use bounded by the chunk size instead of the length 
+    of the streams. Matches are yielded as pairs of index arrays
+    as soon as they can no longer change.
+
+    Example
+    -------
+
+    .. code-block:: python
+
+        primary_dt64s = np.load('mag_times.npy',mmap_mode='r')
+        matcher = StreamingTimeMatcher(primary_dt64s,ion_drift_time_chunks)
+        for primary_inds,inds in matcher:
+            ...
+    """
+    def __init__(self,primary_dt,dt,tol_us=4e5,allow_duplicates=False,
+                    chunksize=100000):
+        """
+        Parameters
+        ----------
+
+        primary_dt : np.ndarray or iterable
+            The timestamps (Python datetime or numpy datetime64) which will 
+            be searched, either as one array (e.g. a memory mapped 
+            array, which is read chunksize values at a time), or
+            an iterable (e.g. a generator) of arrays/lists of timestamps.
+            Must be sorted
+        dt : np.ndarray or iterable
+            The timestamps for which you want to find matches, in the 
+            same forms as primary_dt. Must be sorted
+        tol_us : float, optional
+            Maximum difference (exclusive) between matching timestamps 
+            in microseconds
+        allow_duplicates : bool, optional
+            If False (default), each value in primary_dt is matched to at 
+            most one value in dt (see matchTimes)
+        chunksize : int, optional
+            Number of timestamps to read at a time from array inputs
+        """
+        self.tol_us = tol_us
+        self.allow_duplicates = allow_duplicates
+        self._primary_chunks = _iterate_time_chunks(primary_dt,chunksize)
+        self._chunks = _iterate_time_chunks(dt,chunksize)
+        self.n_matched = 0
+
+    @staticmethod
+    def _read_chunk(chunks,buffer_ep):
+        """Read the next chunk of a stream, and append it to that stream's
+        buffer. Returns None when the stream is exhausted"""
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            return None
+        ep,nat = _datetimes2epoch_us(chunk)
+        if np.any(nat):
+            raise ValueError('NaT (or None) timestamps can not be streamed')
+        previous_ep = buffer_ep[-1:]
+        if np.any(np.diff(np.concatenate([previous_ep,ep]))<0):
+            raise ValueError('Streamed timestamps must be sorted')
+        return np.concatenate([buffer_ep,ep])
+
+    def __iter__(self):
+        """Generator of matches
+
+        Yields
+        ------
+
+        primary_inds : np.ndarray
+            Indices into the (complete) primary timestamps
+        inds : np.ndarray
+            Indices into the (complete) timestamps to be matched, which are
+            matched to primary_inds 
+        """
+        tol = self.tol_us
+        #Buffered epochs (integer microseconds) and the index of the first
+        #buffered value in each complete stream
+        p_ep,p_start,p_done = np.zeros((0,),dtype=np.int64),0,False
+        s_ep,s_start,s_done = np.zeros((0,),dtype=np.int64),0,False
+        #Values in dt which have been matched (or found to be unmatched)
+        #already. These are retained while they could compete 
+        #with later values for the same primary timestamp
+        s_final = np.zeros((0,),dtype=bool)
+
+        while True:
+            #Read from the stream which is furthest behind
+            read_primary = not p_done and (s_done or p_ep.size == 0 
+                                          or (s_ep.size > 0 and p_ep[-1] <= s_ep[-1]))
+            if read_primary:
+                new_p_ep = self._read_chunk(self._primary_chunks,p_ep)
+                if new_p_ep is None:
+                    p_done = True
+                else:
+                    p_ep = new_p_ep
+            elif not s_done:
+                new_s_ep = self._read_chunk(self._chunks,s_ep)
+                if new_s_ep is None:
+                    s_done = True
+                else:
+                    s_final = np.concatenate([s_final,
+                                              np.zeros((new_s_ep.size-s_ep.size,),
+                                                      dtype=bool)])
+                    s_ep = new_s_ep
+
+            if s_done and np.all(s_final):
+                return
+
+            #A value in dt has its final match once no values
+            #in either stream which could change the match are yet to be read
+            last_p = np.inf if p_done else p_ep[-1]
+            last_s = np.inf if s_done else (s_ep[-1] if s_ep.size > 0 else -np.inf)
+            cutoff = min(last_p,last_s)-3*tol
+            finalize = np.logical_and(s_ep < cutoff,np.logical_not(s_final))
+            if not np.any(finalize):
+                continue
+
+            inds,deltas,matched = _nearest_within_tolerance(p_ep,s_ep,tol)
+            if not self.allow_duplicates:
+                matched = _discard_duplicate_matches(inds,deltas,matched)
+
+            new_matches = np.flatnonzero(np.logical_and(finalize,matched))
+            s_final[finalize] = True
+            if new_matches.size > 0:
+                self.n_matched += new_matches.size
+                yield p_start+inds[new_matches],s_start+new_matches
+
+            #Discard buffered values which can no longer affect any match
+            n_drop_p = np.searchsorted(p_ep,cutoff-3*tol,side='left')
+            n_drop_s = np.searchsorted(s_ep,cutoff-2*tol,side='left')
+            p_ep,p_start = p_ep[n_drop_p:],p_start+n_drop_p
+            s_ep,s_final,s_start = s_ep[n_drop_s:],s_final[n_drop_s:],s_start+n_drop_s
+
+def alignTimes(primary_dt,streams,tol_us=4e5,allow_duplicates=False,
+               cache=None):
+    """Aligns any number of timestamp streams onto one primary timeline,
+    by finding the closest timestamp in each stream within a tolerance
+    for every value in primary_dt (i.e. matchTimes for each
+    stream, with the primary timeline as the values to match).
+
+    If a cache is passed, the converted primary timeline is cached, so 
+    repeated alignment against the same primary_dt array only requires
+    converting the streams.
+
+    Parameters
+    ----------
+
+        primary_dt - np.ndarray or list, size=m
+            The primary timeline (Python datetime or numpy datetime64)
+        streams - list
+            k arrays or lists of timestamps (Python datetime or 
+            numpy datetime64), which do not need to be sorted
+        tol_us - float or list, optional
+            Maximum difference (exclusive) between matching timestamps 
+            in microseconds, for all streams or for each stream
+        allow_duplicates - bool, optional
+            If False (default), each value in a stream is matched to at most
+            one value in primary_dt (the closest one)
+        cache - array_management.ArrayCache, optional
+            Cache of converted primary timelines, which the caller keeps 
+            for as long as it aligns against the same primary timelines 
+            (the cache holds a reference to each cached primary_dt). If 
+            not passed the primary timeline is converted on every call
+
+    Returns
+    -------
+
+        inds - np.ndarray, shape=(m,k), dtype=int
+            Index into each stream of the match for each primary timestamp
+            (-1 where no match was found)
+        matched - np.ndarray, shape=(m,k), dtype=bool
+            True where a match was found
+
+    Example
+    -------
+
+        from geospacepy.array_management import ArrayCache
+        cache = ArrayCache(maxsize=1,by='identity')
+        for streams in streams_of_each_instrument:
+            inds,matched = alignTimes(primary_dt,streams,cache=cache)
+
+    .. note::
+
+        A cache with by='identity' recognizes the same primary_dt object,
+        so if the primary_dt array is modified in place, call cache.clear()
+        before aligning again (or use a cache with by='contents')
+    """
+    if cache is None:
+        primary_ep,primary_nat = _datetimes2epoch_us(primary_dt)
+    else:
+        primary_ep,primary_nat = cache.get(primary_dt,
+                                        lambda : _datetimes2epoch_us(primary_dt))
+    n_streams = len(streams)
+    if np.ndim(tol_us) == 0:
+        tols_us = [tol_us]*n_streams
+    elif len(tol_us) == n_streams:
+        tols_us = tol_us
+    else:
+        raise ValueError(('{} tolerances given '.format(len(tol_us))
+                          +'for {} streams'.format(n_streams)))
+
+    inds = np.full((primary_ep.size,n_streams),-1,dtype=np.int64)
+    matched = np.zeros((primary_ep.size,n_streams),dtype=bool)
+    for i_stream,(stream,tol) in enumerate(zip(streams,tols_us)):
+        ep,nat = _datetimes2epoch_us(stream)
+        valid = np.flatnonzero(np.logical_not(nat))
+        order = valid[np.argsort(ep[valid],kind='stable')]
+        stream_inds,deltas,stream_matched = _nearest_within_tolerance(ep[order],
+                                                                    primary_ep,
+                                                                    tol)
+        stream_matched[primary_nat] = False
+        if order.size > 0:
+            stream_inds = order[stream_inds]
+        if not allow_duplicates:
+            stream_matched = _discard_duplicate_matches(stream_inds,deltas,
+                                                        stream_matched)
+        inds[stream_matched,i_stream] = stream_inds[stream_matched]
+        matched[:,i_stream] = stream_matched
+    return inds,matched
+
+#Nanoseconds since the UNIX epoch of the J2000 epoch
+_NS_PER_DAY = 86400*10**9
+_J2000_UNIX_EPOCH_NS = int(round(-1*_J2000_UNIX_EPOCH*_NS_PER_DAY))
+
+class Timeline(object):
+    """An array of timestamps stored as integer nanoseconds since
+    the J2000 epoch (noon on January 1, 2000), for representing
+    times without loss of precision (unlike a float julian date, which 
+    cannot represent times more precisely than ~40 microseconds).
+
+    Other time types (jd, j2000, doy, sod, soy, datenum, datetime64) are 
+    available as attributes, which are computed only when first 
+    accessed, and then cached, so that a pipeline of computations
+    on the same times converts them only once. 
+
+    When passed to a numpy function a Timeline behaves as 
+    an array of julian dates (the package's preferred time 
+    representation), and the functions in the sun and terrestrial_spherical
+    modules accept Timelines wherever they accept julian dates.
+
+    Example
+    -------
+
+    .. code-block:: python
+
+        timeline = Timeline.from_datetimes(dts)
+        szas = solar_zenith_angle(timeline,glats,glons)
+        R_ECI = ecef2eci(R_ECEF,timeline)
+        sods = timeline.sod
+    """
+    def __init__(self,ns_since_j2000):
+        """
+        Parameters
+        ----------
+
+        ns_since_j2000 : np.ndarray
+            Integer nanoseconds since the J2000 epoch (any shape)
+        """
+        self._ns = np.asarray(ns_since_j2000,dtype=np.int64)
+        self._cache = {}
+
+    @classmethod
+    def from_datetimes(cls,datetimes):
+        """Create a Timeline from a list or array of Python datetimes
+        or an array of numpy datetime64"""
+        dt64s = datetimearr2datetime64(datetimes)
+        if np.any(np.isnat(dt64s)):
+            raise ValueError('Timeline can not represent NaT (or None) times')
+        ns = dt64s.astype('datetime64[ns]').view(np.int64)
+        return cls(ns-_J2000_UNIX_EPOCH_NS)
+
+    @classmethod
+    def from_jd(cls,jds):
+        """Create a Timeline from julian dates (float or array)"""
+        j2000s = np.asarray(jds,dtype=float)-(_JD_UNIX_EPOCH-_J2000_UNIX_EPOCH)
+        return cls._from_days(j2000s)
+
+    @classmethod
+    def _from_days(cls,j2000s):
+        """Create a Timeline from floating point days since J2000,
+        converting whole and fractional days separately"""
+        if np.any(np.logical_not(np.isfinite(j2000s))):
+            raise ValueError('Timeline can not represent non-finite times')
+        whole_days = np.floor(j2000s)
+        day_ns = np.rint((j2000s-whole_days)*_NS_PER_DAY)
+        return cls(whole_days.astype(np.int64)*_NS_PER_DAY+day_ns.astype(np.int64))
+
+    def _cached(self,name,compute):
+        if name not in self._cache:
+            self._cache[name] = compute()
+        return self._cache[name]
+
+    @property
+    def ns(self):
+        """Integer nanoseconds since J2000 (the internal representation)"""
+        return self._ns
+
+    @property
+    def shape(self):
+        return self._ns.shape
+
+    @property
+    def size(self):
+        return self._ns.size
+
+    @property
+    def ndim(self):
+        return self._ns.ndim
+
+    def __len__(self):
+        return len(self._ns)
+
+    def __getitem__(self,key):
+        return Timeline(self._ns[key])
+
+    def reshape(self,*shape):
+        return Timeline(self._ns.reshape(*shape))
+
+    def __repr__(self):
+        return 'Timeline({})'.format(self.datetime64)
+
+    def _day_and_fraction(self):
+        """Whole days since J2000 and fraction of the day elapsed"""
+        return self._cached('day_and_fraction',
+                            lambda : np.divmod(self._ns,_NS_PER_DAY))
+
+    @property
+    def datetime64(self):
+        """Times as numpy datetime64[ns]"""
+        return self._cached('datetime64',
+            lambda : (self._ns+_J2000_UNIX_EPOCH_NS).view('datetime64[ns]'))
+
+    @property
+    def j2000(self):
+        """Times as julian dates relative to the J2000 epoch"""
+        def compute():
+            days,day_ns = self._day_and_fraction()
+            return days+day_ns/_NS_PER_DAY
+        return self._cached('j2000',compute)
+
+    @property
+    def jd(self):
+        """Times as julian dates"""
+        def compute():
+            days,day_ns = self._day_and_fraction()
+            return (days+(_JD_UNIX_EPOCH-_J2000_UNIX_EPOCH))+day_ns/_NS_PER_DAY
+        return self._cached('jd',compute)
+
+    @property
+    def doy(self):
+        """Times as (decimal) day of year"""
+        return self._cached('doy',lambda : datetime64arr2doy(self.datetime64))
+
+    @property
+    def sod(self):
+        """Times as (decimal) second of day"""
+        return self._cached('sod',lambda : datetime64arr2sod(self.datetime64))
+
+    @property
+    def soy(self):
+        """Times as (decimal) second of year"""
+        return self._cached('soy',lambda : datetime64arr2soy(self.datetime64))
+
+    @property
+    def datenum(self):
+        """Times as matlab datenum"""
+        return self._cached('datenum',lambda : datetime64arr2datenum(self.datetime64))
+
+    @property
+    def jdparts(self):
+        """Times as two-part julian dates (integer julian day, fraction
+        of the julian day), see datetime64arr2jdparts"""
+        def compute():
+            #Julian days start at noon, as does J2000
+            days,day_ns = self._day_and_fraction()
+            return days+int(_JD_UNIX_EPOCH-_J2000_UNIX_EPOCH),day_ns/_NS_PER_DAY
+        return self._cached('jdparts',compute)
+
+    def __array__(self,dtype=None,copy=None):
+        jds = self.jd
+        return jds if dtype is None else jds.astype(dtype)
+
+def julian_date_parts(times):
+    """Two-part julian dates (whole julian days, fraction of the
+    julian day) of times given as julian dates, two-part julian dates,
+    or as a Timeline. Computations using two-part julian dates do not 
+    lose the precision of the time of day to the large day count.
+
+    Parameters
+    ----------
+    times : float, np.ndarray, tuple or Timeline
+        Julian date(s), or a two-part julian date as a tuple
+        (jd_days,jd_fracs), e.g. from datetime64arr2jdparts. The parts
+        may have any floating point type (e.g. float32 fractions)
+
+    Returns
+    -------
+    jd_days : float or np.ndarray
+        Whole julian days
+    jd_fracs : float or np.ndarray
+        Fraction of the julian day, in [0,1) (float64)
+    """
+    if isinstance(times,Timeline):
+        jd_days,jd_fracs = times.jdparts
+    elif isinstance(times,tuple):
+        if len(times) != 2:
+            raise ValueError(('Two-part julian dates must be a tuple of'
+                              +' (jd_days,jd_fracs) not {}'.format(times)))
+        jd_days = np.asarray(times[0],dtype=np.float64)
+        jd_fracs = np.asarray(times[1],dtype=np.float64)
+    else:
+        jd_days,jd_fracs = times,0.
+    #Make sure the day part is a whole number of days,
+    #and the fraction is in [0,1)
+    whole_days = np.floor(jd_days)
+    jd_fracs = jd_fracs+(jd_days-whole_days)
+    carry_days = np.floor(jd_fracs)
+    return whole_days+carry_days,jd_fracs-carry_days
+
+def julian_dates(times):
+    """Julian dates of times given as julian dates (which are returned
+    unchanged), two-part julian dates or as a Timeline
+
+    Parameters
+    ----------
+    times : float, np.ndarray, tuple or Timeline
+        Julian date(s), or a two-part julian date as a tuple 
+        (jd_days,jd_fracs), or a Timeline
+
+    Returns
+    -------
+    jds : float or np.ndarray
+    """
+    if isinstance(times,Timeline):
+        return times.jd
+    elif isinstance(times,tuple):
+        jd_days,jd_fracs = julian_date_parts(times)
+        return jd_days+jd_fracs
+    return times
@@ -2,6 +2,9 @@
 # Written by Liam M. Kilcommons
 import numpy as np
 from numpy import (sin,cos,tan,arcsin,arccos,arctan2)
+from geospacepy.array_management import (validate_output,
+                                         ProcessInputsInChunks,
+                                         result_float_dtype,prepare_output)
 
 def _azifac(aziunit):
     if aziunit=='hour':
@@ -14,7 +17,21 @@ def _azifac(aziunit):
         raise ValueError(('Invalid aziunit {}'.format(aziunit)
                           +' valid values are deg or hour or rad'))
 
-def angle_difference(ang1,ang2,aziunit):
+def _angles_to_distances(angles,distunit,r):
+    """Great circle distances (radians) as angles in distunit 
+    or arc lengths (in units of r, if r is not None)"""
+    if r is not None:
+        return angles*r
+    return angles/_azifac(distunit)
+
+def _distances_to_angles(distances,distunit,r):
+    """Inverse of _angles_to_distances"""
+    if r is not None:
+        return distances/r
+    return distances*_azifac(distunit)
+
+@ProcessInputsInChunks
+def angle_difference(ang1,ang2,aziunit,out=None):
     """Difference between two angles in degrees or hours (ang2-ang1),
     taking into account wrapping
 
@@ -28,6 +45,8 @@ def angle_difference(ang1,ang2,aziunit):
     degorhour : str, optional
         'deg' for input angles and result in degrees
         'hour' for input angles in hours
+    out : np.ndarray, optional
+        Array to store the result in
 
     RETURNS
     -------
@@ -36,17 +55,42 @@ def angle_difference(ang1,ang2,aziunit):
         Difference (ang2-ang1)
 
     """
+    out = validate_output(out,ang1,ang2)
     ang2rad = _azifac(aziunit)
     y = np.sin(ang2*ang2rad-ang1*ang2rad)
     x = np.cos(ang2*ang2rad-ang1*ang2rad)
-    diff = np.arctan2(y,x)/ang2rad
+    diff = np.divide(np.arctan2(y,x),ang2rad,out=out)
     return diff
 
-def angle_midpoint(ang1,ang2,aziunit):
-    """
-    Midpoint between two angles in degrees or hours
+@ProcessInputsInChunks
+def angle_midpoint(ang1,ang2,aziunit,out=None):
+    """Midpoint between two angles in degrees, hours or radians,
+    taking into account wrapping
+
+    PARAMETERS
+    ----------
+
+    ang1 : float or np.ndarray
+        First angle(s)
+    ang2 : float or np.ndarray
+        Second angle(s)
+    aziunit : str
+        Unit of the angles and the result, valid values: deg, hour or rad
+    out : np.ndarray, optional
+        Array to store the result in
+
+    RETURNS
+    -------
+
+    midpoint : float or np.ndarray
+        Angle halfway from ang1 to ang2 (float32 if ang1 and 
+        ang2 are float32)
+
     """
-    return ang1 + angle_difference(ang1,ang2,aziunit)/2.
+    out = validate_output(out,ang1,ang2)
+    midpoint = angle_difference(ang1,ang2,aziunit,out=out)
+    midpoint = np.multiply(midpoint,.5,out=out)
+    return np.add(ang1,midpoint,out=out)
 
 def _great_circle_distance(location1,location2,lonorlt='lt'):
     """Return angular distance in radians between n-by-2 numpy arrays
@@ -76,7 +120,7 @@ def _great_circle_distance(location1,location2,lonorlt='lt'):
         C =  np.pi - np.abs(dphi - np.pi)#get the angular distance in longitude in radians
     return np.arccos(np.cos(a)*np.cos(b)+np.sin(a)*np.sin(b)*np.cos(C))
 
-def _great_circle_distance_law_of_cosines(theta1,phi1,theta2,phi2):
+def _great_circle_distance_law_of_cosines(theta1,phi1,theta2,phi2,out=None):
     """Computes great circle distance between any number of paired 
     locations using the law of cosines. Warning:
     can be inaccurate for short distances. All angles in radians.
@@ -86,10 +130,10 @@ def _great_circle_distance_law_of_cosines(theta1,phi1,theta2,phi2):
     b = theta2
     dphi = np.abs(phi2-phi1)
     C =  np.pi - np.abs(dphi - np.pi)
-    dist = np.arccos(np.cos(a)*np.cos(b)+np.sin(a)*np.sin(b)*np.cos(C))
+    dist = np.arccos(np.cos(a)*np.cos(b)+np.sin(a)*np.sin(b)*np.cos(C),out=out)
     return dist
 
-def _great_circle_distance_haversine_formula(theta1,phi1,theta2,phi2):
+def _great_circle_distance_haversine_formula(theta1,phi1,theta2,phi2,out=None):
     """Computes great circle distance between any number of paired
     locations using the haversine formula, which is known to be accurate
     for short distances. All angles in radians.
@@ -107,14 +151,17 @@ def _great_circle_distance_haversine_formula(theta1,phi1,theta2,phi2):
         return 2.*np.arcsin(np.sqrt(theta))
     def archav2(theta):
         """Inverse haversine using arctan2"""
-        return 2.*np.arctan2(np.sqrt(theta),np.sqrt(1.-theta))
+        return np.multiply(2.,np.arctan2(np.sqrt(theta),np.sqrt(1.-theta)),
+                           out=out)
 
     hav_dist = hav(delta_lambda)+np.cos(lambda1)*np.cos(lambda2)*hav(delta_phi)
     
     dist = archav2(hav_dist)
     return dist
 
-def great_circle_distance(lat1,azi1,lat2,azi2,aziunit,algorithm='lawofcosines'):
+@ProcessInputsInChunks
+def great_circle_distance(lat1,azi1,lat2,azi2,aziunit,algorithm='lawofcosines',
+                          out=None):
     """Computes great circle distance between any number of paired
     locations
 
@@ -134,12 +181,15 @@ def great_circle_distance(lat1,azi1,lat2,azi2,aziunit,algorithm='lawofcosines'):
     algorithm : str,optional
         Which formula to use in computing the great circle distance.
         Valid values are 'lawofcosines' or 'haversine'.
+    out : np.ndarray, optional
+        Array to store the result in
 
     RETURNS
     -------
 
     dist : float or np.ndarray
         Distance (in aziunit) between location(s) 1 and 2
+        (float32 if the array inputs are float32)
 
     """
     algorithms = {
@@ -150,10 +200,177 @@ def great_circle_distance(lat1,azi1,lat2,azi2,aziunit,algorithm='lawofcosines'):
         raise ValueError('Invalid algorithm {}'.format(algorithm)
                         +' valid values: {}'.format([key for key in algorithms]))
 
+    out = validate_output(out,lat1,azi1,lat2,azi2)
     azi2rad = _azifac(aziunit)
     theta1,theta2 = np.radians(90.-lat1),np.radians(90.-lat2)
     phi1,phi2 = azi1*azi2rad,azi2*azi2rad
-    dist = algorithms[algorithm](theta1,phi1,theta2,phi2)
+    dist = algorithms[algorithm](theta1,phi1,theta2,phi2,out=out)
+    return dist
+
+#Number of distances computed at once by great_circle_distance_matrix
+#(8 MB of float64)
+DISTANCE_MATRIX_BLOCK_SIZE = 2**20
+
+#Dot products of unit vectors larger in magnitude than this
+#(separations less than ~0.8 degrees from 0 or 180 degrees) are
+#converted to distances with the haversine formula instead of arccos,
+#which is inaccurate for nearly parallel or antiparallel vectors
+_ARCCOS_LIMIT = .9999
+#The rounding error of float32 dot products is amplified by arccos
+#much further from 0 and 180 degrees (up to ~7e-6 radians at 
+#_ARCCOS_LIMIT), so float32 uses the haversine formula for 
+#separations less than ~8 degrees from 0 or 180 degrees
+_ARCCOS_LIMIT_FLOAT32 = .99
+
+def _arccos_limit(dtype):
+    """Largest magnitude of dot product converted to a distance 
+    with arccos for unit vectors of type dtype"""
+    return _ARCCOS_LIMIT_FLOAT32 if dtype.itemsize <= 4 else _ARCCOS_LIMIT
+
+def _unit_vectors(lats,azis,aziunit,dtype):
+    """Cartesian unit vectors (shape=(n,3)) of n locations"""
+    lats_rad = np.radians(np.asarray(lats,dtype=np.float64).reshape(-1))
+    azis_rad = np.asarray(azis,dtype=np.float64).reshape(-1)*_azifac(aziunit)
+    cos_lats = np.cos(lats_rad)
+    unit_vectors = np.empty((lats_rad.size,3),dtype=dtype)
+    unit_vectors[:,0] = cos_lats*np.cos(azis_rad)
+    unit_vectors[:,1] = cos_lats*np.sin(azis_rad)
+    unit_vectors[:,2] = np.sin(lats_rad)
+    return unit_vectors
+
+def _great_circle_distance_haversine_chords(u1,u2):
+    """Great circle distance between paired unit vectors (shape=(n,3)) 
+    using the haversine formula in terms of the chord between the 
+    locations (hav(d) = |u1-u2|^2/4), which is accurate for all separations.
+    The chord to the antipode of u2 is used for separations > 90 degrees"""
+    chords = np.sqrt(np.sum((u1-u2)**2,axis=1))
+    antipodal_chords = np.sqrt(np.sum((u1+u2)**2,axis=1))
+    dist = 2*np.arcsin(np.minimum(chords/2,1.))
+    far = chords > antipodal_chords
+    dist[far] = np.pi-2*np.arcsin(np.minimum(antipodal_chords[far]/2,1.))
+    return dist
+
+def _dot_products_to_distances(dots,u1,u2,rows,cols):
+    """Great circle distances for dot products dots of unit vectors
+    u1[rows] and u2[cols]"""
+    dists = np.arccos(np.clip(dots,-1.,1.))
+    inaccurate = np.abs(dots) > _arccos_limit(dots.dtype)
+    if np.any(inaccurate):
+        dists[inaccurate] = _great_circle_distance_haversine_chords(
+                                                    u1[rows[inaccurate]],
+                                                    u2[cols[inaccurate]])
+    return dists
+
+def great_circle_distance_matrix(lats1,azis1,lats2,azis2,aziunit,
+                                 max_distance=None,dtype=None,
+                                 block_size=DISTANCE_MATRIX_BLOCK_SIZE,
+                                 out=None):
+    """Computes great circle distances between every pair of m locations 
+    (e.g. along a satellite track) and n locations (e.g. a network of 
+    ground stations)
+
+    PARAMETERS
+    ----------
+
+    lats1 : float or np.ndarray
+        Latitude(s) of the m first locations
+    azis1 : float or np.ndarray
+        Azimuth(s) (longitude,localtime) of the m first locations
+    lats2 : float or np.ndarray
+        Latitude(s) of the n second locations
+    azis2 : float or np.ndarray
+        Azimuth(s) (longitude,localtime) of the n second locations
+    aziunit : str
+        Unit of passed azimuth(s), valid values: hour, deg or rad
+    max_distance : float, optional
+        If passed, only the distances less than or equal to max_distance
+        (in radians) are returned, as (i,j,dist) arrays instead of 
+        an m by n matrix
+    dtype : np.dtype, optional
+        np.float32 or np.float64 (default float32 if the array 
+        inputs are float32, otherwise float64). float32 halves the memory
+        and time used, with errors of up to ~1e-6 radians (~6 m on the
+        surface of the earth)
+    block_size : int, optional
+        Number of distances computed at once. Blocks of rows of 
+        the matrix are computed one after the other, which bounds the
+        size of temporary arrays
+    out : np.ndarray, optional
+        Array (shape=(m,n)) to store the distance matrix in
+        (not used if max_distance is passed)
+
+    RETURNS
+    -------
+
+    dist : np.ndarray
+        Distance matrix (in radians, shape=(m,n)), dist[i,j] is the
+        distance between first location i and second location j. 
+        Only if max_distance is not passed.
+    i,j,dist : np.ndarray
+        Only if max_distance is passed, indices of the first and second
+        locations and the distances between them for each pair of 
+        locations closer than max_distance (sorted by i then j)
+
+    Notes
+    -----
+
+    Each location is converted to a unit vector once, and the distances 
+    are the arccos of the dot products of the unit vectors (computed
+    as a matrix product), except for locations which are very nearly
+    the same (or antipodal), for which the haversine formula is used.
+    If max_distance is passed, dot products too small to be within 
+    max_distance are discarded before any distances are calculated.
+    """
+    if dtype is None:
+        dtype = result_float_dtype(lats1,azis1,lats2,azis2)
+    dtype = np.dtype(dtype)
+    if dtype.kind != 'f':
+        raise ValueError('dtype must be np.float32 or np.float64')
+    u1 = _unit_vectors(lats1,azis1,aziunit,dtype)
+    u2 = _unit_vectors(lats2,azis2,aziunit,dtype)
+    m,n = u1.shape[0],u2.shape[0]
+    u2_T = np.ascontiguousarray(u2.T)
+    arccos_limit = _arccos_limit(dtype)
+    rows_per_block = max(1,block_size//max(n,1))
+    sparse = max_distance is not None
+    if sparse:
+        #Smallest dot product which could be within max_distance
+        #(allowing for rounding)
+        min_dot = np.cos(min(max_distance,np.pi))-4*np.finfo(dtype).eps
+        dots_buffer = np.empty((min(rows_per_block,m),n),dtype=dtype)
+        i_blocks,j_blocks,dist_blocks = [],[],[]
+    else:
+        dist = prepare_output(out,(m,n),dtype)
+
+    for start in range(0,m,rows_per_block):
+        stop = min(start+rows_per_block,m)
+        if sparse:
+            dots = np.matmul(u1[start:stop],u2_T,out=dots_buffer[:stop-start])
+            rows,cols = np.nonzero(dots >= min_dot)
+            block_dists = _dot_products_to_distances(dots[rows,cols],
+                                                     u1[start:stop],u2,
+                                                     rows,cols)
+            close = block_dists <= max_distance
+            i_blocks.append(rows[close]+start)
+            j_blocks.append(cols[close])
+            dist_blocks.append(block_dists[close].astype(dtype,copy=False))
+        else:
+            dots = np.matmul(u1[start:stop],u2_T,out=dist[start:stop])
+            inaccurate_rows,inaccurate_cols = np.nonzero(np.abs(dots) 
+                                                         > arccos_limit)
+            np.clip(dots,-1.,1.,out=dots)
+            np.arccos(dots,out=dots)
+            if inaccurate_rows.size > 0:
+                dots[inaccurate_rows,inaccurate_cols] = \
+                    _great_circle_distance_haversine_chords(
+                                            u1[start+inaccurate_rows],
+                                            u2[inaccurate_cols])
+    if sparse:
+        if not i_blocks:
+            return (np.zeros((0,),dtype=np.intp),np.zeros((0,),dtype=np.intp),
+                    np.zeros((0,),dtype=dtype))
+        return (np.concatenate(i_blocks),np.concatenate(j_blocks),
+                np.concatenate(dist_blocks))
     return dist
 
 # There is currently a problem with this algorithm
@@ -203,7 +420,8 @@ def great_circle_distance(lat1,azi1,lat2,azi2,aziunit,algorithm='lawofcosines'):
 #     azi_mid = azi1+I/azi2rad
 #     return lat_mid, azi_mid
 
-def great_circle_rectangle_area(lats_bottom,lats_top,azis_left,azis_right,r,aziunit):
+def great_circle_rectangle_area(lats_bottom,lats_top,azis_left,azis_right,r,aziunit,
+                                out=None):
     """Calculate the surface area of any number of 'great-circle rectangles'
     (spherical quadrilaterals, whose 4 sides are all great circle arcs) 
     on the surface of a sphere of radius r.
@@ -227,6 +445,8 @@ def great_circle_rectangle_area(lats_bottom,lats_top,azis_left,azis_right,r,aziu
         aziunit - str
             Units of the azimuth/longitude ('deg' for degrees,
             'hour' for hours, 'rad' for radians)
+        out - np.ndarray, optional
+            Array to store the areas in
 
     RETURNS
     -------
@@ -235,6 +455,8 @@ def great_circle_rectangle_area(lats_bottom,lats_top,azis_left,azis_right,r,aziu
             Surface areas of the great circle rectangles
 
     """
+    out = validate_output(out,lats_bottom,lats_top,
+                          azis_left,azis_right,r)
     azi2rad = _azifac(aziunit)
 
     if np.any((lats_top-lats_bottom) < 0):
@@ -253,7 +475,7 @@ def great_circle_rectangle_area(lats_bottom,lats_top,azis_left,azis_right,r,aziu
     theta_top = (90.-lats_top)*np.pi/180. #theta / lat - converted to radians
     theta_bottom = (90.-lats_bottom)*np.pi/180. #theta / lat - converted to radians
     dphi = np.abs(dazi)*azi2rad #delta phi / lon - converted to radians
-    areas = np.abs(r**2*dphi*(np.cos(theta_top)-np.cos(theta_bottom)))
+    areas = np.abs(r**2*dphi*(np.cos(theta_top)-np.cos(theta_bottom)),out=out)
     return areas
 
 def grid_surface_integral(grid_lats,grid_azis,grid_values,sphere_radius,aziunit):
@@ -318,4 +540,406 @@ def grid_surface_integral(grid_lats,grid_azis,grid_values,sphere_radius,aziunit)
                                                     aziunit)
 
     integrated_values = np.nansum(gridcell_areas*grid_values)
-    return integrated_values
\ No newline at end of file
+    return integrated_values
+
+def _concatenated_ranges(starts,stops):
+    """Positions start to stop of each range, concatenated, and the 
+    number of the range each position is in"""
+    counts = stops-starts
+    range_numbers = np.repeat(np.arange(counts.size),counts)
+    positions = np.arange(range_numbers.size)+np.repeat(starts-(np.cumsum(counts)
+                                                                -counts),counts)
+    return positions,range_numbers
+
+def _chords_squared(u1,u2):
+    """Squared chord lengths between paired unit vectors (a monotonic
+    function of great circle distance, cheaper to compute)"""
+    return np.sum((u1-u2)**2,axis=1)
+
+def _max_chord_squared(max_angles):
+    """Squared chord length subtended by great circle distances
+    (in radians), slightly enlarged to allow for rounding"""
+    max_angles = np.minimum(max_angles,np.pi)
+    return (2*np.sin(max_angles/2))**2*(1.+1e-12)+1e-15
+
+class SphericalIndex(object):
+    """Spatial index of locations on a sphere for fast nearest neighbour
+    and within-distance queries (e.g. which satellite samples are within 
+    some distance of a radar site). The locations are converted to 3D
+    unit vectors once and stored in a k-d tree, so a query takes O(log n)
+    operations instead of computing the distance to all n locations.
+
+    Locations can be added to an existing index (add). Locations added 
+    after the tree was built are searched exhaustively until there are
+    enough of them to rebuild the tree. Indexes can be saved to disk
+    (save) and loaded (SphericalIndex.load) instead of being rebuilt.
+
+    Queries process many query locations at once (all query locations
+    descend the tree together, one level at a time).
+
+    Example
+    -------
+
+    .. code-block:: python
+
+        index = SphericalIndex(sample_lats,sample_lons,aziunit='deg')
+        dists,inds = index.query(site_lats,site_lons,k=5,r=6371.2)
+        i_site,i_sample,dists = index.query_within_distance(site_lats,
+                                                            site_lons,
+                                                            500.,r=6371.2)
+    """
+    def __init__(self,lats=None,azis=None,aziunit='deg',leafsize=32):
+        """
+        PARAMETERS
+        ----------
+
+        lats : np.ndarray, optional
+            Latitudes of the locations to index (degrees)
+        azis : np.ndarray, optional
+            Azimuths (longitudes or localtimes) of the locations to index
+        aziunit : str, optional
+            Unit of the azimuths of indexed and query locations, 
+            valid values: hour, deg (default) or rad
+        leafsize : int, optional
+            Maximum number of locations in a node at the bottom of the tree
+        """
+        _azifac(aziunit) #Check valid
+        if leafsize < 1:
+            raise ValueError('leafsize must be a positive integer')
+        self.aziunit = aziunit
+        self.leafsize = leafsize
+        self._unit_vectors = np.zeros((0,3))
+        self._n_indexed = 0
+        self._build_tree()
+        if lats is not None:
+            self.add(lats,azis)
+
+    def __len__(self):
+        return self._unit_vectors.shape[0]
+
+    def __repr__(self):
+        return 'SphericalIndex({} locations, aziunit={})'.format(len(self),
+                                                                 self.aziunit)
+
+    def add(self,lats,azis):
+        """Add locations to the index. The locations are numbered in the
+        order they are added (the first added are 0...n-1, and so on)
+
+        PARAMETERS
+        ----------
+
+        lats : float or np.ndarray
+            Latitudes of the locations (degrees)
+        azis : float or np.ndarray
+            Azimuths (longitudes or localtimes) of the locations
+        """
+        new_unit_vectors = _unit_vectors(lats,azis,self.aziunit,np.float64)
+        self._unit_vectors = np.concatenate((self._unit_vectors,
+                                             new_unit_vectors))
+        #Rebuilding when the unindexed locations are a fixed fraction of
+        #the indexed ones keeps the total time to build O(n log n)
+        n_unindexed = len(self)-self._n_indexed
+        if n_unindexed > max(self.leafsize,self._n_indexed//4):
+            self.rebuild()
+
+    def rebuild(self):
+        """Build the tree from all locations (including locations added
+        since the tree was last built)"""
+        self._n_indexed = len(self)
+        self._build_tree()
+
+    def _build_tree(self):
+        """Build the k-d tree of the first _n_indexed unit vectors.
+        Each node is a contiguous range (start to stop) of the
+        permutation of the locations (self._order), split at the median
+        of the axis along which the node's locations are most spread out.
+
+        The tree is built one level at a time (nodes are numbered breadth
+        first). The locations are sorted along each axis once, and every
+        node is a range of all three sorted orders, so the bounds and
+        median of a node are read off directly, and splitting all nodes
+        of a level is a stable partition of each order (no sorting)"""
+        points = self._unit_vectors[:self._n_indexed]
+        n_points = points.shape[0]
+        orders = [np.argsort(points[:,axis]) for axis in range(3)]
+        goes_right = np.zeros((n_points,),dtype=bool)
+        no_nodes = np.zeros((0,),dtype=np.intp)
+        levels = [(no_nodes,)*5+(np.zeros((0,)),np.zeros((0,3)),np.zeros((0,3)))]
+        starts = np.zeros((1 if n_points > 0 else 0,),dtype=np.intp)
+        stops = np.full(starts.shape,n_points,dtype=np.intp)
+        n_nodes = 0
+        while starts.size > 0:
+            n_level = starts.size
+            los = np.column_stack([points[orders[axis][starts],axis]
+                                   for axis in range(3)])
+            his = np.column_stack([points[orders[axis][stops-1],axis]
+                                   for axis in range(3)])
+            split = np.flatnonzero((stops-starts) > self.leafsize)
+            split_starts,split_stops = starts[split],stops[split]
+            middles = (split_starts+split_stops)//2
+            lefts = np.full((n_level,),-1,dtype=np.intp)
+            lefts[split] = n_nodes+n_level+2*np.arange(split.size)
+            rights = np.where(lefts >= 0,lefts+1,-1)
+            split_axes = np.zeros((n_level,),dtype=np.intp)
+            split_axes[split] = np.argmax(his[split]-los[split],axis=1)
+            split_values = np.zeros((n_level,))
+            for axis in range(3):
+                on_axis = split_axes[split] == axis
+                split_values[split[on_axis]] = points[
+                                        orders[axis][middles[on_axis]],axis]
+                right_positions,_ = _concatenated_ranges(middles[on_axis],
+                                                         split_stops[on_axis])
+                goes_right[orders[axis][right_positions]] = True
+            levels.append((starts,stops,lefts,rights,split_axes,split_values,
+                           los,his))
+            n_nodes += n_level
+            #Move the locations of each split node which go to its left
+            #child to the start of its range, and the rest to the middle,
+            #keeping them in order
+            positions,_ = _concatenated_ranges(split_starts,split_stops)
+            counts = split_stops-split_starts
+            first_in_node = np.cumsum(counts)-counts
+            right_starts = np.repeat(middles,counts)
+            for order in orders:
+                locations = order[positions]
+                right = goes_right[locations]
+                n_right_before = np.cumsum(right)-right
+                n_right_before -= np.repeat(n_right_before[first_in_node],counts)
+                order[np.where(right,right_starts+n_right_before,
+                               positions-n_right_before)] = locations
+            goes_right[:] = False
+            starts = np.column_stack((split_starts,middles)).ravel()
+            stops = np.column_stack((middles,split_stops)).ravel()
+        (self._starts,self._stops,self._lefts,self._rights,self._split_axes,
+         self._split_values,self._los,self._his) = [np.concatenate(arrays) 
+                                                    for arrays in zip(*levels)]
+        self._order = orders[0]
+
+    def _leaf_pairs(self,query_vectors,max_chords_squared):
+        """Pairs of (query location, leaf node) for all leaf nodes whose
+        bounding box is closer to the query location than the maximum
+        (squared chord) distance"""
+        n_queries = query_vectors.shape[0]
+        if self._starts.size == 0:
+            return np.zeros((0,),dtype=np.intp),np.zeros((0,),dtype=np.intp)
+        queries = np.arange(n_queries)
+        nodes = np.zeros((n_queries,),dtype=np.intp)
+        leaf_queries,leaf_nodes = [],[]
+        while queries.size > 0:
+            q = query_vectors[queries]
+            outside = (np.maximum(self._los[nodes]-q,0.)
+                       +np.maximum(q-self._his[nodes],0.))
+            close = np.sum(outside**2,axis=1) <= max_chords_squared[queries]
+            queries,nodes = queries[close],nodes[close]
+            is_leaf = self._lefts[nodes] < 0
+            leaf_queries.append(queries[is_leaf])
+            leaf_nodes.append(nodes[is_leaf])
+            queries,nodes = queries[~is_leaf],nodes[~is_leaf]
+            queries = np.concatenate((queries,queries))
+            nodes = np.concatenate((self._lefts[nodes],self._rights[nodes]))
+        return np.concatenate(leaf_queries),np.concatenate(leaf_nodes)
+
+    def _node_pairs(self,queries,nodes):
+        """Expand (query,node) pairs to (query,location) pairs for every
+        location in each node"""
+        positions,pairs = _concatenated_ranges(self._starts[nodes],
+                                               self._stops[nodes])
+        return queries[pairs],self._order[positions]
+
+    def _unindexed_pairs(self,query_vectors,max_chords_squared):
+        """(query,location) pairs of locations added since the tree was
+        built which could be within the maximum (squared chord) distance,
+        found by comparing them to all query locations (in blocks, 
+        using dot products like great_circle_distance_matrix)"""
+        unindexed = self._unit_vectors[self._n_indexed:]
+        queries,locations = [np.zeros((0,),dtype=np.intp)],[np.zeros((0,),dtype=np.intp)]
+        if unindexed.shape[0] == 0:
+            return queries[0],locations[0]
+        n_queries = query_vectors.shape[0]
+        queries_per_block = max(1,DISTANCE_MATRIX_BLOCK_SIZE//unindexed.shape[0])
+        unindexed_T = np.ascontiguousarray(unindexed.T)
+        for start in range(0,n_queries,queries_per_block):
+            stop = min(start+queries_per_block,n_queries)
+            #|u-v|^2 = 2-2u.v (with a margin for rounding, the exact
+            #squared chords are computed for the pairs which are kept)
+            chords_squared = 2.-2.*np.matmul(query_vectors[start:stop],
+                                             unindexed_T)
+            rows,cols = np.nonzero(chords_squared <= 
+                                   max_chords_squared[start:stop,np.newaxis]+1e-12)
+            queries.append(rows+start)
+            locations.append(cols+self._n_indexed)
+        return np.concatenate(queries),np.concatenate(locations)
+
+    def _candidate_pairs(self,query_vectors,max_chords_squared):
+        """(query,location,squared chord) for all locations within
+        the maximum (squared chord) distance of each query location"""
+        queries,locations = self._node_pairs(*self._leaf_pairs(query_vectors,
+                                                            max_chords_squared))
+        unindexed_queries,unindexed_locations = self._unindexed_pairs(
+                                                        query_vectors,
+                                                        max_chords_squared)
+        queries = np.concatenate((queries,unindexed_queries))
+        locations = np.concatenate((locations,unindexed_locations))
+        chords_squared = _chords_squared(query_vectors[queries],
+                                         self._unit_vectors[locations])
+        close = chords_squared <= max_chords_squared[queries]
+        return queries[close],locations[close],chords_squared[close]
+
+    def _kth_chord_squared_bounds(self,query_vectors,k):
+        """Upper bounds on the squared chord to the k-th nearest location
+        of each query location, from the locations in the smallest node
+        with at least k locations on the way down the tree to the query 
+        location"""
+        n_queries = query_vectors.shape[0]
+        bounds = np.full((n_queries,),np.inf)
+        if self._n_indexed < k:
+            return bounds
+        nodes = np.zeros((n_queries,),dtype=np.intp)
+        active = np.arange(n_queries)
+        while active.size > 0:
+            current = nodes[active]
+            is_internal = self._lefts[current] >= 0
+            active,current = active[is_internal],current[is_internal]
+            axes = self._split_axes[current]
+            go_left = query_vectors[active,axes] <= self._split_values[current]
+            children = np.where(go_left,self._lefts[current],
+                                self._rights[current])
+            big_enough = (self._stops[children]-self._starts[children]) >= k
+            active,children = active[big_enough],children[big_enough]
+            nodes[active] = children
+        queries,locations = self._node_pairs(np.arange(n_queries),nodes)
+        chords_squared = _chords_squared(query_vectors[queries],
+                                         self._unit_vectors[locations])
+        #k-th smallest for each query (pairs are grouped by query)
+        sort_order = np.lexsort((chords_squared,queries))
+        counts = self._stops[nodes]-self._starts[nodes]
+        kth = (np.cumsum(counts)-counts)+k-1
+        bounds[:] = chords_squared[sort_order][kth]
+        return bounds
+
+    def _angles(self,query_vectors,queries,locations):
+        return _great_circle_distance_haversine_chords(
+                                        query_vectors[queries],
+                                        self._unit_vectors[locations])
+
+    def query(self,lats,azis,k=1,distunit='rad',r=None):
+        """Find the k nearest indexed locations to each query location
+
+        PARAMETERS
+        ----------
+
+        lats : float or np.ndarray
+            Latitudes of the m query locations (degrees)
+        azis : float or np.ndarray
+            Azimuths (longitudes or localtimes) of the query locations 
+            (in the index's aziunit)
+        k : int, optional
+            Number of nearest locations to find
+        distunit : str, optional
+            Unit of the returned great circle distances (angles), 
+            valid values: rad (default), deg or hour
+        r : float, optional
+            Radius of the sphere, if passed the distances are arc 
+            lengths (in the units of r) instead of angles
+
+        RETURNS
+        -------
+
+        dists : np.ndarray
+            Distances to the k nearest locations (shape=(m,k)), sorted 
+            nearest first, np.inf if there are fewer than k indexed
+            locations
+        inds : np.ndarray
+            Numbers of the k nearest locations (shape=(m,k)),
+            -1 if there are fewer than k indexed locations
+        """
+        if k < 1:
+            raise ValueError('k must be a positive integer')
+        query_vectors = _unit_vectors(lats,azis,self.aziunit,np.float64)
+        n_queries = query_vectors.shape[0]
+        bounds = self._kth_chord_squared_bounds(query_vectors,k)
+        queries,locations,chords_squared = self._candidate_pairs(query_vectors,
+                                                                 bounds*(1.+1e-12))
+        #The k nearest of the candidates (ties broken by location number)
+        sort_order = np.lexsort((locations,chords_squared,queries))
+        queries,locations = queries[sort_order],locations[sort_order]
+        first_of_query = np.searchsorted(queries,np.arange(n_queries))
+        ranks = np.arange(queries.size)-first_of_query[queries]
+        nearest = ranks < k
+        queries,locations,ranks = queries[nearest],locations[nearest],ranks[nearest]
+        dists = np.full((n_queries,k),np.inf)
+        inds = np.full((n_queries,k),-1,dtype=np.intp)
+        dists[queries,ranks] = _angles_to_distances(
+                                    self._angles(query_vectors,queries,locations),
+                                    distunit,r)
+        inds[queries,ranks] = locations
+        return dists,inds
+
+    def query_within_distance(self,lats,azis,max_distance,distunit='rad',r=None):
+        """Find all indexed locations within a great circle distance 
+        of each query location
+
+        PARAMETERS
+        ----------
+
+        lats : float or np.ndarray
+            Latitudes of the m query locations (degrees)
+        azis : float or np.ndarray
+            Azimuths (longitudes or localtimes) of the query locations
+            (in the index's aziunit)
+        max_distance : float or np.ndarray
+            Maximum distance (for all or each query location)
+        distunit : str, optional
+            Unit of max_distance and the returned distances (angles),
+            valid values: rad (default), deg or hour
+        r : float, optional
+            Radius of the sphere, if passed max_distance and the 
+            returned distances are arc lengths (in the units of r) 
+            instead of angles
+
+        RETURNS
+        -------
+
+        i,j,dists : np.ndarray
+            Numbers of the query locations and of the indexed locations
+            and the distances between them, for each pair closer than
+            max_distance (sorted by i then j), like
+            great_circle_distance_matrix with max_distance
+        """
+        query_vectors = _unit_vectors(lats,azis,self.aziunit,np.float64)
+        n_queries = query_vectors.shape[0]
+        max_angles = np.broadcast_to(_distances_to_angles(
+                                        np.asarray(max_distance,dtype=float),
+                                        distunit,r),(n_queries,))
+        queries,locations,chords_squared = self._candidate_pairs(
+                                            query_vectors,
+                                            _max_chord_squared(max_angles))
+        angles = self._angles(query_vectors,queries,locations)
+        close = angles <= max_angles[queries]
+        queries,locations,angles = queries[close],locations[close],angles[close]
+        sort_order = np.lexsort((locations,queries))
+        return (queries[sort_order],locations[sort_order],
+                _angles_to_distances(angles[sort_order],distunit,r))
+
+    _TREE_ARRAYS = ('_order','_starts','_stops','_lefts','_rights',
+                    '_split_axes','_split_values','_los','_his')
+
+    def save(self,filename):
+        """Save the index (locations and tree) to a numpy .npz file"""
+        arrays = {name.lstrip('_'):getattr(self,name) 
+                  for name in self._TREE_ARRAYS}
+        np.savez(filename,unit_vectors=self._unit_vectors,
+                 n_indexed=self._n_indexed,leafsize=self.leafsize,
+                 aziunit=self.aziunit,**arrays)
+
+    @classmethod
+    def load(cls,filename):
+        """Load an index saved with save (without rebuilding the tree)"""
+        with np.load(filename,allow_pickle=False) as saved:
+            index = cls(aziunit=str(saved['aziunit']),
+                        leafsize=int(saved['leafsize']))
+            index._unit_vectors = saved['unit_vectors']
+            index._n_indexed = int(saved['n_indexed'])
+            for name in cls._TREE_ARRAYS:
+                setattr(index,name,saved[name.lstrip('_')])
+        return index
@@ -2,10 +2,14 @@
 # Written by Liam M. Kilcommons
 import numpy as np
 import datetime
-from geospacepy.special_datetime import datetime2jd,dt_j2000
-from geospacepy.array_management import BroadcastLenOneInputsToMatchArrayInputs
-
-def solar_position_almanac(jds):
+from geospacepy.special_datetime import (datetime2jd,dt_j2000,
+                                        julian_date_parts)
+from geospacepy.array_management import (BroadcastLenOneInputsToMatchArrayInputs,
+                                         result_float_dtype,validate_output,
+                                         prepare_outputs,ProcessInputsInChunks)
+
+@ProcessInputsInChunks
+def solar_position_almanac(jds,out=None):
     """
     Finds the apparent solar right ascension and 
     declination for any number of julian dates.
@@ -21,8 +25,13 @@ def solar_position_almanac(jds):
     Parameters
     ----------
 
-    jds : np.ndarray or float
+    jds : np.ndarray or float or tuple or special_datetime.Timeline
         Julian dates for which to calculate solar positions
+        (or two-part julian dates (jd_days,jd_fracs), or a Timeline)
+
+    out : tuple of np.ndarray, optional
+        Arrays (alpha_out,delta_out) to store the results in (float32
+        arrays store the results rounded to float32)
 
     Returns
     -------
@@ -37,8 +46,14 @@ def solar_position_almanac(jds):
 
     """
 
+    jd_days,jd_fracs = julian_date_parts(jds)
+    if out is not None:
+        out = prepare_outputs(out,2,np.broadcast(jd_days,jd_fracs).shape,
+                              np.float64)
+    else:
+        out = (None,None)
     jd_j2000_epoch = datetime2jd(dt_j2000)
-    jd2000 = jds - jd_j2000_epoch #J2000 epoch = 2451545.0 
+    jd2000 = (jd_days - jd_j2000_epoch) + jd_fracs #J2000 epoch = 2451545.0 
 
     #Solar mean longitude (degrees)
     L = 280.460 + .9856474*jd2000
@@ -69,13 +84,22 @@ def solar_position_almanac(jds):
     lam_r = np.radians(lam)
     alpha = lam - f*t*np.sin(2.*lam_r) + (f/2.)*t**2*np.sin(4*lam_r)
     #alpha = np.arctan2(np.cos(epsilon_r)*np.sin(lam_r),np.cos(lam_r))
-    alpha_r = np.radians(alpha)
+    alpha_r = np.radians(alpha,out=out[0])
 
     #Declination (equiv. to subsolar latitude, always < 90.)
     delta = np.degrees(np.arcsin(np.sin(epsilon_r)*np.sin(lam_r)))
-    delta_r = np.radians(delta)
+    delta_r = np.radians(delta,out=out[1])
     return alpha_r,delta_r
 
+def _store_result(result,out,dtype):
+    """Copy a result computed in float64 into the out= array if one
+    was passed, otherwise return it as dtype (float32 for float32
+    locations)"""
+    if out is not None:
+        out[...] = result
+        return out
+    return result.astype(dtype,copy=False)
+
 def _solar_position_russell(dt):
     """This function is DEPRECATED use solar_position_almanac instead.
     There is reliable documentation for the solar_position_almanac
@@ -149,7 +173,8 @@ def _solar_position_russell(dt):
     gst = np.radians(gst)
     return gst,sdec,sransn
 
-def greenwich_mean_siderial_time(jds):
+@ProcessInputsInChunks
+def greenwich_mean_siderial_time(jds,out=None):
     """Calculate the angle in the plane of the equator
     between the vernal equinox direction and the prime meridian (the 
     line of longitude through Greenwich, England).
@@ -157,9 +182,13 @@ def greenwich_mean_siderial_time(jds):
     Parameters
     ----------
 
-    jds : float or np.ndarray
+    jds : float or np.ndarray or tuple or special_datetime.Timeline
         The julian date(s) of the times for which the GMST should
-        be calculated
+        be calculated (or two-part julian dates (jd_days,jd_fracs), 
+        or a Timeline)
+
+    out : np.ndarray, optional
+        Array to store the result in
 
     Returns
     -------
@@ -178,15 +207,24 @@ def greenwich_mean_siderial_time(jds):
     
     Generally though, UTC is available instead of UT1. UTC is determined
     from atomic clocks, and is kept within +- 1 second of UT1 
-    by the periodic insertion of leap seconds.
+    by the periodic insertion of leap seconds. To convert UTC to UT1,
+    load a table of UT1-UTC with time_scales.load_dut1_table and 
+    use time_scales.utc2ut1.
     
     """
+    jd_days,jd_fracs = julian_date_parts(jds)
+    out = validate_output(out,jd_days,jd_fracs)
     jd_j2000 = datetime2jd(dt_j2000)
-    t_ut1 = (jds-jd_j2000)/36525. #Get Julian centuries since the j2000.0 epoch
-    #Note that this formula can be broken up into a two part (hours and seconds) version using a two part
-    #T_UT1. Where 876600 is multiplied by 3600., and in the exponentiation, the accuracy can be increased
-    #by breaking up the T_UT1
-    theta_GST_s = 67310.54841+(876600.*3600.+8640184.812866)*t_ut1+.093104*t_ut1**2-6.2e-6*t_ut1**3
+    days_j2000 = jd_days-jd_j2000 #Whole days since the j2000.0 epoch
+    t_ut1 = (days_j2000+jd_fracs)/36525. #Get Julian centuries since the j2000.0 epoch
+    #The formula is 
+    #theta_GST_s = 67310.54841+(876600.*3600.+8640184.812866)*t_ut1+.093104*t_ut1**2-6.2e-6*t_ut1**3
+    #but 876600*3600*t_ut1 is 86400 seconds times the number of days 
+    #since j2000, and whole days are whole multiples of 86400 seconds,
+    #so only the fraction of the day contributes (modulo 86400). Using the
+    #two part time this way avoids multiplying the (imprecise) full
+    #julian date by a very large number
+    theta_GST_s = 67310.54841+86400.*jd_fracs+8640184.812866*t_ut1+.093104*t_ut1**2-6.2e-6*t_ut1**3
     
     # NOTE: In Python (and Numpy), the output of modulus is 
     # always the same sign as the divisor (360. in the case of angles)
@@ -203,11 +241,11 @@ def greenwich_mean_siderial_time(jds):
     theta_GST = np.mod(theta_GST,360.)
 
     # Radians
-    theta_GST = theta_GST * np.pi / 180.
+    theta_GST = np.divide(theta_GST*np.pi,180.,out=out)
     return theta_GST
 
-@BroadcastLenOneInputsToMatchArrayInputs
-def local_hour_angle(jds,glons):
+@ProcessInputsInChunks
+def local_hour_angle(jds,glons,out=None):
     """
     Finds local hour angle in radians. The sign convention is that of astronomy 
     (positive to the west, meaning angle increases opposite the 
@@ -220,25 +258,38 @@ def local_hour_angle(jds,glons):
     Parameters
     ----------
 
-    jds : np.ndarray or float
-        Time (as julian date)
+    jds : np.ndarray or float or tuple or special_datetime.Timeline
+        Time (as julian date, two-part julian date (jd_days,jd_fracs),
+        or Timeline)
 
     glons : np.ndarray or float
         Geographic longitude
 
+    out : np.ndarray, optional
+        Array to store the result in
+
     Returns
     -------
 
     lhas : np.ndarray or float
-        Local hour angles for locations at specified times (in radians)
+        Local hour angles for locations at specified times (in radians),
+        float32 if glons is float32
     
     .. note::
 
         See also Vallado Figure 3-9 (pp.157)
 
     """
-    sra,dec = solar_position_almanac(jds)
-    gmst = greenwich_mean_siderial_time(jds) 
+    jd_days,jd_fracs = julian_date_parts(jds)
+    out = validate_output(out,jd_days,jd_fracs,glons)
+    lhas = _local_hour_angle(jd_days,jd_fracs,glons)
+    return _store_result(lhas,out,result_float_dtype(glons))
+
+@BroadcastLenOneInputsToMatchArrayInputs
+def _local_hour_angle(jd_days,jd_fracs,glons):
+    """Local hour angle for two-part julian dates"""
+    sra,dec = solar_position_almanac((jd_days,jd_fracs))
+    gmst = greenwich_mean_siderial_time((jd_days,jd_fracs))
     
     #Greenwich Mean Sideral Time, Right Ascension, and longitude are
     #all measured with positive angles counterclockwise about the north pole
@@ -249,20 +300,24 @@ def local_hour_angle(jds,glons):
     lhas = (gmst+phi) - sra
     return lhas
 
-@BroadcastLenOneInputsToMatchArrayInputs
-def local_mean_solar_time(jds,glons):
+@ProcessInputsInChunks
+def local_mean_solar_time(jds,glons,out=None):
     """
     Find the local solar time (using the mean equinox)
 
     Parameters
     ----------
 
-    jds : np.ndarray or float
-        Time (as julian date)
+    jds : np.ndarray or float or tuple or special_datetime.Timeline
+        Time (as julian date, two-part julian date (jd_days,jd_fracs),
+        or Timeline)
 
     glons : np.ndarray or float
         Geographic longitude
 
+    out : np.ndarray, optional
+        Array to store the result in
+
     Returns
     -------
 
@@ -283,13 +338,13 @@ def local_mean_solar_time(jds,glons):
     See also Vallado pp. 184
 
     """
-    lhas = local_hour_angle(jds,glons)
+    lhas = local_hour_angle(jds,glons,out=out)
     #lhas *= -1. #Convert to positive in the eastward direction
-    lmsts = lhas + np.pi  #Equiv to + 12 in hours units
+    lmsts = np.add(lhas,np.pi,out=out)  #Equiv to + 12 in hours units
     return lmsts
 
-@BroadcastLenOneInputsToMatchArrayInputs
-def solar_zenith_angle(jds,glats,glons):
+@ProcessInputsInChunks
+def solar_zenith_angle(jds,glats,glons,out=None):
     """
     Finds solar zenith angle using Astronomical Almanac low-accuracy
     solar position.
@@ -297,8 +352,9 @@ def solar_zenith_angle(jds,glats,glons):
     Parameters
     ----------
 
-    jds : np.ndarray or float
-        Time (as julian date)
+    jds : np.ndarray or float or tuple or special_datetime.Timeline
+        Time (as julian date, two-part julian date (jd_days,jd_fracs),
+        or Timeline)
 
     glats : np.ndarray or float
         Geographic (geocentric-spherical) latitude of the location
@@ -306,19 +362,30 @@ def solar_zenith_angle(jds,glats,glons):
     glons : np.ndarray or float
         Geographic longitude of the location
 
+    out : np.ndarray, optional
+        Array to store the result in
+
     Returns
     -------
 
     szas : np.ndarray or float
         Solar Zenith angles for the time/location combinations
-        specified (in radians)
+        specified (in radians), float32 if glats and glons are float32
 
     """
+    jd_days,jd_fracs = julian_date_parts(jds)
+    out = validate_output(out,jd_days,jd_fracs,glats,glons)
+    szas = _solar_zenith_angle(jd_days,jd_fracs,glats,glons)
+    return _store_result(szas,out,result_float_dtype(glats,glons))
+
+@BroadcastLenOneInputsToMatchArrayInputs
+def _solar_zenith_angle(jd_days,jd_fracs,glats,glons):
+    """Solar zenith angle for two-part julian dates"""
     lam = np.radians(glats)
     phi = np.radians(glons)
     
-    sra,sdec = solar_position_almanac(jds)
-    sha = local_hour_angle(jds,glons)
+    sra,sdec = solar_position_almanac((jd_days,jd_fracs))
+    sha = _local_hour_angle(jd_days,jd_fracs,glons)
 
     cossza = np.sin(lam)*np.sin(sdec) + np.cos(lam)*np.cos(sdec)*np.cos(sha)
     szas = np.arccos(cossza)
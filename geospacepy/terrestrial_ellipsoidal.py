@@ -1,13 +1,21 @@
 import numpy as np
 from warnings import warn
 from geospacepy.array_management import (CheckInputsAreThreeComponentVectors,
-                                        BroadcastLenOneInputsToMatchArrayInputs)
+                                        BroadcastLenOneInputsToMatchArrayInputs,
+                                        result_float_dtype,prepare_output,
+                                        prepare_outputs,ProcessInputsInChunks)
+from geospacepy import terrestrial_spherical
+from geospacepy.ellipsoids import WGS84
 
-ECC_EARTH_SQUARED = .006694385
-R_EARTH_MEAN_EQ = 6378137 #in m
+#Constants of the default (WGS84) ellipsoid, functions in this 
+#module take an ellipsoid model (see geospacepy.ellipsoids) instead
+ECC_EARTH_SQUARED = WGS84.e2
+R_EARTH_MEAN_EQ = WGS84.a #in m
 
+@ProcessInputsInChunks
 @CheckInputsAreThreeComponentVectors('R_ECEF')
-def ecef_cart2geodetic(R_ECEF,tol=1e-7,maxiters=100):
+def ecef_cart2geodetic(R_ECEF,tol=1e-7,maxiters=100,method='vallado',
+                       return_convergence=False,ellipsoid=WGS84,out=None):
     """This implements Algorithm 12 (pp.179) of Fundamentals of Astrodynamics 
     and Applications (3rd Edition) by David Vallado. The algorithm's purpose
     is to transform the position vector of a spacecraft in earth-centered
@@ -27,13 +35,32 @@ def ecef_cart2geodetic(R_ECEF,tol=1e-7,maxiters=100):
         (Example 3-3)
     maxiters : int
         Maximum number of times the algorithm will attempt to refine the
-        geodetic latitude before raising RuntimeError
+        geodetic latitude of a position. Positions which have not 
+        converged after maxiters iterations get NaN geodetic latitude 
+        and height (and a warning is issued)
+    method : str
+        'vallado' (default) for the iterative algorithm described above,
+        or 'vermeille' for the closed form (non-iterative) solution
+        of Vermeille (2002), which takes a fixed number of array
+        operations and is accurate to well below a millimeter for
+        positions outside of a few hundred kilometers from the center
+        of the earth (tol and maxiters are ignored)
+    return_convergence : bool
+        If True, also return the number of iterations and a mask
+        of convergence failures for each position
+    ellipsoid : ellipsoids.Ellipsoid
+        Model of the earth's shape (default WGS84)
+    out : tuple, optional
+        Arrays (gdlats,gclons,h_ellps) (each shape=(n,)) to store
+        the results in
     
     Returns
     -------
 
     gdlats : np.ndarray, shape=(n,)
         Geodetic latitudes of each position in R_ECEF
+        (float32 if R_ECEF is float32, like gclons and h_ellps,
+        the calculation itself is always done in float64)
     gclons : np.ndarray, shape=(n,)
         Geocentric longitudes of each position in R_ECEF
     h_ellps : np.ndarray, shape=(n,)
@@ -41,6 +68,12 @@ def ecef_cart2geodetic(R_ECEF,tol=1e-7,maxiters=100):
         (the distance between each position and the ground, 
         measured perpendicular to the surface of an ellipsoidal 
         approximation of the earth)
+    iterations : np.ndarray, shape=(n,)
+        Only if return_convergence is True, number of iterations
+        used for each position (zero for method='vermeille')
+    failed : np.ndarray, shape=(n,)
+        Only if return_convergence is True, boolean mask which is True 
+        for positions which did not converge
 
     Warns
     -----
@@ -48,21 +81,33 @@ def ecef_cart2geodetic(R_ECEF,tol=1e-7,maxiters=100):
     UserWarning
         If ECEF positions are below earth's surface (because it may be
         the position was in kilometers instead of meters)
+    UserWarning
+        If the geodetic latitude of any position did not converge
+
+    References
+    ----------
+
+    Vermeille, H. (2002). Direct transformation from geocentric coordinates
+    to geodetic coordinates. Journal of Geodesy, 76(8), 451-454.
 
     """
+    if method not in ('vallado','vermeille'):
+        raise ValueError(('Invalid method {},'.format(method)
+                          +' valid values are vallado or vermeille'))
+
     if np.any(np.logical_not(np.isfinite(R_ECEF))):
         raise ValueError(('Non-finite earth-centered-earth-fixed positions')
                           +' can not be converted to geodetic')
 
-    X = R_ECEF[:,0].flatten()
-    Y = R_ECEF[:,1].flatten()
-    Z = R_ECEF[:,2].flatten()
+    X = R_ECEF[:,0].astype(np.float64)
+    Y = R_ECEF[:,1].astype(np.float64)
+    Z = R_ECEF[:,2].astype(np.float64)
 
     R = np.sqrt(X**2.+Y**2.+Z**2.)
-    if np.any(R<R_EARTH_MEAN_EQ):
+    if np.any(R<ellipsoid.a):
         warnstr = ('Apparently underground positions '
                   +'were passed to ecef_cart2geodetic '
-                  +'( || R_ECEF || < {} m) '.format(R_EARTH_MEAN_EQ)
+                  +'( || R_ECEF || < {} m) '.format(ellipsoid.a)
                   +'if you did not mean to calculate underground '
                   +'positions, check R_ECEF is in units of meters.')
         warn(warnstr,UserWarning)
@@ -71,46 +116,421 @@ def ecef_cart2geodetic(R_ECEF,tol=1e-7,maxiters=100):
     R_eq = np.sqrt(X**2+Y**2)
 
     #Determine the right ascension of the spacecraft
-    sin_alpha = Y/R_eq
-    cos_alpha = X/R_eq
     alpha = np.arctan2(Y,X)
 
     #Longitude is just right ascension, even for an ellipsoidal earth
     glons = alpha
 
-    #Determine the declination of the spacecraft
-    delta = np.arctan2(Z,R_eq)
+    if method == 'vermeille':
+        gdlats,h_ellps = _vermeille_geodetic_latitude_and_height(R_eq,Z,
+                                                                 ellipsoid)
+        iterations = np.zeros(gdlats.shape,dtype=int)
+        failed = np.zeros(gdlats.shape,dtype=bool)
+    else:
+        #Determine the declination of the spacecraft
+        delta = np.arctan2(Z,R_eq)
+        gdlats,iterations,failed = _iterate_geodetic_latitude(R_eq,Z,delta,
+                                                              tol,maxiters,
+                                                              ellipsoid)
+        if np.any(failed):
+            warnstr=('Geodetic latitude estimation failed to converge '
+                    +'to iteration-to-iteration tolerance {} '.format(tol)
+                    +'after {} iterations '.format(maxiters)
+                    +'for {} positions, '.format(np.count_nonzero(failed))
+                    +'their geodetic coordinates are set to NaN')
+            warn(warnstr,UserWarning)
 
-    def C_earth(gdlats):
-        """Ellipsoidal parameter used in formula for the equatorial
-        projection of a position vector in terms of ellipsoid
-        (geodetic) parameters.
-            R_eq = (C_Earth+h_ellp)*cos(gdlat) (Vallado Eq 3-7)
-        """
-        return R_EARTH_MEAN_EQ/np.sqrt(1.-ECC_EARTH_SQUARED*np.sin(gdlats)**2)
-    
-    def refine_geodetic_latitude_estimate(gdlats):
-        return np.arctan2(Z+C_earth(gdlats)*ECC_EARTH_SQUARED*np.sin(gdlats),R_eq)
+        #Find height above the surface of the ellipsoid
+        h_ellps = R_eq/np.cos(gdlats)-ellipsoid.prime_vertical_radius(
+                                                            np.sin(gdlats))
+
+    gdlats_out,glons_out,h_ellps_out = prepare_outputs(out,3,X.shape,
+                                                result_float_dtype(R_ECEF))
+    np.degrees(gdlats,out=gdlats_out)
+    np.degrees(glons,out=glons_out)
+    h_ellps_out[:] = h_ellps
+    if return_convergence:
+        return gdlats_out,glons_out,h_ellps_out,iterations,failed
+    return gdlats_out,glons_out,h_ellps_out
 
-    tolerance_reached = False
-    prev_estimated = None
-    gdlats_estimated = delta
-    gdlats = None
+def _iterate_geodetic_latitude(R_eq,Z,delta,tol,maxiters,ellipsoid):
+    """Iteratively refine geodetic latitude estimates (starting from the 
+    declinations delta) with Vallado Algorithm 12. Only the elements 
+    which have not yet converged are refined, using preallocated buffers.
+
+    Returns geodetic latitudes (NaN where not converged), the number
+    of iterations for each element, and a mask of elements which
+    did not converge in maxiters iterations
+    """
+    n = delta.size
+    gdlats = delta.copy()
+    iterations = np.zeros(n,dtype=int)
+    #Indices of the unconverged elements and their (compacted) inputs
+    active = np.arange(n)
+    Z_active,R_eq_active,gdlats_active = Z,R_eq,delta.copy()
+    sin_buffer,work_buffer,refined_buffer = np.empty(n),np.empty(n),np.empty(n)
+    e2 = ellipsoid.e2
     for i in range(maxiters):
-        #print(i,gdlats_estimated)
-        prev_estimated = gdlats_estimated.copy()
-        gdlats_estimated = refine_geodetic_latitude_estimate(gdlats_estimated)
-        if np.all(np.abs(gdlats_estimated-prev_estimated)<tol):
-            #print("Converged after {} iterations".format(i))
-            gdlats = gdlats_estimated
+        n_active = active.size
+        if n_active == 0:
             break
+        sin_gdlats = sin_buffer[:n_active]
+        work = work_buffer[:n_active]
+        refined = refined_buffer[:n_active]
+        #arctan2(Z+C_earth*e2*sin(gdlats),R_eq)
+        np.sin(gdlats_active,out=sin_gdlats)
+        ellipsoid.prime_vertical_radius(sin_gdlats,out=work)
+        work *= sin_gdlats
+        work *= e2
+        work += Z_active
+        np.arctan2(work,R_eq_active,out=refined)
+        iterations[active] += 1
+
+        np.subtract(refined,gdlats_active,out=work)
+        np.abs(work,out=work)
+        converged = work < tol
+        gdlats_active[:] = refined
+        if np.any(converged):
+            gdlats[active[converged]] = refined[converged]
+            unconverged = np.logical_not(converged)
+            active = active[unconverged]
+            Z_active = Z_active[unconverged]
+            R_eq_active = R_eq_active[unconverged]
+            gdlats_active = gdlats_active[unconverged]
+
+    failed = np.zeros(n,dtype=bool)
+    failed[active] = True
+    gdlats[active] = np.nan
+    return gdlats,iterations,failed
+
+def _vermeille_geodetic_latitude_and_height(R_eq,Z,ellipsoid,buffers=None):
+    """Closed form geodetic latitude (radians) and ellipsoidal height
+    (meters) from the equatorial projection (R_eq) and Z component
+    of ECEF positions (Vermeille, 2002). The intermediate quantities
+    are computed in place in four buffers (shape=(4,n), allocated if
+    not passed), the names in the comments are those of the paper.
+    Returns views of two of the buffers"""
+    a,e2,e4 = ellipsoid.a,ellipsoid.e2,ellipsoid.e4
+    if buffers is None:
+        buffers = np.empty((4,R_eq.size))
+    buf_p,buf_q,buf_r,buf_t = buffers
+    #p = (R_eq/a)^2, q = (1-e^2)*(Z/a)^2
+    np.divide(R_eq,a,out=buf_p)
+    np.multiply(buf_p,buf_p,out=buf_p)
+    np.divide(Z,a,out=buf_q)
+    np.multiply(buf_q,buf_q,out=buf_q)
+    buf_q *= ellipsoid.one_minus_e2
+    #r = (p+q-e^4)/6
+    np.add(buf_p,buf_q,out=buf_r)
+    buf_r -= e4
+    buf_r /= 6.
+    #s = e^4*p*q/(4*r^3) (in buf_p)
+    buf_p *= buf_q
+    buf_p *= e4
+    np.multiply(buf_r,buf_r,out=buf_t)
+    buf_t *= buf_r
+    buf_t *= 4.
+    buf_p /= buf_t
+    #t = cbrt(1+s+sqrt(s*(2+s)))
+    np.add(buf_p,2.,out=buf_t)
+    buf_t *= buf_p
+    np.sqrt(buf_t,out=buf_t)
+    buf_t += buf_p
+    buf_t += 1.
+    np.cbrt(buf_t,out=buf_t)
+    #u = r*(1+t+1/t) (in buf_p)
+    np.divide(1.,buf_t,out=buf_p)
+    buf_p += buf_t
+    buf_p += 1.
+    buf_p *= buf_r
+    #v = sqrt(u^2+e^4*q) (in buf_r)
+    np.multiply(buf_p,buf_p,out=buf_r)
+    np.multiply(buf_q,e4,out=buf_t)
+    buf_r += buf_t
+    np.sqrt(buf_r,out=buf_r)
+    #w = e^2*(u+v-q)/(2*v) (in buf_t)
+    np.add(buf_p,buf_r,out=buf_t)
+    buf_t -= buf_q
+    buf_t *= e2
+    np.multiply(buf_r,2.,out=buf_q)
+    buf_t /= buf_q
+    #k = sqrt(u+v+w^2)-w (in buf_p)
+    buf_p += buf_r
+    np.multiply(buf_t,buf_t,out=buf_q)
+    buf_p += buf_q
+    np.sqrt(buf_p,out=buf_p)
+    buf_p -= buf_t
+    #D = k*R_eq/(k+e^2) (in buf_t)
+    np.add(buf_p,e2,out=buf_r)
+    np.multiply(buf_p,R_eq,out=buf_t)
+    buf_t /= buf_r
+    #sqrt(D^2+Z^2) (in buf_r, np.hypot is several times slower)
+    np.multiply(buf_t,buf_t,out=buf_r)
+    np.multiply(Z,Z,out=buf_q)
+    buf_r += buf_q
+    np.sqrt(buf_r,out=buf_r)
+    #Geodetic latitude 2*arctan2(Z,D+sqrt(D^2+Z^2)) (in buf_q)
+    np.add(buf_t,buf_r,out=buf_q)
+    np.arctan2(Z,buf_q,out=buf_q)
+    buf_q *= 2.
+    #Height (k+e^2-1)/k*sqrt(D^2+Z^2) (in buf_t)
+    np.add(buf_p,e2-1.,out=buf_t)
+    buf_t /= buf_p
+    buf_t *= buf_r
+    return buf_q,buf_t
+
+#Number of samples which the functions below convert at once, reusing 
+#the same buffers for each block (small enough that the buffers stay in
+#the CPU cache, which is about twice as fast as whole-array operations
+#for large arrays)
+_BLOCK_SIZE = 16384
+
+def _blocks(n_samples):
+    """Slices of consecutive blocks of at most _BLOCK_SIZE samples"""
+    return [slice(start,min(start+_BLOCK_SIZE,n_samples))
+            for start in range(0,n_samples,_BLOCK_SIZE)]
+
+def _block_buffers(n_buffers,n_samples):
+    """Work buffers for the largest block of n_samples samples"""
+    return np.empty((n_buffers,min(n_samples,_BLOCK_SIZE)))
+
+def _sin_cos_degrees(angles,sin_out,cos_out):
+    """Sine and cosine of angles (degrees) from the tangent of the half
+    angle t, sin = 2t/(1+t^2) and cos = (1-t^2)/(1+t^2) = 2/(1+t^2)-1. 
+    This is accurate to about one unit in the last place and one np.tan
+    is about three times faster than each of np.sin and np.cos"""
+    np.multiply(angles,np.pi/360.,out=sin_out)
+    np.tan(sin_out,out=sin_out)
+    np.multiply(sin_out,sin_out,out=cos_out)
+    cos_out += 1.
+    np.divide(2.,cos_out,out=cos_out)
+    sin_out *= cos_out
+    cos_out -= 1.
+    return sin_out,cos_out
+
+def _geodetic2equatorial_and_z(gdlats,h_ellps,ellipsoid,buffers):
+    """Equatorial projection (R_eq) and Z component of the ECEF positions
+    at geodetic latitudes gdlats (degrees) and ellipsoidal heights h_ellps,
+    computed in place in three buffers (shape=(3,n)). Returns R_eq, Z 
+    and the third buffer (which the caller can reuse)"""
+    sin_gdlats,R_eq = _sin_cos_degrees(gdlats,buffers[0],buffers[2])
+    N = ellipsoid.prime_vertical_radius(sin_gdlats,out=buffers[1])
+    #R_eq = (N+h)*cos(gdlat)
+    N += h_ellps
+    R_eq *= N
+    #Z = (N*(1-e^2)+h)*sin(gdlat) = ((1-e^2)*(N+h)+e^2*h)*sin(gdlat)
+    N *= sin_gdlats
+    N *= ellipsoid.one_minus_e2
+    sin_gdlats *= h_ellps
+    sin_gdlats *= ellipsoid.e2
+    N += sin_gdlats
+    return R_eq,N,sin_gdlats
 
-    if gdlats is None:
-        warnstr=('Geodetic latitude estimation failed to converge'
-                +'to iteration-to-iteration tolerance {}'.format(tol)
-                +'after {} iterations'.format(maxiters))
-        raise RuntimeError(warnstr)
+@ProcessInputsInChunks
+@BroadcastLenOneInputsToMatchArrayInputs
+def geodetic2ecef(gdlats,glons,h_ellps,ellipsoid=WGS84,out=None):
+    """Transform n positions in geodetic latitude, longitude and height
+    above the ellipsoid to cartesian Earth Centered Earth Fixed (ECEF)
+    (the inverse of ecef_cart2geodetic, Vallado Eq. 3-7)
 
-    #Find height above the surface of the ellipsoid
-    h_ellps = R_eq/np.cos(gdlats)-C_earth(gdlats)
-    return np.degrees(gdlats),np.degrees(glons),h_ellps
+    Parameters
+    ----------
+
+    gdlats : float or np.ndarray
+        Geodetic latitudes (shape=(n,))
+    glons : float or np.ndarray
+        Longitudes (shape=(n,)). Sign convention is ISO 6709 
+        (west is negative)
+    h_ellps : float or np.ndarray
+        Ellipsoidal heights in meters (shape=(n,))
+    ellipsoid : ellipsoids.Ellipsoid
+        Model of the earth's shape (default WGS84)
+    out : np.ndarray, optional
+        Array (shape=(n,3)) to store the result in
+
+    Returns
+    -------
+
+    R_ECEF : np.ndarray, shape=(n,3)
+        n position vectors in cartesian ECEF in meters (float32 if
+        the array inputs are float32, otherwise float64)
+    """
+    dtype = result_float_dtype(gdlats,glons,h_ellps)
+    #(float64 arrays and broadcast single values are not copied)
+    gdlats,glons,h_ellps = [np.asarray(arr,dtype=float).reshape(-1) 
+                            for arr in (gdlats,glons,h_ellps)]
+    R_ECEF = prepare_output(out,(gdlats.size,3),dtype)
+    buffers = _block_buffers(3,gdlats.size)
+    for block in _blocks(gdlats.size):
+        R_eq,Z,buffer = _geodetic2equatorial_and_z(gdlats[block],
+                                                   h_ellps[block],ellipsoid,
+                                                   buffers[:,:block.stop-block.start])
+        R_ECEF[block,2] = Z
+        #Trigonometry is done in contiguous buffers (it is much slower
+        #writing directly to the strided columns of R_ECEF)
+        sin_glons,cos_glons = _sin_cos_degrees(glons[block],buffer,Z)
+        np.multiply(R_eq,cos_glons,out=R_ECEF[block,0])
+        np.multiply(R_eq,sin_glons,out=R_ECEF[block,1])
+    return R_ECEF
+
+@ProcessInputsInChunks
+@BroadcastLenOneInputsToMatchArrayInputs
+def geodetic2geocentric(gdlats,h_ellps,ellipsoid=WGS84,out=None):
+    """Geocentric latitude and distance from the center of the earth
+    of positions at geodetic latitudes gdlats and ellipsoidal
+    heights h_ellps (longitude is the same in both systems)
+
+    Parameters
+    ----------
+
+    gdlats : float or np.ndarray
+        Geodetic latitudes (shape=(n,))
+    h_ellps : float or np.ndarray
+        Ellipsoidal heights in meters (shape=(n,)), use 0 for positions
+        on the surface of the ellipsoid
+    ellipsoid : ellipsoids.Ellipsoid
+        Model of the earth's shape (default WGS84)
+    out : tuple, optional
+        Arrays (gclats,rs) (each shape=(n,)) to store the results in
+
+    Returns
+    -------
+
+    gclats : np.ndarray
+        Geocentric latitudes (shape=(n,))
+    rs : np.ndarray
+        Distances from the center of the earth in meters (shape=(n,))
+    """
+    dtype = result_float_dtype(gdlats,h_ellps)
+    gdlats,h_ellps = [np.asarray(arr,dtype=float).reshape(-1) 
+                      for arr in (gdlats,h_ellps)]
+    gclats,rs = prepare_outputs(out,2,gdlats.shape,dtype)
+    buffers = _block_buffers(3,gdlats.size)
+    for block in _blocks(gdlats.size):
+        R_eq,Z,buffer = _geodetic2equatorial_and_z(gdlats[block],
+                                                   h_ellps[block],ellipsoid,
+                                                   buffers[:,:block.stop-block.start])
+        np.arctan2(Z,R_eq,out=buffer)
+        np.degrees(buffer,out=gclats[block])
+        #sqrt(R_eq^2+Z^2) (np.hypot is several times slower)
+        R_eq *= R_eq
+        np.multiply(Z,Z,out=buffer)
+        R_eq += buffer
+        np.sqrt(R_eq,out=rs[block])
+    return gclats,rs
+
+@ProcessInputsInChunks
+def geocentric2geodetic(gclats,rs=None,ellipsoid=WGS84,out=None):
+    """Geodetic latitude and ellipsoidal height of positions at 
+    geocentric latitudes gclats and distances from the center of the earth
+    rs (longitude is the same in both systems)
+
+    Parameters
+    ----------
+
+    gclats : float or np.ndarray
+        Geocentric latitudes (shape=(n,))
+    rs : float or np.ndarray, optional
+        Distances from the center of the earth in meters (shape=(n,)).
+        If not passed, the positions are assumed to be on the surface
+        of the ellipsoid
+    ellipsoid : ellipsoids.Ellipsoid
+        Model of the earth's shape (default WGS84)
+    out : tuple, optional
+        Arrays (gdlats,h_ellps) (each shape=(n,)) to store the results in
+
+    Returns
+    -------
+
+    gdlats : np.ndarray
+        Geodetic latitudes (shape=(n,))
+    h_ellps : np.ndarray
+        Ellipsoidal heights in meters (shape=(n,)), zero if rs
+        was not passed
+    """
+    dtype = result_float_dtype(gclats) if rs is None else result_float_dtype(gclats,rs)
+    gclats = np.asarray(gclats,dtype=float).reshape(-1)
+    gdlats_out,h_ellps_out = prepare_outputs(out,2,gclats.shape,dtype)
+    if rs is not None:
+        rs = np.broadcast_to(np.asarray(rs,dtype=float).reshape(-1),
+                             gclats.shape)
+    else:
+        h_ellps_out[:] = 0.
+    buffers = _block_buffers(6,gclats.size)
+    for block in _blocks(gclats.size):
+        block_buffers = buffers[:,:block.stop-block.start]
+        sin_gclats,cos_gclats = _sin_cos_degrees(gclats[block],
+                                                 *block_buffers[:2])
+        if rs is None:
+            #On the surface tan(gclat) = (1-e^2)*tan(gdlat)
+            cos_gclats *= ellipsoid.one_minus_e2
+            np.arctan2(sin_gclats,cos_gclats,out=sin_gclats)
+            np.degrees(sin_gclats,out=gdlats_out[block])
+            continue
+        #Equatorial projection and Z component (in place)
+        cos_gclats *= rs[block]
+        sin_gclats *= rs[block]
+        gdlats,h_ellps = _vermeille_geodetic_latitude_and_height(cos_gclats,
+                                                                 sin_gclats,
+                                                                 ellipsoid,
+                                                                 block_buffers[2:])
+        np.degrees(gdlats,out=gdlats_out[block])
+        h_ellps_out[block] = h_ellps
+    return gdlats_out,h_ellps_out
+
+@ProcessInputsInChunks
+@CheckInputsAreThreeComponentVectors('R_ECEF')
+def ecef2enu(R_ECEF,gdlats,glons,out=None):
+    """Rotate n vectors from Earth Centered Earth Fixed (ECEF)
+    to local geodetic east, north, up coordinates (up is normal to the 
+    ellipsoid) centered at one location if only a single lat/lon pair
+    is passed, or n locations if gdlats and glons are arrays of length n
+
+    Parameters
+    ----------
+
+    R_ECEF : np.ndarray
+        Array of n 3-component vectors (shape=(n,3)) in cartesian ECEF
+    gdlats : float or np.ndarray
+        Geodetic latitude(s) of ENU coordinates
+    glons : float or np.ndarray
+        Longitude(s) of ENU coordinates
+    out : np.ndarray, optional
+        Array (shape=(n,3)) to store the result in (can be R_ECEF)
+
+    Returns
+    -------
+
+    R_ENU : np.ndarray
+        Array of n 3-component vectors (shape=(n,3)) in geodetic ENU
+    """
+    #The rotation is the same as for a spherical earth, with the
+    #geodetic latitude in place of the geocentric
+    return terrestrial_spherical.ecef2enu(R_ECEF,gdlats,glons,out=out)
+
+@ProcessInputsInChunks
+@CheckInputsAreThreeComponentVectors('R_ENU')
+def enu2ecef(R_ENU,gdlats,glons,out=None):
+    """Rotate n vectors from geodetic East North Up (ENU) (relative to
+    location(s) specified by gdlats and glons) to Earth Centered Earth
+    Fixed (ECEF) coordinates
+
+    Parameters
+    ----------
+
+    R_ENU : np.ndarray
+        Array of n 3-component vectors (shape=(n,3)) in geodetic ENU
+    gdlats : float or np.ndarray
+        Geodetic latitude(s) which define ENU directions
+    glons : float or np.ndarray
+        Longitude(s) which define ENU directions
+    out : np.ndarray, optional
+        Array (shape=(n,3)) to store the result in (can be R_ENU)
+
+    Returns
+    -------
+
+    R_ECEF : np.ndarray
+        Array of n 3-component vectors (shape=(n,3)) in cartesian ECEF
+    """
+    return terrestrial_spherical.enu2ecef(R_ENU,gdlats,glons,out=out)
@@ -3,15 +3,21 @@
 import numpy as np
 from numpy import (cos,sin,tan,arccos,arcsin,arctan2)
 from geospacepy.array_management import (CheckInputsAreThreeComponentVectors,
-                                        BroadcastLenOneInputsToMatchArrayInputs)
-from geospacepy.rotations import rot1,rot2,rot3
+                                        BroadcastLenOneInputsToMatchArrayInputs,
+                                        _check_follows_3_component_vector_convention,
+                                        result_float_dtype,
+                                        prepare_output,prepare_outputs,
+                                        ProcessInputsInChunks)
+from geospacepy.rotations import rot1,rot2,rot3,RotationSequence
 from geospacepy.sun import greenwich_mean_siderial_time
+from geospacepy.ellipsoids import SPHERE
 #from scipy.spatial.transform import Rotation
 
-R_EARTH = 6371200 #m
+R_EARTH = SPHERE.a #m
 
+@ProcessInputsInChunks
 @CheckInputsAreThreeComponentVectors('R_ECEF')
-def ecef2eci(R_ECEF,jds):
+def ecef2eci(R_ECEF,jds,out=None):
     """Rotate a vector from cartesian Earth Centered Earth Fixed (ECEF) to
     Cartesian Earth Centered Inertial (ECI)
 
@@ -20,9 +26,12 @@ def ecef2eci(R_ECEF,jds):
         
     R_ECEF : np.ndarray
         Array of n three component vectors ( shape=(n,3) ) in ECEF
-    jds : float or np.ndarray
+    jds : float or np.ndarray or tuple or special_datetime.Timeline
         Time stamp (as julian date) for all (if float) or each (if array)
-        of the vectors in R_ECEF
+        of the vectors in R_ECEF (or two-part julian dates 
+        (jd_days,jd_fracs), or a Timeline)
+    out : np.ndarray, optional
+        Array ( shape=(n,3) ) to store the result in (can be R_ECEF)
 
     RETURNS
     -------
@@ -32,11 +41,12 @@ def ecef2eci(R_ECEF,jds):
 
     """
     theta_GST = greenwich_mean_siderial_time(jds)
-    R_ECI = rot3(-1*theta_GST,R_ECEF)
+    R_ECI = rot3(-1*theta_GST,R_ECEF,out=out)
     return R_ECI
 
+@ProcessInputsInChunks
 @CheckInputsAreThreeComponentVectors('R_ECI')
-def eci2ecef(R_ECI,jds):
+def eci2ecef(R_ECI,jds,out=None):
     """Rotate a vector from cartesian Earth Centered Inertial (ECI) to 
     cartesian Earth Centered Earth Fixed (ECEF)
 
@@ -45,9 +55,12 @@ def eci2ecef(R_ECI,jds):
         
     R_ECI : np.ndarray
         Array of n three component vectors ( shape=(n,3) ) in ECI
-    jds : float or np.ndarray
+    jds : float or np.ndarray or tuple or special_datetime.Timeline
         Time stamp (as julian date) for all (if float) or each (if array)
-        of the vectors in R_ECEF
+        of the vectors in R_ECEF (or two-part julian dates 
+        (jd_days,jd_fracs), or a Timeline)
+    out : np.ndarray, optional
+        Array ( shape=(n,3) ) to store the result in (can be R_ECI)
 
     RETURNS
     -------
@@ -57,11 +70,144 @@ def eci2ecef(R_ECI,jds):
 
     """
     theta_GST = greenwich_mean_siderial_time(jds)
-    R_ECEF = rot3(theta_GST,R_ECI)
+    R_ECEF = rot3(theta_GST,R_ECI,out=out)
     return R_ECEF
 
+class ECIECEFTransform(object):
+    """Rotations between cartesian Earth Centered Inertial (ECI) and
+    cartesian Earth Centered Earth Fixed (ECEF) for a fixed set of 
+    times. The greenwich mean siderial time and its sine and cosine
+    are computed once, when the transform is created, so any number of
+    vector arrays (positions, velocities, field vectors...) can be
+    transformed for the same times without recomputing them.
+
+    Keep the transform to reuse it, or use ECIECEFTransform.cached(jds,cache)
+    with an array_management.ArrayCache the caller keeps, to reuse the 
+    transform across calls which pass the same times.
+    """
+    def __init__(self,jds):
+        """
+        PARAMETERS
+        ----------
+
+        jds : float or np.ndarray or tuple or special_datetime.Timeline
+            Time stamp (as julian date) for all (if float) or each 
+            (if array) of the vectors which will be transformed (or two-part
+            julian dates (jd_days,jd_fracs), or a Timeline)
+        """
+        self.theta_GST = np.asarray(greenwich_mean_siderial_time(jds)).flatten()
+        self._cos = np.cos(self.theta_GST)
+        self._sin = np.sin(self.theta_GST)
+
+    @classmethod
+    def cached(cls,jds,cache):
+        """Get the transform for times jds from a least-recently-used
+        cache of transforms (or create it and cache it). The cache is 
+        owned by the caller, and holds references to the cached jds and
+        their transforms until it is cleared or discarded.
+
+        PARAMETERS
+        ----------
+
+        jds : float or np.ndarray or tuple or special_datetime.Timeline
+            Times as for ECIECEFTransform
+        cache : array_management.ArrayCache
+            The cache, which recognizes jds either by identity (the 
+            same object, gives stale results if jds is modified in place)
+            or by contents (hashes all of jds on every call, which for
+            large arrays costs a large fraction of computing the transform)
+
+        RETURNS
+        -------
+
+        transform : ECIECEFTransform
+
+        Example
+        -------
+
+            from geospacepy.array_management import ArrayCache
+            transforms = ArrayCache(maxsize=1)
+            for R_ECI in vector_arrays:
+                transform = ECIECEFTransform.cached(jds,transforms)
+                R_ECEF = transform.to_ecef(R_ECI)
+        """
+        return cache.get(jds,lambda : cls(jds))
+
+    def __len__(self):
+        return self.theta_GST.size
+
+    def _rotate(self,vecs,sign,out=None):
+        _check_follows_3_component_vector_convention(vecs)
+        if len(self) not in (1,vecs.shape[0]):
+            raise ValueError(('Cannot map {} times '.format(len(self))
+                              +'to {} vectors'.format(vecs.shape[0])))
+        #Same as rot3(sign*theta_GST,vecs)
+        c,s = self._cos,sign*self._sin
+        rotated = prepare_output(out,vecs.shape,result_float_dtype(vecs))
+        rotated_x = c*vecs[:,0]+s*vecs[:,1]
+        rotated[:,1] = c*vecs[:,1]-s*vecs[:,0]
+        rotated[:,0] = rotated_x
+        if rotated is not vecs:
+            rotated[:,2] = vecs[:,2]
+        return rotated
+
+    def _rotate_all(self,vecs_arrays,sign,out):
+        if out is None:
+            out = (None,)*len(vecs_arrays)
+        elif isinstance(out,np.ndarray):
+            out = (out,)
+        if len(out) != len(vecs_arrays):
+            raise ValueError(('{} output arrays '.format(len(out))
+                              +'passed for {} input arrays'.format(len(vecs_arrays))))
+        rotated = tuple([self._rotate(vecs,sign,out=vecs_out) 
+                         for vecs,vecs_out in zip(vecs_arrays,out)])
+        return rotated[0] if len(rotated) == 1 else rotated
+
+    def to_eci(self,*R_ECEFs,out=None):
+        """Rotate any number of arrays of vectors from ECEF to ECI
+
+        PARAMETERS
+        ----------
+
+        R_ECEFs : np.ndarray
+            Arrays of n three component vectors ( shape=(n,3) ) in ECEF
+        out : np.ndarray or tuple, optional
+            Array(s) to store the results in, one for each input array
+            (can be the input arrays themselves)
+
+        RETURNS
+        -------
+
+        R_ECIs : np.ndarray or tuple
+            The vectors in ECI (a tuple of arrays if more than 
+            one array was passed)
+        """
+        return self._rotate_all(R_ECEFs,-1,out)
+
+    def to_ecef(self,*R_ECIs,out=None):
+        """Rotate any number of arrays of vectors from ECI to ECEF
+
+        PARAMETERS
+        ----------
+
+        R_ECIs : np.ndarray
+            Arrays of n three component vectors ( shape=(n,3) ) in ECI
+        out : np.ndarray or tuple, optional
+            Array(s) to store the results in, one for each input array
+            (can be the input arrays themselves)
+
+        RETURNS
+        -------
+
+        R_ECEFs : np.ndarray or tuple
+            The vectors in ECEF (a tuple of arrays if more than 
+            one array was passed)
+        """
+        return self._rotate_all(R_ECIs,1,out)
+
+@ProcessInputsInChunks
 @CheckInputsAreThreeComponentVectors('R_ECEF')
-def ecef_cart2spherical(R_ECEF):
+def ecef_cart2spherical(R_ECEF,out=None):
     """Transform a vector in cartesian Earth Centered Earth Fixed (ECEF)
     to geocentric spherical (a.k.a geographic coordinates)
 
@@ -71,6 +217,8 @@ def ecef_cart2spherical(R_ECEF):
     R_ECEF : np.ndarray
         Array of n three component vectors ( shape=(n,3) ) in cartesian
         ECEF
+    out : tuple, optional
+        Arrays (lats,lons,rs) (each shape=(n,)) to store the results in
 
     RETURNS
     -------
@@ -85,17 +233,21 @@ def ecef_cart2spherical(R_ECEF):
         (shape=(n,))
         (same units as R_ECEF)
 
+    The outputs are float32 if R_ECEF is float32, otherwise float64
     """
-    xs = R_ECEF[:,0].flatten()
-    ys = R_ECEF[:,1].flatten()
-    zs = R_ECEF[:,2].flatten()
-    rs = np.sqrt(xs**2.+ys**2.+zs**2.)
-    lons = np.degrees(np.arctan2(ys,xs)) #Longitude is angle in x,y plane
-    lats = np.degrees(np.arcsin(zs/rs)) #Latitude is angle z-ward from x,y plane
+    xs,ys,zs = R_ECEF[:,0],R_ECEF[:,1],R_ECEF[:,2]
+    lats,lons,rs = prepare_outputs(out,3,(R_ECEF.shape[0],),
+                                   result_float_dtype(R_ECEF))
+    np.sqrt(xs**2.+ys**2.+zs**2.,out=rs)
+    #Longitude is angle in x,y plane
+    np.degrees(np.arctan2(ys,xs,out=lons),out=lons)
+    #Latitude is angle z-ward from x,y plane
+    np.degrees(np.arcsin(np.divide(zs,rs,out=lats),out=lats),out=lats)
     return lats,lons,rs
 
+@ProcessInputsInChunks
 @BroadcastLenOneInputsToMatchArrayInputs
-def ecef_spherical2cart(lats,lons,rs):
+def ecef_spherical2cart(lats,lons,rs,out=None):
     """Transform n positions in geocentric spherical, a.k.a. spherical Earth
     Centered Earth Fixed (ECEF), a.k.a geographic to cartesian Earth Centered Earth
     Fixed (ECEF)
@@ -111,13 +263,15 @@ def ecef_spherical2cart(lats,lons,rs):
     rs : float or np.ndarray
         Array of n radii (distance from center of the earth) 
         (shape=(n,))
+    out : np.ndarray, optional
+        Array ( shape=(n,3) ) to store the result in
 
     RETURNS
     -------
 
     R_ECEF : np.ndarray
         Array of n three component vectors ( shape=(n,3) ) in cartesian
-        ECEF
+        ECEF (float32 if the array inputs are float32, otherwise float64)
 
     .. note::
 
@@ -125,18 +279,22 @@ def ecef_spherical2cart(lats,lons,rs):
         at positive z axis), and phi (azimuthal, zero at positive x axis) 
         is used
     """
+    dtype = result_float_dtype(lats,lons,rs)
+    lats,lons,rs = [np.asarray(arr,dtype=dtype).reshape(-1)
+                    for arr in (lats,lons,rs)]
     thetas = np.radians(90.-lats)
     phis = np.radians(lons)
-    x = rs*np.sin(thetas)*np.cos(phis)
-    y = rs*np.sin(thetas)*np.sin(phis)
-    z = rs*np.cos(thetas)
-    R_ECEF = np.concatenate([x.reshape(-1,1),
-                             y.reshape(-1,1),
-                             z.reshape(-1,1)],axis=1)
+    R_ECEF = prepare_output(out,(thetas.size,3),dtype)
+    #Write the components directly into the columns of the output
+    rs_sin_thetas = rs*np.sin(thetas)
+    np.multiply(rs_sin_thetas,np.cos(phis),out=R_ECEF[:,0])
+    np.multiply(rs_sin_thetas,np.sin(phis),out=R_ECEF[:,1])
+    np.multiply(rs,np.cos(thetas),out=R_ECEF[:,2])
     return R_ECEF
     
+@ProcessInputsInChunks
 @CheckInputsAreThreeComponentVectors('R_ECEF')
-def ecef2enu(R_ECEF,lats,lons):
+def ecef2enu(R_ECEF,lats,lons,out=None):
     """Rotate n vectors from Earth Centered Earth Fixed (ECEF)
     to local east, north, up coordinates centered at one location if only a
     single lat/lon pair is passed, or n locations if lats and lons are
@@ -153,6 +311,9 @@ def ecef2enu(R_ECEF,lats,lons):
     
     lons : float or np.ndarray
         Longitude(s) of ENU coordinates
+
+    out : np.ndarray, optional
+        Array (shape=(n,3)) to store the result in (can be R_ECEF)
     
     RETURNS
     -------
@@ -168,12 +329,14 @@ def ecef2enu(R_ECEF,lats,lons):
     lonrot = np.mod(90.+lons,360.)
     colat = 90.-lats
 
-    R_ENU = rot1(np.radians(colat),rot3(np.radians(lonrot),R_ECEF))
+    rotations = RotationSequence([2,0],[np.radians(lonrot),np.radians(colat)])
+    R_ENU = rotations.apply(R_ECEF,out=out)
     return R_ENU
 
 
+@ProcessInputsInChunks
 @CheckInputsAreThreeComponentVectors('R_ENU')
-def enu2ecef(R_ENU,lats,lons):
+def enu2ecef(R_ENU,lats,lons,out=None):
     """Rotate n vectors from East North Up (ENU) (relative to location(s)
     specified by lats and lons) to Earth Centered Earth Fixed (ECEF) coordinates
     
@@ -189,6 +352,9 @@ def enu2ecef(R_ENU,lats,lons):
     
     lons : float or np.ndarray
         Longitude(s) which define ENU direction
+
+    out : np.ndarray, optional
+        Array (shape=(n,3)) to store the result in (can be R_ENU)
     
     RETURNS
     -------
@@ -202,5 +368,7 @@ def enu2ecef(R_ENU,lats,lons):
     #the same sign as the denominator (360.) 
     lonrot = np.mod(90.+lons,360.)
     colat = 90.-lats
-    R_ECEF = rot3(np.radians(-1*lonrot), rot1(np.radians(-1*colat),R_ENU) )
+    rotations = RotationSequence([0,2],[np.radians(-1*colat),
+                                        np.radians(-1*lonrot)])
+    R_ECEF = rotations.apply(R_ENU,out=out)
     return R_ECEF
\ No newline at end of file
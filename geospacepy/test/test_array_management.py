@@ -1,11 +1,18 @@
 # (C) 2020 University of Colorado AES-CCAR-SEDA (Space Environment Data Analysis) Group
 # Written by Liam M. Kilcommons
 import pytest
+import threading
 import numpy as np
 import numpy.testing as nptest
 from geospacepy.array_management import (is_number_or_len_one_array,
                                         BroadcastLenOneInputsToMatchArrayInputs,
-                                        CheckInputsAreThreeComponentVectors)
+                                        CheckInputsAreThreeComponentVectors,
+                                        ArrayCache,
+                                        validation_mode,
+                                        get_validation_mode,
+                                        result_float_dtype,
+                                        prepare_output,
+                                        ProcessInputsInChunks)
 
 def test_float_is_number_or_len_one_array():
     assert is_number_or_len_one_array(1.)
@@ -112,3 +119,164 @@ def test_check_inputs_are_three_component_vectors_raises_value_error_on_bad_shap
     with pytest.raises(ValueError):
         Rxyz,Rrthph = _vec_cart2sph_example()
         _decorated_vec_cart2sph(Rxyz.T)
+
+@pytest.mark.parametrize('by',['identity','contents'])
+def test_array_cache_computes_once_per_array(by):
+    cache = ArrayCache(maxsize=2,by=by)
+    calls = []
+    def compute(arr):
+        calls.append(1)
+        return arr*2.
+    arr1,arr2,arr3 = np.arange(3.),np.arange(4.),np.arange(5.)
+    for arr in (arr1,arr1,arr2,arr1,arr3,arr2):
+        nptest.assert_allclose(cache.get(arr,lambda : compute(arr)),arr*2.)
+    #arr2 was least recently used when arr3 was added
+    assert len(calls) == 4
+    assert len(cache) == 2
+
+def test_array_cache_by_contents_recognizes_copies():
+    cache = ArrayCache(by='contents')
+    arr = np.arange(10.)
+    cache.get(arr,lambda : 1)
+    assert cache.get(arr.copy(),lambda : 2) == 1
+    assert cache.get(arr+1.,lambda : 3) == 3
+
+@BroadcastLenOneInputsToMatchArrayInputs
+def _return_inputs(a,b):
+    return a,b
+
+def test_broadcast_does_not_copy_single_values():
+    a = np.arange(5.)
+    a_out,b_out = _return_inputs(a,2)
+    assert a_out is a
+    nptest.assert_array_equal(b_out,np.full((5,),2.))
+    assert b_out.dtype == np.float64
+    #A view with zero stride, not a new array
+    assert b_out.strides == (0,)
+
+@CheckInputsAreThreeComponentVectors('vecs')
+def _return_vecs(vecs):
+    return vecs
+
+@pytest.mark.parametrize('mode,raises',[('strict',True),
+                                        ('fast',True),
+                                        ('off',False)])
+def test_validation_modes(mode,raises):
+    bad_vecs = np.ones((3,2))
+    with validation_mode(mode):
+        assert get_validation_mode() == mode
+        if raises:
+            with pytest.raises(ValueError):
+                _return_vecs(bad_vecs)
+        else:
+            _return_vecs(bad_vecs)
+    assert get_validation_mode() == 'strict'
+
+def test_validation_mode_is_per_thread():
+    entered,release = threading.Event(),threading.Event()
+    def relax_validation():
+        with validation_mode('off'):
+            entered.set()
+            release.wait()
+    thread = threading.Thread(target=relax_validation)
+    thread.start()
+    entered.wait()
+    try:
+        assert get_validation_mode() == 'strict'
+        with pytest.raises(ValueError):
+            _return_vecs(np.ones((3,2)))
+    finally:
+        release.set()
+        thread.join()
+
+@ProcessInputsInChunks
+@CheckInputsAreThreeComponentVectors('vecs')
+def _chunked_return_vecs(vecs):
+    return vecs
+
+def test_chunks_on_worker_threads_use_callers_validation_mode():
+    bad_vecs = np.ones((10,2))
+    with pytest.raises(ValueError):
+        _chunked_return_vecs(bad_vecs,chunksize=3,workers=2)
+    with validation_mode('off'):
+        result = _chunked_return_vecs(bad_vecs,chunksize=3,workers=2)
+    nptest.assert_array_equal(result,bad_vecs)
+
+@pytest.mark.parametrize('inputs,expected',[((np.ones(3,dtype=np.float32),),np.float32),
+                                            ((np.ones(3,dtype=np.float32),2.),np.float32),
+                                            ((np.ones(3,dtype=np.float32),np.ones(3)),np.float64),
+                                            ((np.ones(3,dtype=int),),np.float64),
+                                            ((2.,),np.float64)])
+def test_result_float_dtype(inputs,expected):
+    assert result_float_dtype(*inputs) == expected
+
+def test_prepare_output_validates_out():
+    out = np.empty((5,3))
+    assert prepare_output(out,(5,3),np.float64) is out
+    assert prepare_output(None,(5,3),np.float32).dtype == np.float32
+    with pytest.raises(ValueError):
+        prepare_output(out,(4,3),np.float64)
+    with pytest.raises(TypeError):
+        prepare_output(np.empty((5,3),dtype=int),(5,3),np.float64)
+
+def test_broadcast_single_values_match_float32_arrays():
+    a = np.arange(5.,dtype=np.float32)
+    a_out,b_out = _return_inputs(a,2.)
+    assert b_out.dtype == np.float32
+
+@ProcessInputsInChunks
+@BroadcastLenOneInputsToMatchArrayInputs
+def _sum_and_difference(a,b):
+    return a+b,a-b
+
+@pytest.mark.parametrize('kwargs',[{'chunksize':7},
+                                   {'workers':3},
+                                   {'chunksize':10,'workers':2},
+                                   {'chunksize':10,'workers':2,'executor':'process'}])
+def test_process_inputs_in_chunks_matches_unchunked(kwargs):
+    a = np.arange(100.)
+    expected = _sum_and_difference(a,a)
+    results = _sum_and_difference(a,a,**kwargs)
+    for result,expected_result in zip(results,expected):
+        nptest.assert_array_equal(result,expected_result)
+    #Single values are passed unchanged to each chunk
+    nptest.assert_array_equal(_sum_and_difference(a,2.,chunksize=7)[0],a+2.)
+
+def test_process_inputs_in_chunks_writes_to_out():
+    a = np.arange(100.)
+    out = (np.empty(100),np.empty(100))
+    results = _sum_and_difference(a,1.,chunksize=30,out=out)
+    assert results[0] is out[0] and results[1] is out[1]
+    nptest.assert_array_equal(out[1],a-1.)
+    with pytest.raises(ValueError):
+        _sum_and_difference(a,1.,chunksize=30,out=(np.empty(99),np.empty(99)))
+
+_scaled_calls = []
+
+@ProcessInputsInChunks
+@BroadcastLenOneInputsToMatchArrayInputs
+def _scaled(a,factor,out=None):
+    _scaled_calls.append(out)
+    out = prepare_output(out,a.shape,result_float_dtype(a))
+    np.multiply(a,factor,out=out)
+    return out
+
+@pytest.mark.parametrize('pass_out',[True,False])
+def test_process_inputs_in_chunks_passes_views_of_output_as_out(pass_out):
+    a = np.arange(100.)
+    out = np.empty(100) if pass_out else None
+    del _scaled_calls[:]
+    result = _scaled(a,2.,chunksize=30,out=out)
+    nptest.assert_array_equal(result,a*2.)
+    if pass_out:
+        assert result is out
+    #Every chunk (except the first if no out was passed, which
+    #determines the outputs) is written into a view of the result
+    first_written = 0 if pass_out else 1
+    assert len(_scaled_calls) == 4
+    assert all([view.base is result for view in _scaled_calls[first_written:]])
+    assert [view.shape[0] for view in _scaled_calls[1:]] == [30,30,10]
+
+def test_process_inputs_in_chunks_validates_workers():
+    with pytest.raises(ValueError):
+        _sum_and_difference(np.arange(10.),1.,workers=0)
@@ -0,0 +1,156 @@
+# (C) 2020 University of Colorado AES-CCAR-SEDA (Space Environment Data Analysis) Group
+# Written by Liam M. Kilcommons
+import datetime
+import pytest
+import numpy as np
+import numpy.testing as nptest
+from geospacepy.conjunctions import find_conjunctions
+from geospacepy.special_datetime import matchTimes
+from geospacepy.spherical_geometry import great_circle_distance
+
+def _circular_orbit(times,period_s,inclination,lon0,lon_rate):
+    """Latitudes and longitudes (degrees) of a simple circular orbit"""
+    t_s = (times-times[0])/np.timedelta64(1,'s')
+    phase = 2*np.pi*t_s/period_s
+    incl = np.radians(inclination)
+    lats = np.degrees(np.arcsin(np.sin(incl)*np.sin(phase)))
+    lons = np.degrees(np.arctan2(np.cos(incl)*np.sin(phase),np.cos(phase)))
+    lons = np.mod(lons+lon0+lon_rate*t_s+180.,360.)-180.
+    return lats,lons
+
+def _example_tracks():
+    start = np.datetime64('2010-01-01T00:00:00','us')
+    times1 = start+np.arange(0,86400,1)*np.timedelta64(1,'s')
+    #Track 2 sampled every 2 seconds, with an offset
+    times2 = start+np.arange(0,86400,2)*np.timedelta64(1,'s') \
+                 +np.timedelta64(300000,'us')
+    lats1,lons1 = _circular_orbit(times1,6000.,98.,0.,-.004)
+    lats2,lons2 = _circular_orbit(times2,6100.,85.,30.,-.004)
+    return times1,lats1,lons1,times2,lats2,lons2
+
+def _brute_force_conjunctions(times1,lats1,lons1,times2,lats2,lons2,
+                              max_angle,max_time_offset):
+    inds,matched = matchTimes(times2,times1,tol_us=max_time_offset*1e6+1,
+                              allow_duplicates=True)
+    dists = np.full(times1.shape,np.inf)
+    dists[matched] = great_circle_distance(lats1[matched],lons1[matched],
+                                           lats2[inds[matched]],
+                                           lons2[inds[matched]],'deg',
+                                           algorithm='haversine')
+    close = np.flatnonzero(dists <= max_angle)
+    breaks = np.flatnonzero(np.diff(close) != 1)+1
+    runs = np.split(close,breaks) if close.size > 0 else []
+    return [(run[0],run[-1]+1,run[np.argmin(dists[run])],
+             inds[run[np.argmin(dists[run])]],np.min(dists[run]))
+            for run in runs]
+
+@pytest.mark.parametrize('chunksize',[997,10000,200000])
+def test_find_conjunctions_matches_brute_force(chunksize):
+    times1,lats1,lons1,times2,lats2,lons2 = _example_tracks()
+    max_angle = np.radians(3.)
+    conjunctions = find_conjunctions(times1,lats1,lons1,times2,lats2,lons2,
+                                     max_angle,max_time_offset=1.,
+                                     chunksize=chunksize)
+    expected = _brute_force_conjunctions(times1,lats1,lons1,times2,lats2,
+                                         lons2,max_angle,1.)
+    assert len(expected) > 0
+    assert len(conjunctions) == len(expected)
+    for conjunction,(start,stop,i_min,j_min,min_dist) in zip(conjunctions,
+                                                             expected):
+        assert conjunction['start_index'] == start
+        assert conjunction['stop_index'] == stop
+        assert conjunction['min_index1'] == i_min
+        assert conjunction['min_index2'] == j_min
+        assert conjunction['start_time'] == times1[start]
+        assert conjunction['end_time'] == times1[stop-1]
+        assert conjunction['min_time'] == times1[i_min]
+        nptest.assert_allclose(conjunction['min_distance'],min_dist,
+                               rtol=0.,atol=1e-9)
+        nptest.assert_allclose(conjunction['time_offset'],
+                               (times2[j_min]-times1[i_min])/np.timedelta64(1,'s'))
+
+def test_find_conjunctions_merges_across_chunks():
+    times1,lats1,lons1,times2,lats2,lons2 = _example_tracks()
+    max_angle = np.radians(3.)
+    conjunctions = find_conjunctions(times1,lats1,lons1,times2,lats2,lons2,
+                                     max_angle,chunksize=len(times1))
+    #Split the longest conjunction between two chunks
+    longest = np.argmax(conjunctions['stop_index']-conjunctions['start_index'])
+    assert conjunctions['stop_index'][longest] \
+           -conjunctions['start_index'][longest] > 1
+    chunksize = int(conjunctions['start_index'][longest]+1)
+    chunked = find_conjunctions(times1,lats1,lons1,times2,lats2,lons2,
+                                max_angle,chunksize=chunksize)
+    nptest.assert_array_equal(chunked,conjunctions)
+
+def test_find_conjunctions_distance_units():
+    times1,lats1,lons1,times2,lats2,lons2 = _example_tracks()
+    r = 6371.2
+    in_rad = find_conjunctions(times1,lats1,lons1,times2,lats2,lons2,
+                               np.radians(3.))
+    in_deg = find_conjunctions(times1,lats1,lons1,times2,lats2,lons2,
+                               3.,distunit='deg')
+    in_km = find_conjunctions(times1,lats1,lons1,times2,lats2,lons2,
+                              np.radians(3.)*r,r=r)
+    nptest.assert_array_equal(in_deg['start_index'],in_rad['start_index'])
+    nptest.assert_array_equal(in_km['start_index'],in_rad['start_index'])
+    nptest.assert_allclose(in_deg['min_distance'],
+                           np.degrees(in_rad['min_distance']))
+    nptest.assert_allclose(in_km['min_distance'],in_rad['min_distance']*r)
+
+def test_find_conjunctions_with_fixed_location():
+    start = datetime.datetime(2010,1,1)
+    times = [start+datetime.timedelta(seconds=s) for s in range(10)]
+    lats = np.array([10.,5.,1.5,.5,0.,.5,5.,.2,.1,20.])
+    lons = np.zeros((10,))
+    conjunctions = find_conjunctions(times,lats,lons,None,0.,0.,1.,
+                                     distunit='deg')
+    nptest.assert_array_equal(conjunctions['start_index'],[3,7])
+    nptest.assert_array_equal(conjunctions['stop_index'],[6,9])
+    nptest.assert_array_equal(conjunctions['min_index1'],[4,8])
+    nptest.assert_allclose(conjunctions['min_distance'],[0.,.1],atol=1e-12)
+    assert conjunctions['start_time'][0] == np.datetime64(times[3],'us')
+
+@pytest.mark.parametrize('chunksize',[2,3,100])
+def test_find_conjunctions_splits_at_data_gaps(chunksize):
+    start = np.datetime64('2010-01-01T00:00:00','us')
+    seconds = np.array([0,1,2,4*86400,4*86400+1,4*86400+2])
+    times = start+seconds*np.timedelta64(1,'s')
+    lats = np.array([.5,.1,.5,.5,.2,.5])
+    lons = np.zeros((6,))
+    conjunctions = find_conjunctions(times,lats,lons,None,0.,0.,1.,
+                                     distunit='deg',chunksize=chunksize)
+    nptest.assert_array_equal(conjunctions['start_index'],[0,3])
+    nptest.assert_array_equal(conjunctions['stop_index'],[3,6])
+    nptest.assert_array_equal(conjunctions['min_index1'],[1,4])
+    #A long enough max_gap joins the two passes
+    joined = find_conjunctions(times,lats,lons,None,0.,0.,1.,distunit='deg',
+                               max_gap=5*86400.,chunksize=chunksize)
+    nptest.assert_array_equal(joined['start_index'],[0])
+    nptest.assert_array_equal(joined['stop_index'],[6])
+
+def test_find_conjunctions_default_max_gap_does_not_depend_on_chunksize():
+    #A single continuous pass over a fixed location
+    start = np.datetime64('2010-01-01T00:00:00','us')
+    times = start+np.arange(20000)*np.timedelta64(1,'s')
+    lats = np.linspace(-10.,10.,20000)
+    lons = np.zeros((20000,))
+    expected = find_conjunctions(times,lats,lons,None,0.,0.,1.,distunit='deg')
+    assert len(expected) == 1
+    for chunksize in [1,7]:
+        conjunctions = find_conjunctions(times,lats,lons,None,0.,0.,1.,
+                                         distunit='deg',chunksize=chunksize)
+        nptest.assert_array_equal(conjunctions,expected)
+
+def test_find_conjunctions_respects_max_time_offset():
+    times1,lats1,lons1,times2,lats2,lons2 = _example_tracks()
+    #Track 2 samples are at least .3 seconds from track 1 samples
+    conjunctions = find_conjunctions(times1,lats1,lons1,times2,lats2,lons2,
+                                     np.radians(3.),max_time_offset=.2)
+    assert len(conjunctions) == 0
+    assert conjunctions.dtype.names[0] == 'start_time'
+
+def test_find_conjunctions_requires_sorted_times():
+    times1,lats1,lons1,times2,lats2,lons2 = _example_tracks()
+    with pytest.raises(ValueError):
+        find_conjunctions(times1[::-1],lats1,lons1,times2,lats2,lons2,1.)
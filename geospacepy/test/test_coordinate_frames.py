@@ -0,0 +1,66 @@
+# (C) 2020 University of Colorado AES-CCAR-SEDA (Space Environment Data Analysis) Group
+# Written by Liam M. Kilcommons
+import pytest
+import datetime
+import numpy as np
+import numpy.testing as nptest
+from geospacepy.special_datetime import datetime2jd
+from geospacepy.rotations import rot1
+from geospacepy.terrestrial_spherical import (eci2ecef,ecef2eci,ecef2enu,
+                                            ecef_cart2spherical)
+from geospacepy.coordinate_frames import FrameGraph,frame_graph,transform,plan
+
+example_jd = datetime2jd(datetime.datetime(2010,5,29,9,13,30))
+
+def _example_vectors(n_vectors):
+    return np.random.RandomState(42).normal(size=(n_vectors,3))*6.5e6
+
+@pytest.mark.parametrize('n_vectors,jds,lats,lons',
+                         [(1,example_jd,40.,-105.),
+                          (5,example_jd+np.arange(5)/24.,40.,-105.),
+                          (5,example_jd,np.linspace(-80,80,5),np.linspace(-170,170,5))])
+def test_eci_to_enu_matches_chained_functions(n_vectors,jds,lats,lons):
+    R_ECI = _example_vectors(n_vectors)
+    expected = ecef2enu(eci2ecef(R_ECI,jds),lats,lons)
+    R_ENU = transform(R_ECI,'ECI','ENU',times=jds,lats=lats,lons=lons)
+    nptest.assert_allclose(R_ENU,expected,atol=1e-6,rtol=0.)
+    R_ECI_out = transform(R_ENU,'enu','eci',times=jds,lats=lats,lons=lons)
+    nptest.assert_allclose(R_ECI_out,R_ECI,atol=1e-6,rtol=0.)
+
+def test_eci_to_enu_plan_fuses_rotations():
+    eci2enu_plan = plan('ECI','ENU')
+    assert eci2enu_plan.frames == ['ECI','ECEF','ENU']
+    assert eci2enu_plan.steps == [('rotation',['ECI','ECEF','ENU'])]
+    assert eci2enu_plan.avoided_frames == ['ECEF']
+
+def test_eci_to_spherical():
+    R_ECI = _example_vectors(5)
+    R_SPH = transform(R_ECI,'ECI','SPHERICAL',times=example_jd)
+    expected = np.column_stack(ecef_cart2spherical(eci2ecef(R_ECI,example_jd)))
+    nptest.assert_allclose(R_SPH,expected,atol=1e-6,rtol=0.)
+    assert plan('ECI','SPHERICAL').n_passes == 2
+
+def test_missing_context_raises():
+    with pytest.raises(ValueError):
+        transform(_example_vectors(2),'ECI','ECEF')
+
+def test_user_registered_frame():
+    graph = FrameGraph()
+    graph.register_transform('A','B',rotation=lambda context: ([0],[context['angle']]),
+                             requires=['angle'])
+    graph.register_transform('B','C',func=lambda vecs,context: 2*vecs)
+    vecs = _example_vectors(3)
+    nptest.assert_allclose(graph.transform(vecs,'A','C',angle=.3),
+                           2*rot1(.3,vecs))
+    with pytest.raises(ValueError):
+        graph.plan('C','A')
+
+def test_geodetic_to_geodetic_enu():
+    gdlat,glon,h_ellp = 40.015,-105.27,8.5e5
+    R_GEODETIC = np.array([[gdlat,glon,h_ellp]])
+    #Position vector's components in the local geodetic ENU
+    R_ENU = transform(R_GEODETIC,'GEODETIC','ENU_GEODETIC',
+                      gdlats=gdlat,lons=glon)
+    R_GEODETIC_out = transform(R_ENU,'ENU_GEODETIC','GEODETIC',
+                               gdlats=gdlat,lons=glon)
+    nptest.assert_allclose(R_GEODETIC_out,R_GEODETIC,atol=1e-6,rtol=0.)
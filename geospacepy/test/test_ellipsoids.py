@@ -0,0 +1,47 @@
+# (C) 2020 University of Colorado AES-CCAR-SEDA (Space Environment Data Analysis) Group
+# Written by Liam M. Kilcommons
+import pytest
+import numpy as np
+import numpy.testing as nptest
+from geospacepy.ellipsoids import Ellipsoid,WGS84,GRS80,SPHERE
+from geospacepy.terrestrial_ellipsoidal import (ecef_cart2geodetic,
+                                                geodetic2ecef)
+from geospacepy.terrestrial_spherical import ecef_cart2spherical
+
+def test_wgs84_derived_constants():
+    nptest.assert_allclose(WGS84.b,6356752.314245,rtol=0.,atol=1e-6)
+    nptest.assert_allclose(WGS84.e2,0.00669437999014,rtol=0.,atol=1e-14)
+    nptest.assert_allclose(WGS84.ep2,0.00673949674228,rtol=0.,atol=1e-14)
+
+def test_ellipsoid_can_not_be_modified():
+    with pytest.raises(AttributeError):
+        WGS84.a = 6371200.
+
+@pytest.mark.parametrize('method',['vallado','vermeille'])
+def test_geodetic_on_sphere_is_spherical(method):
+    R_ECEF = np.random.RandomState(42).normal(size=(20,3))
+    R_ECEF *= 7.e6/np.sqrt(np.sum(R_ECEF**2,axis=1)).reshape(-1,1)
+    gdlats,glons,h_ellps = ecef_cart2geodetic(R_ECEF,method=method,
+                                              ellipsoid=SPHERE)
+    lats,lons,rs = ecef_cart2spherical(R_ECEF)
+    nptest.assert_allclose(gdlats,lats,rtol=0.,atol=1e-9)
+    nptest.assert_allclose(h_ellps,rs-SPHERE.a,rtol=0.,atol=1e-6)
+
+@pytest.mark.parametrize('ellipsoid',[GRS80,Ellipsoid(6378000.,f=1/200.)])
+def test_geodetic_round_trip_with_other_ellipsoids(ellipsoid):
+    gdlats,glons,h_ellps = np.linspace(-89,89,10),np.linspace(-170,170,10),4.e5
+    R_ECEF = geodetic2ecef(gdlats,glons,h_ellps,ellipsoid=ellipsoid)
+    gdlats_out,glons_out,h_ellps_out = ecef_cart2geodetic(R_ECEF,tol=1e-13,
+                                                        ellipsoid=ellipsoid)
+    nptest.assert_allclose(gdlats_out,gdlats,rtol=0.,atol=1e-8)
+    nptest.assert_allclose(h_ellps_out,h_ellps,rtol=0.,atol=1e-3)
+
+def test_prime_vertical_radius():
+    #Equal to a at the equator and a^2/b at the poles
+    sin_gdlats = np.array([0.,1.,-1.])
+    nptest.assert_allclose(WGS84.prime_vertical_radius(sin_gdlats),
+                           [WGS84.a,WGS84.a**2/WGS84.b,WGS84.a**2/WGS84.b],
+                           rtol=1e-14)
+    out = np.empty(3)
+    assert WGS84.prime_vertical_radius(sin_gdlats,out=out) is out
+    nptest.assert_allclose(SPHERE.prime_vertical_radius(sin_gdlats),SPHERE.a)
@@ -0,0 +1,55 @@
+# (C) 2020 University of Colorado AES-CCAR-SEDA (Space Environment Data Analysis) Group
+# Written by Liam M. Kilcommons
+import pytest
+import numpy as np
+import numpy.testing as nptest
+from geospacepy.pipeline import Pipeline
+from geospacepy.terrestrial_spherical import eci2ecef
+from geospacepy.terrestrial_ellipsoidal import ecef_cart2geodetic,geodetic2ecef
+
+def _example_ephemeris(n):
+    rs = np.random.RandomState(42)
+    R_ECEF = geodetic2ecef(rs.uniform(-90.,90.,n),rs.uniform(-180.,180.,n),
+                           rs.uniform(4.e5,9.e5,n))
+    jds = 2455000.5+np.linspace(0.,30.,n)
+    return R_ECEF,jds
+
+@pytest.mark.parametrize('chunksize',[7,100,1000])
+def test_pipeline_matches_in_memory_functions(tmp_path,chunksize):
+    R_ECI,jds = _example_ephemeris(100)
+    np.save(str(tmp_path/'R_ECI.npy'),R_ECI)
+    np.save(str(tmp_path/'jds.npy'),jds)
+    pipeline = Pipeline({'R_ECI':str(tmp_path/'R_ECI.npy'),
+                         'jds':str(tmp_path/'jds.npy')},chunksize=chunksize)
+    pipeline.add_step(eci2ecef,['R_ECI','jds'],['R_ECEF'])
+    pipeline.add_step(ecef_cart2geodetic,['R_ECEF'],
+                      ['gdlats','glons','h_ellps'],method='vermeille')
+    progress = []
+    results = pipeline.run({'gdlats':str(tmp_path/'gdlats.npy'),
+                            'R_ECEF':np.empty((100,3))},
+                           progress=lambda *args: progress.append(args))
+    R_ECEF = eci2ecef(R_ECI,jds)
+    gdlats,glons,h_ellps = ecef_cart2geodetic(R_ECEF,method='vermeille')
+    nptest.assert_allclose(results['R_ECEF'],R_ECEF,rtol=0.,atol=1e-8)
+    nptest.assert_allclose(np.load(str(tmp_path/'gdlats.npy')),gdlats,
+                           rtol=0.,atol=1e-12)
+    assert len(progress) == -(-100//chunksize)
+    assert progress[-1][:2] == (100,100)
+
+def test_pipeline_reuses_scratch_buffers():
+    R_ECI,jds = _example_ephemeris(50)
+    pipeline = Pipeline({'R_ECI':R_ECI,'jds':jds},chunksize=10)
+    pipeline.add_step(eci2ecef,['R_ECI','jds'],['R_ECEF'])
+    pipeline._process_chunk(0,10)
+    scratch = pipeline.steps[0].scratch[0]
+    assert scratch.shape == (10,3)
+    values = pipeline._process_chunk(10,20)
+    assert np.shares_memory(values['R_ECEF'],scratch)
+
+def test_pipeline_checks_columns():
+    R_ECI,jds = _example_ephemeris(10)
+    with pytest.raises(ValueError):
+        Pipeline({'R_ECI':R_ECI,'jds':jds[:5]})
+    pipeline = Pipeline({'R_ECI':R_ECI,'jds':jds})
+    with pytest.raises(ValueError):
+        pipeline.add_step(eci2ecef,['R_ECI','times'],['R_ECEF'])
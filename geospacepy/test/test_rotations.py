@@ -3,7 +3,8 @@
 import pytest
 import numpy as np
 import numpy.testing as nptest
-from geospacepy.rotations import rot
+from geospacepy.rotations import (rotmat,rot,rot1,rot2,rot3,
+                                  RotationSequence,Quaternion)
 #from scipy.spatial.transform import Rotation
 
 @pytest.mark.parametrize('n_vecs,n_angles',[(1,1),(3,1),(3,3)])
@@ -16,3 +17,95 @@ def test_90_degree_rotation_of_xhat_about_z_produces_yhat(n_vecs,n_angles):
     rotated_vecs = rot(angles,axis,vecs)
     nptest.assert_allclose(rotated_vecs,expected_rotated_vecs,atol=1e-8,rtol=0)
 
+
+def _rot_with_rotmat(angles,axis,vecs):
+    return np.array([np.dot(rotmat(angle,axis),vec) 
+                     for angle,vec in zip(angles,vecs)])
+
+@pytest.mark.parametrize('axis',[0,1,2])
+def test_rot_matches_rotmat(axis):
+    rs = np.random.RandomState(42)
+    vecs = rs.normal(size=(50,3))
+    angles = rs.uniform(-2*np.pi,2*np.pi,50)
+    nptest.assert_allclose(rot(angles,axis,vecs),
+                           _rot_with_rotmat(angles,axis,vecs),
+                           atol=1e-12,rtol=0)
+
+@pytest.mark.parametrize('rot_func,axis',[(rot1,0),(rot2,1),(rot3,2)])
+def test_rot_out_and_in_place(rot_func,axis):
+    rs = np.random.RandomState(42)
+    vecs = rs.normal(size=(10,3))
+    expected = _rot_with_rotmat(np.full(10,.3),axis,vecs)
+    out = np.empty_like(vecs)
+    assert rot_func(.3,vecs,out=out) is out
+    nptest.assert_allclose(out,expected,atol=1e-12,rtol=0)
+    rot_func(.3,vecs,out=vecs)
+    nptest.assert_allclose(vecs,expected,atol=1e-12,rtol=0)
+
+@pytest.mark.parametrize('n_angles',[1,20])
+def test_rotation_sequence_matches_successive_rotations(n_angles):
+    rs = np.random.RandomState(42)
+    vecs = rs.normal(size=(20,3))
+    angles = [rs.uniform(-np.pi,np.pi,n_angles) for i in range(3)]
+    sequence = RotationSequence([2,0,2],angles)
+    expected = rot3(angles[2],rot1(angles[1],rot3(angles[0],vecs)))
+    nptest.assert_allclose(sequence.apply(vecs),expected,atol=1e-12,rtol=0)
+    nptest.assert_allclose(sequence.inverse().apply(expected),vecs,
+                           atol=1e-12,rtol=0)
+
+def test_rotation_sequence_only_recomputes_for_new_angles():
+    angles_z,angles_x = np.linspace(0,1,10),np.linspace(1,2,10)
+    sequence = RotationSequence([2,0],[angles_z,angles_x])
+    entries = sequence._composed_entries()
+    sequence.set_angles(angles_z.copy(),angles_x.copy())
+    assert sequence._composed_entries() is entries
+    sequence.set_angles(angles_z,angles_x+.1)
+    assert sequence._composed_entries() is not entries
+    vecs = np.eye(3)[[0,1,2,0,1,2,0,1,2,0]]
+    nptest.assert_allclose(sequence.apply(vecs),
+                           rot1(angles_x+.1,rot3(angles_z,vecs)),
+                           atol=1e-12,rtol=0)
+
+@pytest.mark.parametrize('axis',[0,1,2])
+def test_quaternion_from_axis_angle_matches_rot_and_rotmat(axis):
+    rs = np.random.RandomState(42)
+    vecs = rs.normal(size=(20,3))
+    angles = rs.uniform(-np.pi,np.pi,20)
+    quaternion = Quaternion.from_axis_angle(angles,axis)
+    nptest.assert_allclose(quaternion.apply(vecs),rot(angles,axis,vecs),
+                           atol=1e-12,rtol=0)
+    nptest.assert_allclose(quaternion.as_matrix()[5],rotmat(angles[5],axis),
+                           atol=1e-12,rtol=0)
+
+def test_quaternion_compose_and_inverse():
+    rs = np.random.RandomState(42)
+    vecs = rs.normal(size=(20,3))
+    axes = [2,0,1,2]
+    angles = [rs.uniform(-np.pi,np.pi,20) for axis in axes]
+    quaternion = Quaternion.from_sequence(axes,angles)
+    expected = RotationSequence(axes,angles).apply(vecs)
+    nptest.assert_allclose(quaternion.apply(vecs),expected,atol=1e-12,rtol=0)
+    nptest.assert_allclose(quaternion.inv().apply(expected),vecs,
+                           atol=1e-12,rtol=0)
+
+def test_quaternion_slerp():
+    q0 = Quaternion.identity()
+    q1 = Quaternion.from_axis_angle(np.radians(90.),2)
+    fractions = np.array([0.,.25,.5,1.])
+    interpolated = q0.slerp(q1,fractions)
+    expected = Quaternion.from_axis_angle(np.radians(90.)*fractions,2)
+    nptest.assert_allclose(interpolated.q,expected.q,atol=1e-12,rtol=0)
+
+@pytest.mark.parametrize('rotate',[lambda vecs,out: rot3(.3,vecs,out=out),
+                                   lambda vecs,out: RotationSequence([2,0],[.3,.2]).apply(vecs,out=out),
+                                   lambda vecs,out: Quaternion.from_axis_angle(.3,2).apply(vecs,out=out)])
+def test_rotations_preserve_float32(rotate):
+    vecs = np.random.RandomState(42).normal(size=(10,3))
+    expected = rotate(vecs,None)
+    rotated = rotate(vecs.astype(np.float32),None)
+    assert rotated.dtype == np.float32
+    nptest.assert_allclose(rotated,expected,atol=1e-5,rtol=0)
+    out = np.empty((10,3),dtype=np.float32)
+    assert rotate(vecs,out) is out
+    with pytest.raises(ValueError):
+        rotate(vecs,np.empty((9,3)))
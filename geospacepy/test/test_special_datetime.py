@@ -5,6 +5,7 @@ import pytest
 import numpy as np
 from numpy import testing as nptest
 import datetime,os,pkgutil
+from geospacepy.array_management import ArrayCache
 
 #Example 3-4: Converting from Gregorian date (YMD HMS) to Julian date
 #Vallado, Fundamentals of Astrodynamics and Applications 3rd Ed., pp. 190
@@ -154,3 +155,282 @@ def test_datetime_to_datenum():
     delta_t = (dn-expected_dn)/86400. #days to seconds
     #Accurate to a microsecond
     assert abs(delta_t) < .000001
+
+def _random_datetimes(n,seed=42):
+    """Datetimes with microsecond resolution spread over several years"""
+    rng = np.random.default_rng(seed)
+    t0 = datetime.datetime(1995,1,1)
+    offsets_us = rng.integers(0,int(20*365.25*86400e6),size=n)
+    return [t0+datetime.timedelta(microseconds=int(us)) for us in offsets_us]
+
+#Day-valued time types are compared to tenth of a milisecond, because
+#that is the precision of a float64 value of order 1e6 days
+@pytest.mark.parametrize('time_type,tol',[('jd',1e-4/86400.),
+                                          ('j2000',1e-4/86400.),
+                                          ('doy',1e-4/86400.),
+                                          ('datenum',1e-4/86400.),
+                                          ('sod',1e-6),
+                                          ('soy',1e-6)])
+def test_datetime64_conversion_matches_scalar_conversion(time_type,tol):
+    """Test that the array arithmetic datetime64 conversions agree with
+    the scalar (Python datetime) conversions"""
+    dts = _random_datetimes(100)
+    scalar_func = getattr(special_datetime,'datetime2'+time_type)
+    dt64_func = getattr(special_datetime,'datetime64arr2'+time_type)
+    expected = np.array([scalar_func(dt) for dt in dts])
+    dt64s = np.array(dts,dtype='datetime64[us]')
+    converted = dt64_func(dt64s)
+    nptest.assert_allclose(converted,expected,rtol=0.,atol=tol)
+
+@pytest.mark.parametrize('shape',[(3,),(3,1),(1,3)])
+def test_vectorized_conversion_accepts_datetime64(shape):
+    dt64s = np.full(shape,np.datetime64(vallado_3_4_dt,'ns'))
+    jds = special_datetime.datetimearr2jd(dt64s)
+    assert jds.shape == shape
+    nptest.assert_allclose(jds,vallado_3_4_jd,rtol=0.,atol=.001/86400.)
+
+def test_datetime64_conversion_nat_is_nan():
+    dt64s = np.array([vallado_3_4_dt,None],dtype='datetime64[us]')
+    jds = special_datetime.datetime64arr2jd(dt64s)
+    assert np.isfinite(jds[0])
+    assert np.isnan(jds[1])
+
+@pytest.mark.parametrize('shape',[None,(2,1)])
+def test_vectorized_conversion_ignores_timezone_like_scalar(shape,recwarn):
+    tz = datetime.timezone(datetime.timedelta(hours=5))
+    aware_dt = vallado_3_4_dt.replace(tzinfo=tz)
+    aware_dts = [aware_dt,vallado_3_4_dt]
+    if shape is not None:
+        aware_dts = np.array(aware_dts,dtype=object).reshape(shape)
+    jds = special_datetime.datetimearr2jd(aware_dts)
+    nptest.assert_allclose(jds,special_datetime.datetime2jd(aware_dt),
+                           rtol=0.,atol=.001/86400.)
+    nptest.assert_allclose(jds,vallado_3_4_jd,rtol=0.,atol=.001/86400.)
+    assert len(recwarn) == 0
+
+def test_vectorized_conversion_rejects_scalar_datetime():
+    with pytest.raises(ValueError):
+        special_datetime.datetimearr2jd(vallado_3_4_dt)
+
+@pytest.mark.parametrize('unit',['us','ns'])
+def test_julian_date_to_datetime64_matches_vallado(unit):
+    jds = np.full((3,1),vallado_3_13_jd)
+    dt64s = special_datetime.jdarr2datetime64(jds,unit=unit)
+    assert dt64s.shape == (3,1)
+    assert dt64s.dtype == np.dtype('datetime64[{}]'.format(unit))
+    expected = np.datetime64(vallado_3_13_dt,unit)
+    delta_ts = (dt64s-expected)/np.timedelta64(1,'s')
+    nptest.assert_allclose(delta_ts,np.zeros_like(delta_ts),rtol=0.,atol=1e-4)
+
+@pytest.mark.parametrize('time_type',['jd','j2000','datenum'])
+def test_datetime64_round_trip(time_type):
+    dt64s = np.array(_random_datetimes(100),dtype='datetime64[us]')
+    to_func = getattr(special_datetime,'datetime64arr2'+time_type)
+    from_func = getattr(special_datetime,time_type+'arr2datetime64')
+    dt64s_out = from_func(to_func(dt64s))
+    delta_ts = (dt64s_out-dt64s)/np.timedelta64(1,'s')
+    #Precision of float64 days near 1e6 is about 40 microseconds
+    nptest.assert_allclose(delta_ts,np.zeros_like(delta_ts),rtol=0.,atol=1e-4)
+
+def test_second_of_day_to_datetime64_with_array_dates():
+    sods = np.array([48165.098,0.])
+    years,months,days = np.array([2000,2001]),np.array([1,3]),np.array([1,18])
+    dt64s = special_datetime.sodarr2datetime64(sods,years,months,days)
+    expected = np.array([datetime.datetime(2000,1,1,13,22,45,98000),
+                         datetime.datetime(2001,3,18)],
+                        dtype='datetime64[us]')
+    nptest.assert_array_equal(dt64s,expected)
+
+def test_datetime64_inverse_conversion_as_object():
+    dts = special_datetime.doyarr2datetime64(np.array([vallado_3_12_doy]),
+                                             vallado_3_12_year,
+                                             as_object=True)
+    assert dts.dtype == object
+    assert isinstance(dts[0],datetime.datetime)
+    assert abs((dts[0]-vallado_3_12_dt).total_seconds()) < .01
+
+def test_datetime64_inverse_conversion_nan_is_nat():
+    dt64s = special_datetime.jdarr2datetime64(np.array([vallado_3_4_jd,np.nan]))
+    assert not np.isnat(dt64s[0])
+    assert np.isnat(dt64s[1])
+
+def _brute_force_nearest(primary_us,us,tol_us):
+    """Reference implementation of nearest-within-tolerance matching"""
+    inds = np.full(us.shape,-1)
+    for i,t in enumerate(us):
+        deltas = np.abs(primary_us-t)
+        #argmin returns first occurance, so ties go to earlier index
+        j = np.argmin(deltas)
+        if deltas[j] < tol_us:
+            inds[i] = j
+    return inds
+
+def _example_match_times(n_primary,n,seed=0):
+    rng = np.random.default_rng(seed)
+    t0 = np.datetime64('2010-05-29T00:00:00','us')
+    primary_us = np.sort(rng.integers(0,int(600e6),size=n_primary))
+    us = np.sort(rng.integers(0,int(600e6),size=n))
+    return t0+primary_us.astype('timedelta64[us]'),t0+us.astype('timedelta64[us]')
+
+def test_match_times_allowing_duplicates_matches_brute_force():
+    primary_dt64s,dt64s = _example_match_times(500,800)
+    tol_us = 5e5
+    inds,matched = special_datetime.matchTimes(primary_dt64s,dt64s,tol_us=tol_us,
+                                                allow_duplicates=True)
+    ep = lambda dt64s : dt64s.view('int64')
+    expected_inds = _brute_force_nearest(ep(primary_dt64s),ep(dt64s),tol_us)
+    nptest.assert_array_equal(inds,expected_inds)
+    nptest.assert_array_equal(matched,expected_inds>=0)
+
+def test_match_times_unique_matches_are_unique_and_closest():
+    primary_dt64s,dt64s = _example_match_times(500,800)
+    inds,matched = special_datetime.matchTimes(primary_dt64s,dt64s,tol_us=5e5)
+    dup_inds,dup_matched = special_datetime.matchTimes(primary_dt64s,dt64s,
+                                                       tol_us=5e5,
+                                                       allow_duplicates=True)
+    assert np.unique(inds[matched]).size == np.count_nonzero(matched)
+    #Every primary index which was matched with duplicates allowed
+    #is still matched, to the closest candidate
+    nptest.assert_array_equal(np.unique(inds[matched]),
+                              np.unique(dup_inds[dup_matched]))
+    deltas = np.abs(primary_dt64s[dup_inds]-dt64s)
+    for ind in np.unique(inds[matched]):
+        candidates = np.flatnonzero(dup_inds==ind)
+        assert deltas[inds==ind][0] == deltas[candidates].min()
+
+def test_match_times_with_unsorted_primary_and_datetimes():
+    primary_dts = [datetime.datetime(2010,5,29,0,0,s) for s in (20,0,10)]
+    dts = [datetime.datetime(2010,5,29,0,0,s,100000) for s in (0,10,30)]
+    inds,matched = special_datetime.matchTimes(primary_dts,dts,tol_us=2e5)
+    nptest.assert_array_equal(inds,[1,2,-1])
+    nptest.assert_array_equal(matched,[True,True,False])
+
+def test_match_times_tie_goes_to_earlier_timestamp():
+    primary_dts = [datetime.datetime(2010,5,29,0,0,s) for s in (0,2)]
+    dts = [datetime.datetime(2010,5,29,0,0,1)]
+    inds,matched = special_datetime.matchTimes(primary_dts,dts,tol_us=2e6)
+    assert inds[0] == 0
+
+def _chunked(arr,chunksizes):
+    """Generator of chunks of varying size"""
+    i_start,i_chunk = 0,0
+    while i_start < arr.size:
+        chunksize = chunksizes[i_chunk % len(chunksizes)]
+        yield arr[i_start:i_start+chunksize]
+        i_start += chunksize
+        i_chunk += 1
+
+@pytest.mark.parametrize('allow_duplicates',[True,False])
+@pytest.mark.parametrize('primary_chunksizes,chunksizes',[([7],[13]),
+                                                          ([50,3],[1,200]),
+                                                          ([1000],[1000])])
+def test_streaming_time_matcher_matches_match_times(allow_duplicates,
+                                                    primary_chunksizes,
+                                                    chunksizes):
+    primary_dt64s,dt64s = _example_match_times(500,800,seed=1)
+    tol_us = 8e5
+    expected_inds,expected_matched = special_datetime.matchTimes(primary_dt64s,
+                                                dt64s,tol_us=tol_us,
+                                                allow_duplicates=allow_duplicates)
+    matcher = special_datetime.StreamingTimeMatcher(
+                                        _chunked(primary_dt64s,primary_chunksizes),
+                                        _chunked(dt64s,chunksizes),
+                                        tol_us=tol_us,
+                                        allow_duplicates=allow_duplicates)
+    inds = np.full(dt64s.shape,-1)
+    for primary_inds_chunk,inds_chunk in matcher:
+        assert np.all(inds[inds_chunk]==-1) #Each match yielded only once
+        inds[inds_chunk] = primary_inds_chunk
+    nptest.assert_array_equal(inds,expected_inds)
+
+def test_streaming_time_matcher_reads_arrays_in_chunks():
+    primary_dt64s,dt64s = _example_match_times(300,300,seed=2)
+    expected_inds,expected_matched = special_datetime.matchTimes(primary_dt64s,
+                                                                 dt64s)
+    matcher = special_datetime.StreamingTimeMatcher(primary_dt64s,dt64s,
+                                                    chunksize=16)
+    pairs = [pair for pair in matcher]
+    primary_inds = np.concatenate([primary_inds for primary_inds,inds in pairs])
+    inds = np.concatenate([inds for primary_inds,inds in pairs])
+    nptest.assert_array_equal(inds,np.flatnonzero(expected_matched))
+    nptest.assert_array_equal(primary_inds,expected_inds[expected_matched])
+
+@pytest.mark.parametrize('allow_duplicates',[True,False])
+def test_align_times_matches_match_times_for_each_stream(allow_duplicates):
+    primary_dt64s,stream1 = _example_match_times(400,300,seed=3)
+    unused,stream2 = _example_match_times(400,600,seed=4)
+    tols_us = [3e5,9e5]
+    inds,matched = special_datetime.alignTimes(primary_dt64s,[stream1,stream2],
+                                                tol_us=tols_us,
+                                                allow_duplicates=allow_duplicates)
+    assert inds.shape == (400,2)
+    for i_stream,(stream,tol_us) in enumerate(zip([stream1,stream2],tols_us)):
+        expected_inds,expected_matched = special_datetime.matchTimes(stream,
+                                                primary_dt64s,
+                                                tol_us=tol_us,
+                                                allow_duplicates=allow_duplicates)
+        nptest.assert_array_equal(inds[:,i_stream],expected_inds)
+        nptest.assert_array_equal(matched[:,i_stream],expected_matched)
+
+@pytest.mark.parametrize('use_cache',[True,False])
+def test_align_times_caches_primary_timeline(monkeypatch,use_cache):
+    primary_dt64s,stream = _example_match_times(50,50,seed=5)
+    converted = []
+    convert = special_datetime._datetimes2epoch_us
+    def counting_convert(dts):
+        converted.append(dts)
+        return convert(dts)
+    monkeypatch.setattr(special_datetime,'_datetimes2epoch_us',counting_convert)
+    cache = ArrayCache(maxsize=1) if use_cache else None
+    expected = special_datetime.alignTimes(primary_dt64s,[stream],cache=cache)
+    assert len(converted) == 2
+    result = special_datetime.alignTimes(primary_dt64s,[stream,stream],
+                                         cache=cache)
+    #With a cache only the two streams are converted again
+    assert len(converted) == (4 if use_cache else 5)
+    assert all([dts is stream for dts in converted[-2:]])
+    nptest.assert_array_equal(result[0][:,0],expected[0][:,0])
+    if use_cache:
+        cache.clear()
+        special_datetime.alignTimes(primary_dt64s,[stream],cache=cache)
+        assert len(converted) == 6
+
+@pytest.mark.parametrize('time_type',['jd','j2000','doy','sod','soy','datenum'])
+def test_timeline_time_types_match_datetime64_conversions(time_type):
+    dt64s = np.array(_random_datetimes(100),dtype='datetime64[us]').reshape(20,5)
+    timeline = special_datetime.Timeline.from_datetimes(dt64s)
+    expected = getattr(special_datetime,'datetime64arr2'+time_type)(dt64s)
+    converted = getattr(timeline,time_type)
+    assert converted.shape == (20,5)
+    nptest.assert_allclose(converted,expected,rtol=0.,atol=1e-9)
+    #Converted values are cached
+    assert getattr(timeline,time_type) is converted
+
+def test_timeline_keeps_nanosecond_precision():
+    dt64s = np.array(['2010-05-29T09:13:30.123456789'],dtype='datetime64[ns]')
+    timeline = special_datetime.Timeline.from_datetimes(dt64s)
+    nptest.assert_array_equal(timeline.datetime64,dt64s)
+
+def test_timeline_from_jd_matches_vallado():
+    timeline = special_datetime.Timeline.from_jd(np.array([vallado_3_13_jd]))
+    delta_t = (timeline.datetime64[0]-np.datetime64(vallado_3_13_dt))
+    assert abs(delta_t/np.timedelta64(1,'s')) < 1.0e-4
+    nptest.assert_allclose(np.asarray(timeline),[vallado_3_13_jd],rtol=0.,atol=1e-9)
+
+def test_two_part_julian_date_matches_julian_date():
+    dt64s = np.array(_random_datetimes(100),dtype='datetime64[us]')
+    jd_days,jd_fracs = special_datetime.datetime64arr2jdparts(dt64s)
+    assert jd_days.dtype == np.int64
+    assert np.all(jd_fracs>=0.) and np.all(jd_fracs<1.)
+    nptest.assert_allclose(jd_days+jd_fracs,special_datetime.datetime64arr2jd(dt64s),
+                           rtol=0.,atol=1e-4/86400.)
+    timeline = special_datetime.Timeline.from_datetimes(dt64s)
+    tl_jd_days,tl_jd_fracs = timeline.jdparts
+    nptest.assert_array_equal(tl_jd_days,jd_days)
+    nptest.assert_allclose(tl_jd_fracs,jd_fracs,rtol=0.,atol=1e-12)
+
+def test_julian_date_parts_normalizes_half_days():
+    jd_days,jd_fracs = special_datetime.julian_date_parts((np.array([2451544.5]),
+                                                           np.array([.75])))
+    nptest.assert_array_equal(jd_days,[2451545.])
+    nptest.assert_allclose(jd_fracs,[.25])
@@ -5,8 +5,11 @@ import numpy as np
 import numpy.testing as nptest
 
 from geospacepy.spherical_geometry import (angle_difference,
+                                            angle_midpoint,
                                             grid_surface_integral,
-                                            great_circle_distance)
+                                            great_circle_distance,
+                                            great_circle_distance_matrix,
+                                            SphericalIndex)
 
 def test_angle_difference_across_zero():
     ang2 = 10.
@@ -16,6 +19,26 @@ def test_angle_difference_across_zero():
     difference = angle_difference(ang1,ang2,'deg')
     assert(np.abs(expected_difference-difference)<.001)
 
+@pytest.mark.parametrize('aziunit,ang1,ang2,expected',[('deg',350.,20.,365.),
+                                                       ('deg',10.,50.,30.),
+                                                       ('hour',23.,3.,25.),
+                                                       ('rad',0.,np.pi/2,np.pi/4)])
+def test_angle_midpoint(aziunit,ang1,ang2,expected):
+    nptest.assert_allclose(angle_midpoint(ang1,ang2,aziunit),expected)
+
+def test_angle_midpoint_preserves_float32_and_fills_out():
+    rs = np.random.RandomState(42)
+    ang1 = rs.uniform(0.,360.,20)
+    ang2 = rs.uniform(0.,360.,20)
+    expected = angle_midpoint(ang1,ang2,'deg')
+    midpoints = angle_midpoint(ang1.astype(np.float32),ang2.astype(np.float32),
+                               'deg')
+    assert midpoints.dtype == np.float32
+    nptest.assert_allclose(midpoints,expected,rtol=0.,atol=1e-3)
+    out = np.empty(20)
+    assert angle_midpoint(ang1,ang2,'deg',out=out) is out
+    nptest.assert_array_equal(out,expected)
+
 @pytest.mark.parametrize('lat1,lat2,lon,algorithm',[(-85.,85.,10,'lawofcosines'),
                                                     (-85.,85.,10,'haversine'),
                                                     (50.,60.,10,'lawofcosines'),
@@ -80,3 +103,173 @@ def test_grid_surface_integral_of_half_unit_sphere_is_2pi():
 
 
 
+@pytest.mark.parametrize('algorithm',['lawofcosines','haversine'])
+def test_great_circle_distance_preserves_float32_and_fills_out(algorithm):
+    rs = np.random.RandomState(42)
+    lat1,lat2 = rs.uniform(-90.,90.,(2,20))
+    lon1,lon2 = rs.uniform(-180.,180.,(2,20))
+    expected = great_circle_distance(lat1,lon1,lat2,lon2,'deg',algorithm=algorithm)
+    dist = great_circle_distance(lat1.astype(np.float32),lon1.astype(np.float32),
+                                 lat2.astype(np.float32),lon2.astype(np.float32),
+                                 'deg',algorithm=algorithm)
+    assert dist.dtype == np.float32
+    nptest.assert_allclose(dist,expected,rtol=0.,atol=1e-5)
+    out = np.empty(20)
+    assert great_circle_distance(lat1,lon1,lat2,lon2,'deg',
+                                 algorithm=algorithm,out=out) is out
+    nptest.assert_array_equal(out,expected)
+    with pytest.raises(ValueError):
+        great_circle_distance(lat1,lon1,lat2,lon2,'deg',out=np.empty(19))
+
+def _track_and_stations():
+    rs = np.random.RandomState(42)
+    track_lats,track_lons = rs.uniform(-90.,90.,50),rs.uniform(-180.,180.,50)
+    station_lats,station_lons = rs.uniform(-90.,90.,30),rs.uniform(-180.,180.,30)
+    #Nearly coincident and nearly antipodal locations
+    station_lats[:2] = track_lats[0]+1e-7,-track_lats[1]
+    station_lons[:2] = track_lons[0],track_lons[1]+180.-1e-7
+    return track_lats,track_lons,station_lats,station_lons
+
+@pytest.mark.parametrize('block_size',[1,100,2**20])
+def test_great_circle_distance_matrix_matches_haversine(block_size):
+    track_lats,track_lons,station_lats,station_lons = _track_and_stations()
+    expected = great_circle_distance(track_lats.reshape(-1,1),
+                                     track_lons.reshape(-1,1),
+                                     station_lats.reshape(1,-1),
+                                     station_lons.reshape(1,-1),
+                                     'deg',algorithm='haversine')
+    dist = great_circle_distance_matrix(track_lats,track_lons,
+                                        station_lats,station_lons,'deg',
+                                        block_size=block_size)
+    assert dist.shape == (50,30)
+    #The haversine formula is inaccurate for nearly antipodal locations
+    antipodal_separation = np.radians(1e-7)*np.cos(np.radians(track_lats[1]))
+    nptest.assert_allclose(np.pi-dist[1,1],antipodal_separation,rtol=1e-6)
+    expected[1,1] = dist[1,1]
+    nptest.assert_allclose(dist,expected,rtol=0.,atol=1e-12)
+    nptest.assert_allclose(dist[0,0],np.radians(1e-7),rtol=1e-6)
+
+def test_great_circle_distance_matrix_float32():
+    track_lats,track_lons,station_lats,station_lons = _track_and_stations()
+    expected = great_circle_distance_matrix(track_lats,track_lons,
+                                            station_lats,station_lons,'deg')
+    dist = great_circle_distance_matrix(track_lats,track_lons,
+                                        station_lats,station_lons,'deg',
+                                        dtype=np.float32)
+    assert dist.dtype == np.float32
+    nptest.assert_allclose(dist,expected,rtol=0.,atol=1e-6)
+
+@pytest.mark.parametrize('max_distance',[None,np.pi])
+def test_great_circle_distance_matrix_float32_error_bound(max_distance):
+    #Many pairs of locations are a few degrees apart, where the
+    #rounding error of float32 dot products is amplified most by arccos
+    rs = np.random.RandomState(0)
+    lats1,lons1 = rs.uniform(-85.,85.,300),rs.uniform(-180.,180.,300)
+    lats2 = np.concatenate((lats1[:100]+rs.uniform(-3.,3.,100),
+                            rs.uniform(-85.,85.,200)))
+    lons2 = np.concatenate((lons1[:100]+rs.uniform(-3.,3.,100),
+                            rs.uniform(-180.,180.,200)))
+    expected = great_circle_distance_matrix(lats1,lons1,lats2,lons2,'deg')
+    result = great_circle_distance_matrix(lats1,lons1,lats2,lons2,'deg',
+                                          max_distance=max_distance,
+                                          dtype=np.float32)
+    if max_distance is None:
+        dist = result
+    else:
+        i,j,dist = result
+        expected = expected[i,j]
+    nptest.assert_allclose(dist,expected.reshape(dist.shape),rtol=0.,atol=1e-6)
+
+@pytest.mark.parametrize('max_distance',[0.,.3,1.,np.pi])
+def test_great_circle_distance_matrix_sparse(max_distance):
+    track_lats,track_lons,station_lats,station_lons = _track_and_stations()
+    dense = great_circle_distance_matrix(track_lats,track_lons,
+                                         station_lats,station_lons,'deg')
+    i,j,dist = great_circle_distance_matrix(track_lats,track_lons,
+                                            station_lats,station_lons,'deg',
+                                            max_distance=max_distance,
+                                            block_size=100)
+    expected_i,expected_j = np.nonzero(dense <= max_distance)
+    nptest.assert_array_equal(i,expected_i)
+    nptest.assert_array_equal(j,expected_j)
+    nptest.assert_array_equal(dist,dense[expected_i,expected_j])
+
+def _catalogue_and_queries(n=2000,m=50):
+    rs = np.random.RandomState(42)
+    lats = np.degrees(np.arcsin(rs.uniform(-1.,1.,n)))
+    lons = rs.uniform(-180.,180.,n)
+    return lats,lons,rs.uniform(-90.,90.,m),rs.uniform(-180.,180.,m)
+
+@pytest.mark.parametrize('k',[1,5])
+def test_spherical_index_query_matches_distance_matrix(k):
+    lats,lons,query_lats,query_lons = _catalogue_and_queries()
+    index = SphericalIndex(lats,lons,leafsize=8)
+    dists,inds = index.query(query_lats,query_lons,k=k)
+    matrix = great_circle_distance_matrix(query_lats,query_lons,lats,lons,'deg')
+    expected_inds = np.argsort(matrix,axis=1,kind='stable')[:,:k]
+    nptest.assert_array_equal(inds,expected_inds)
+    nptest.assert_allclose(dists,np.take_along_axis(matrix,expected_inds,axis=1),
+                           rtol=0.,atol=1e-12)
+
+def test_spherical_index_query_within_distance_matches_distance_matrix():
+    lats,lons,query_lats,query_lons = _catalogue_and_queries()
+    index = SphericalIndex(lats,lons,leafsize=8)
+    r_earth = 6371.2
+    i,j,dists = index.query_within_distance(query_lats,query_lons,500.,r=r_earth)
+    expected_i,expected_j,expected_dists = great_circle_distance_matrix(
+                                                query_lats,query_lons,lats,lons,
+                                                'deg',max_distance=500./r_earth)
+    nptest.assert_array_equal(i,expected_i)
+    nptest.assert_array_equal(j,expected_j)
+    nptest.assert_allclose(dists,expected_dists*r_earth,rtol=0.,atol=1e-8)
+    i_deg,j_deg,dists_deg = index.query_within_distance(query_lats,query_lons,
+                                                        np.degrees(500./r_earth),
+                                                        distunit='deg')
+    nptest.assert_array_equal(j_deg,j)
+
+@pytest.mark.parametrize('leafsize',[1,3,32])
+def test_spherical_index_tree_nodes(leafsize):
+    lats,lons,_,_ = _catalogue_and_queries(n=1000)
+    #Repeated locations give ties at the medians
+    lats,lons = np.concatenate((lats,lats[:100])),np.concatenate((lons,lons[:100]))
+    index = SphericalIndex(lats,lons,leafsize=leafsize)
+    nptest.assert_array_equal(np.sort(index._order),np.arange(lats.size))
+    vectors = index._unit_vectors[index._order]
+    for node in range(index._starts.size):
+        start,stop = index._starts[node],index._stops[node]
+        nptest.assert_array_equal(index._los[node],vectors[start:stop].min(axis=0))
+        nptest.assert_array_equal(index._his[node],vectors[start:stop].max(axis=0))
+        left,right = index._lefts[node],index._rights[node]
+        if left < 0:
+            assert stop-start <= leafsize
+            continue
+        middle = (start+stop)//2
+        axis = index._split_axes[node]
+        assert (index._starts[left],index._stops[left]) == (start,middle)
+        assert (index._starts[right],index._stops[right]) == (middle,stop)
+        assert np.all(vectors[start:middle,axis] <= index._split_values[node])
+        assert np.all(vectors[middle:stop,axis] >= index._split_values[node])
+        assert axis == np.argmax(index._his[node]-index._los[node])
+
+def test_spherical_index_incremental_and_saved(tmp_path):
+    lats,lons,query_lats,query_lons = _catalogue_and_queries()
+    expected = SphericalIndex(lats,lons).query(query_lats,query_lons,k=3)
+    index = SphericalIndex()
+    for start in range(0,lats.size,300):
+        index.add(lats[start:start+300],lons[start:start+300])
+    #Some locations are not in the tree yet
+    assert index._n_indexed < len(index) == lats.size
+    for result,expected_result in zip(index.query(query_lats,query_lons,k=3),expected):
+        nptest.assert_array_equal(result,expected_result)
+    filename = str(tmp_path/'index.npz')
+    index.save(filename)
+    loaded = SphericalIndex.load(filename)
+    for result,expected_result in zip(loaded.query(query_lats,query_lons,k=3),expected):
+        nptest.assert_array_equal(result,expected_result)
+
+def test_spherical_index_fewer_locations_than_k():
+    index = SphericalIndex(np.array([10.,20.]),np.array([12.,2.]),aziunit='hour')
+    dists,inds = index.query(15.,12.,k=3,distunit='deg')
+    nptest.assert_array_equal(inds,[[0,1,-1]])
+    nptest.assert_allclose(dists[0,0],5.,rtol=1e-12)
+    assert np.isinf(dists[0,2])
@@ -7,7 +7,7 @@ import numpy.testing as nptest
 from geospacepy.special_datetime import jd2datetime,datetime2jd
 from geospacepy.sun import greenwich_mean_siderial_time
 from geospacepy.sun import solar_position_almanac,_solar_position_russell
-from geospacepy.sun import local_mean_solar_time
+from geospacepy.sun import local_mean_solar_time,solar_zenith_angle
 
 #Vallado, pp 194, example of calculating Greenwich Mean
 #Siderial Time
@@ -155,4 +155,63 @@ def test_russell_solar_position_within_6_thousandths_of_a_degree(alman_dict):
 
     assert(np.abs(ra_rad-expected_ra_rad)<tol_rad)
     assert(np.abs(dec_rad-expected_dec_rad)<tol_rad)
-    
\ No newline at end of file
+    
+def test_sun_functions_accept_timeline():
+    from geospacepy.special_datetime import Timeline
+    from geospacepy.sun import solar_zenith_angle
+    dts = [vallado_3_5_dt+datetime.timedelta(hours=h) for h in range(24)]
+    timeline = Timeline.from_datetimes(dts)
+    jds = np.array([datetime2jd(dt) for dt in dts])
+    glats = np.linspace(-80.,80.,24)
+    glons = np.linspace(-180.,180.,24)
+    nptest.assert_allclose(solar_zenith_angle(timeline,glats,glons),
+                           solar_zenith_angle(jds,glats,glons),
+                           rtol=0.,atol=1e-8)
+    #Single timestamp broadcast to many locations
+    nptest.assert_allclose(solar_zenith_angle(timeline[:1],glats,glons),
+                           solar_zenith_angle(jds[0],glats,glons),
+                           rtol=0.,atol=1e-8)
+
+@pytest.mark.parametrize('frac_dtype,tol_deg',[(np.float64,1e-7),
+                                               (np.float32,1e-4)])
+def test_gmst_with_two_part_julian_date_matches_vallado(frac_dtype,tol_deg):
+    from geospacepy.special_datetime import datetime64arr2jdparts
+    dt64s = np.full((3,),np.datetime64(vallado_3_5_dt,'us'))
+    jd_days,jd_fracs = datetime64arr2jdparts(dt64s,frac_dtype=frac_dtype)
+    gmsts_deg = np.degrees(greenwich_mean_siderial_time((jd_days,jd_fracs)))
+    nptest.assert_allclose(gmsts_deg,vallado_3_5_gmst,atol=tol_deg,rtol=0.)
+
+def test_solar_zenith_angle_accepts_two_part_julian_date():
+    from geospacepy.sun import solar_zenith_angle
+    jd = datetime2jd(vallado_3_5_dt)
+    jd_day = np.floor(jd)
+    glats = np.linspace(-80.,80.,5)
+    nptest.assert_allclose(solar_zenith_angle((jd_day,jd-jd_day),glats,10.),
+                           solar_zenith_angle(jd,glats,10.),
+                           rtol=0.,atol=1e-10)
+
+def test_solar_zenith_angle_preserves_float32_and_fills_out():
+    jds = datetime2jd(datetime.datetime(2010,5,29,9,13,30))
+    rs = np.random.RandomState(42)
+    glats = rs.uniform(-90.,90.,20)
+    glons = rs.uniform(-180.,180.,20)
+    expected = solar_zenith_angle(jds,glats,glons)
+    szas = solar_zenith_angle(jds,glats.astype(np.float32),
+                              glons.astype(np.float32))
+    assert szas.dtype == np.float32
+    nptest.assert_allclose(szas,expected,rtol=0.,atol=1e-5)
+    out = np.empty(20)
+    assert solar_zenith_angle(jds,glats,glons,out=out) is out
+    nptest.assert_array_equal(out,expected)
+
+def test_solar_position_almanac_fills_out():
+    jds = datetime2jd(datetime.datetime(2010,5,29,9,13,30))+np.arange(20)/24.
+    expected = solar_position_almanac(jds)
+    out = (np.empty(20,dtype=np.float32),np.empty(20,dtype=np.float32))
+    results = solar_position_almanac(jds,out=out)
+    for result,out_arr,expected_result in zip(results,out,expected):
+        assert result is out_arr
+        nptest.assert_allclose(result,expected_result,rtol=0.,atol=1e-6)
+    chunked = solar_position_almanac(jds,chunksize=7)
+    for result,expected_result in zip(chunked,expected):
+        nptest.assert_array_equal(result,expected_result)
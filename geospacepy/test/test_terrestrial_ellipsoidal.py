@@ -4,7 +4,13 @@ import pytest
 import datetime
 import numpy as np
 import numpy.testing as nptest
-from geospacepy.terrestrial_ellipsoidal import ecef_cart2geodetic
+from geospacepy.terrestrial_ellipsoidal import (ecef_cart2geodetic,
+                                                geodetic2ecef,
+                                                geodetic2geocentric,
+                                                geocentric2geodetic,
+                                                ecef2enu,enu2ecef)
+from geospacepy.terrestrial_spherical import ecef_cart2spherical
+from geospacepy.ellipsoids import WGS84
 
 #Test on Example 3-3 of Vallado
 R_ECEF_3_3 = np.array([6524834.,6862875.,6448296.]).reshape(1,-1)
@@ -41,4 +47,136 @@ def test_ecef_cart2geodetic_on_vallado_example(n_vecs):
     R_ECEF = np.repeat(R_ECEF_3_3,n_vecs,axis=0)
     R_ECEF[0,1]=np.nan
     with pytest.raises(ValueError):
-        ecef_cart2geodetic(R_ECEF)
\ No newline at end of file
+        ecef_cart2geodetic(R_ECEF)
+
+@pytest.mark.parametrize('n_vecs',[1,3])
+def test_vermeille_ecef_cart2geodetic_on_vallado_example(n_vecs):
+    R_ECEF = np.repeat(R_ECEF_3_3,n_vecs,axis=0)
+    gdlats,gclons,h_ellps = ecef_cart2geodetic(R_ECEF,method='vermeille')
+    nptest.assert_allclose(34.352496,gdlats,rtol=0.,atol=1e-6)
+    nptest.assert_allclose(46.4464,gclons,rtol=0.,atol=1e-4)
+    nptest.assert_allclose(5085220,h_ellps,rtol=0.,atol=15)
+
+@pytest.mark.parametrize('altitude',[1.e3,4.e5,8.5e5,3.6e7])
+def test_vermeille_ecef_cart2geodetic_matches_iterative(altitude):
+    rs = np.random.RandomState(42)
+    lats = np.radians(rs.uniform(-90.,90.,1000))
+    lons = np.radians(rs.uniform(-180.,180.,1000))
+    r = 6378137.+altitude
+    R_ECEF = r*np.column_stack((np.cos(lats)*np.cos(lons),
+                                np.cos(lats)*np.sin(lons),
+                                np.sin(lats)))
+    iterative = ecef_cart2geodetic(R_ECEF,tol=1e-14)
+    closed_form = ecef_cart2geodetic(R_ECEF,method='vermeille')
+    nptest.assert_allclose(closed_form[0],iterative[0],rtol=0.,atol=1e-9)
+    nptest.assert_allclose(closed_form[1],iterative[1],rtol=0.,atol=1e-12)
+    #Sub-millimeter agreement in height
+    nptest.assert_allclose(closed_form[2],iterative[2],rtol=0.,atol=1e-4)
+
+def test_ecef_cart2geodetic_reports_convergence_per_position():
+    #A position over the pole converges immediately, Vallado's example
+    #takes several iterations
+    R_ECEF = np.vstack((R_ECEF_3_3,[[0.,0.,7.e6]]))
+    gdlats,gclons,h_ellps,iterations,failed = ecef_cart2geodetic(R_ECEF,
+                                                return_convergence=True)
+    assert not np.any(failed)
+    assert iterations[1] < iterations[0]
+    with pytest.warns(UserWarning):
+        gdlats,gclons,h_ellps,iterations,failed = ecef_cart2geodetic(R_ECEF,
+                                                    maxiters=2,
+                                                    return_convergence=True)
+    nptest.assert_array_equal(failed,[True,False])
+    nptest.assert_array_equal(iterations,[2,1])
+    assert np.isnan(gdlats[0]) and np.isnan(h_ellps[0])
+    nptest.assert_allclose(gdlats[1],90.)
+
+def _random_geodetic(n):
+    rs = np.random.RandomState(42)
+    return (rs.uniform(-90.,90.,n),rs.uniform(-180.,180.,n),
+            rs.uniform(1.e3,3.6e7,n))
+
+@pytest.mark.parametrize('scalar_height',[False,True])
+def test_geodetic2ecef_round_trip(scalar_height):
+    gdlats,glons,h_ellps = _random_geodetic(100)
+    if scalar_height:
+        h_ellps = 8.5e5
+    R_ECEF = geodetic2ecef(gdlats,glons,h_ellps)
+    assert R_ECEF.shape == (100,3)
+    gdlats_out,glons_out,h_ellps_out = ecef_cart2geodetic(R_ECEF,
+                                                        method='vermeille')
+    nptest.assert_allclose(gdlats_out,gdlats,rtol=0.,atol=1e-9)
+    nptest.assert_allclose(glons_out,glons,rtol=0.,atol=1e-9)
+    nptest.assert_allclose(h_ellps_out,h_ellps,rtol=0.,atol=1e-4)
+
+def test_geodetic2ecef_on_vallado_example():
+    R_ECEF = geodetic2ecef(34.352496,46.4464,5085219.)
+    nptest.assert_allclose(R_ECEF,R_ECEF_3_3,rtol=0.,atol=15.)
+
+def test_geodetic2ecef_matches_textbook_formula_in_several_blocks():
+    #More samples than one block, and latitudes close to the poles
+    gdlats,glons,h_ellps = _random_geodetic(40000)
+    gdlats[:4] = [90.,-90.,89.9999999,-89.99999]
+    phis,lams = np.radians(gdlats),np.radians(glons)
+    N = WGS84.a/np.sqrt(1.-WGS84.e2*np.sin(phis)**2)
+    expected = np.column_stack([(N+h_ellps)*np.cos(phis)*np.cos(lams),
+                                (N+h_ellps)*np.cos(phis)*np.sin(lams),
+                                (N*(1.-WGS84.e2)+h_ellps)*np.sin(phis)])
+    nptest.assert_allclose(geodetic2ecef(gdlats,glons,h_ellps),expected,
+                           rtol=0.,atol=1e-7)
+    gclats,rs = geodetic2geocentric(gdlats,h_ellps)
+    gdlats_out,_ = geocentric2geodetic(gclats,rs)
+    nptest.assert_allclose(gdlats_out,gdlats,rtol=0.,atol=1e-9)
+    #A single distance is used for every latitude
+    nptest.assert_allclose(geocentric2geodetic(gclats,7.e6)[1],
+                           geocentric2geodetic(gclats,np.full(40000,7.e6))[1],
+                           rtol=0.,atol=1e-6)
+
+def test_geodetic_geocentric_round_trip():
+    gdlats,glons,h_ellps = _random_geodetic(100)
+    gclats,rs = geodetic2geocentric(gdlats,h_ellps)
+    expected_gclats,_,expected_rs = ecef_cart2spherical(geodetic2ecef(gdlats,
+                                                                      glons,
+                                                                      h_ellps))
+    nptest.assert_allclose(gclats,expected_gclats,rtol=0.,atol=1e-9)
+    nptest.assert_allclose(rs,expected_rs,rtol=0.,atol=1e-4)
+    gdlats_out,h_ellps_out = geocentric2geodetic(gclats,rs)
+    nptest.assert_allclose(gdlats_out,gdlats,rtol=0.,atol=1e-9)
+    nptest.assert_allclose(h_ellps_out,h_ellps,rtol=0.,atol=1e-4)
+
+def test_geocentric2geodetic_on_surface():
+    gdlats = np.linspace(-90.,90.,19)
+    gclats,rs = geodetic2geocentric(gdlats,0.)
+    nptest.assert_allclose(geocentric2geodetic(gclats)[0],gdlats,
+                           rtol=0.,atol=1e-9)
+
+def test_geodetic_enu_up_is_normal_to_ellipsoid():
+    gdlats,glons,h_ellps = _random_geodetic(10)
+    R_up = enu2ecef(np.tile([[0.,0.,1.]],(10,1)),gdlats,glons)
+    expected = geodetic2ecef(gdlats,glons,h_ellps+1.)-geodetic2ecef(gdlats,
+                                                                    glons,
+                                                                    h_ellps)
+    nptest.assert_allclose(R_up,expected,rtol=0.,atol=1e-6)
+    nptest.assert_allclose(ecef2enu(R_up,gdlats,glons)[:,2],1.,
+                           rtol=0.,atol=1e-12)
+
+def test_geodetic_conversions_preserve_float32_and_fill_out():
+    gdlats,glons,h_ellps = [arr.astype(np.float32) for arr in _random_geodetic(50)]
+    R_ECEF = geodetic2ecef(gdlats,glons,h_ellps)
+    assert R_ECEF.dtype == np.float32
+    out = tuple([np.empty(50,dtype=np.float32) for i in range(3)])
+    results = ecef_cart2geodetic(R_ECEF,method='vermeille',out=out)
+    for result,expected,atol in zip(results,(gdlats,glons,h_ellps),(1e-4,1e-4,2.)):
+        assert result.dtype == np.float32
+        nptest.assert_allclose(result,expected,rtol=0.,atol=atol)
+    assert results[0] is out[0]
+    gclats,rs = geodetic2geocentric(gdlats,h_ellps)
+    assert gclats.dtype == np.float32 and rs.dtype == np.float32
+
+@pytest.mark.parametrize('method',['vallado','vermeille'])
+def test_ecef_cart2geodetic_in_chunks(method):
+    R_ECEF = geodetic2ecef(*_random_geodetic(100))
+    expected = ecef_cart2geodetic(R_ECEF,method=method,return_convergence=True)
+    results = ecef_cart2geodetic(R_ECEF,method=method,return_convergence=True,
+                                 chunksize=30,workers=2)
+    for result,expected_result in zip(results,expected):
+        nptest.assert_array_equal(result,expected_result)
@@ -5,12 +5,17 @@ import datetime
 import numpy as np
 import numpy.testing as nptest
 from geospacepy.special_datetime import datetime2jd
+from geospacepy.array_management import ArrayCache
 from geospacepy.terrestrial_spherical import (eci2ecef,ecef2eci,
                                             ecef_cart2spherical,ecef_spherical2cart,
-                                            ecef2enu,enu2ecef)
+                                            ecef2enu,enu2ecef,
+                                            ECIECEFTransform,R_EARTH)
 
 example_jd = datetime2jd(datetime.datetime(2010,5,29,9,13,30))
 
+def test_earth_radius_constant():
+    assert R_EARTH == 6371200.
+
 def _example_vector(x,y,z,n_vectors):
     """Makes a shape=(n_vector,3) array out of floats x,y,z"""
     R = np.array([x,y,z]).reshape(1,3)    
@@ -33,6 +38,13 @@ def test_ecef_cart_spherical_round_trip(n_vectors):
     R_ECEF_out = ecef_spherical2cart(lats,lons,rs)
     nptest.assert_allclose(R_ECEF_in,R_ECEF_out,atol=1e-8,rtol=0.)
 
+def test_ecef_spherical2cart_all_scalar_inputs():
+    R_ECEF = ecef_spherical2cart(10.,20.,7.e6)
+    assert R_ECEF.shape == (1,3)
+    lats,lons,rs = ecef_cart2spherical(R_ECEF)
+    nptest.assert_allclose([lats[0],lons[0],rs[0]],[10.,20.,7.e6],
+                           atol=1e-8,rtol=0.)
+
 @pytest.mark.parametrize('n_vectors,latlon_shape',[(1,1),
                                                    (4,1),
                                                    (4,(4,)),
@@ -49,3 +61,63 @@ def test_ecef_enu_round_trip(n_vectors,latlon_shape):
     R_ECEF_out = enu2ecef(R_ENU,lats,lons)
     nptest.assert_allclose(R_ECEF_in,R_ECEF_out,atol=1e-8,rtol=0.)
 
+def test_eci_ecef_accept_timeline():
+    from geospacepy.special_datetime import Timeline
+    timeline = Timeline.from_jd(np.full((4,),example_jd))
+    R_ECI_in = _example_vector(1.,0.,0.,4)
+    nptest.assert_allclose(eci2ecef(R_ECI_in,timeline),
+                           eci2ecef(R_ECI_in,example_jd),
+                           atol=1e-8,rtol=0.)
+
+@pytest.mark.parametrize('n_vectors,jds',[(1,example_jd),
+                                          (4,example_jd),
+                                          (4,example_jd+np.arange(4)/24.)])
+def test_eci_ecef_transform_matches_functions(n_vectors,jds):
+    R_1 = _example_vector(1.,2.,3.,n_vectors)
+    R_2 = _example_vector(-3.,.5,1.,n_vectors)
+    transform = ECIECEFTransform(jds)
+    R_ECEF_1,R_ECEF_2 = transform.to_ecef(R_1,R_2)
+    nptest.assert_allclose(R_ECEF_1,eci2ecef(R_1,jds),atol=1e-8,rtol=0.)
+    nptest.assert_allclose(R_ECEF_2,eci2ecef(R_2,jds),atol=1e-8,rtol=0.)
+    nptest.assert_allclose(transform.to_eci(R_1),ecef2eci(R_1,jds),
+                           atol=1e-8,rtol=0.)
+
+@pytest.mark.parametrize('by',['identity','contents'])
+def test_eci_ecef_transform_cache(by):
+    jds = example_jd+np.arange(4)/24.
+    cache = ArrayCache(maxsize=1,by=by)
+    transform = ECIECEFTransform.cached(jds,cache)
+    assert len(cache) == 1
+    assert ECIECEFTransform.cached(jds,cache) is transform
+    same_contents_is_cached = by == 'contents'
+    assert (ECIECEFTransform.cached(jds.copy(),cache) is transform) \
+                == same_contents_is_cached
+    cache.clear()
+    assert ECIECEFTransform.cached(jds,cache) is not transform
+
+def test_spherical_conversions_preserve_float32_and_fill_out():
+    rs = np.random.RandomState(42)
+    lats = rs.uniform(-90.,90.,20).astype(np.float32)
+    lons = rs.uniform(-180.,180.,20).astype(np.float32)
+    R_ECEF = ecef_spherical2cart(lats,lons,7.e6)
+    assert R_ECEF.dtype == np.float32
+    out = (np.empty(20,dtype=np.float32),np.empty(20,dtype=np.float32),
+           np.empty(20,dtype=np.float32))
+    lats_out,lons_out,rs_out = ecef_cart2spherical(R_ECEF,out=out)
+    assert lats_out is out[0] and rs_out is out[2]
+    nptest.assert_allclose(lats_out,lats,rtol=0.,atol=1e-3)
+    nptest.assert_allclose(lons_out,lons,rtol=0.,atol=1e-3)
+    R_ENU = ecef2enu(R_ECEF,lats,lons)
+    assert R_ENU.dtype == np.float32
+    enu2ecef(R_ENU,lats,lons,out=R_ENU)
+    nptest.assert_allclose(R_ENU,R_ECEF,rtol=0.,atol=2.)
+
+def test_eci_ecef_out_in_place():
+    R_ECEF = _example_vector(-1033.4793830,7901.2952754,6380.3565958,5)
+    expected = ecef2eci(R_ECEF,example_jd)
+    transform = ECIECEFTransform(example_jd)
+    R_ECEF_copy = R_ECEF.copy()
+    assert transform.to_eci(R_ECEF_copy,out=R_ECEF_copy) is R_ECEF_copy
+    nptest.assert_allclose(R_ECEF_copy,expected,rtol=0.,atol=1e-9)
+    assert eci2ecef(expected,example_jd,out=expected) is expected
+    nptest.assert_allclose(expected,R_ECEF,rtol=0.,atol=1e-9)
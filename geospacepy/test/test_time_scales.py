@@ -0,0 +1,82 @@
+# (C) 2020 University of Colorado AES-CCAR-SEDA (Space Environment Data Analysis) Group
+# Written by Liam M. Kilcommons
+import pytest
+import datetime
+import numpy as np
+import numpy.testing as nptest
+from geospacepy.special_datetime import Timeline
+from geospacepy import time_scales
+
+def _seconds(timedelta64s):
+    return timedelta64s/np.timedelta64(1,'s')
+
+@pytest.mark.parametrize('utc,expected_tai_minus_utc',[('1980-06-01T00:00:00',19.),
+                                                       ('2016-12-31T23:59:59',36.),
+                                                       ('2017-01-01T00:00:00',37.),
+                                                       ('2020-01-01T00:00:00',37.)])
+def test_utc_to_tai_uses_leap_seconds(utc,expected_tai_minus_utc):
+    dt64s = np.array([utc],dtype='datetime64[us]')
+    tais = time_scales.utc2tai(dt64s)
+    nptest.assert_allclose(_seconds(tais-dt64s),expected_tai_minus_utc)
+    nptest.assert_array_equal(time_scales.tai2utc(tais),dt64s)
+
+@pytest.mark.parametrize('unit',['us','ns'])
+def test_utc_tt_round_trip(unit):
+    dt64s = np.datetime64('2010-05-29T09:13:30',unit)+np.arange(100)*np.timedelta64(1,'h')
+    tts = time_scales.convert_time_scale(dt64s,'UTC','TT')
+    assert tts.dtype == dt64s.dtype
+    nptest.assert_allclose(_seconds(tts-dt64s),34.+32.184)
+    nptest.assert_array_equal(time_scales.convert_time_scale(tts,'TT','UTC'),dt64s)
+
+@pytest.fixture
+def dut1_table_file(tmp_path):
+    """UT1-UTC table spanning the 2016 leap second (MJD 57754 is 2017-01-01)"""
+    table = ['# MJD UT1-UTC',
+             '57752 0.4000',
+             '57753 0.3990',
+             '57754 1.3980',
+             '57755 1.3970']
+    filename = tmp_path/'dut1.txt'
+    filename.write_text('\n'.join(table)+'\n')
+    yield str(filename)
+    time_scales._dut1_table = None
+
+def test_utc_to_ut1_interpolates_across_leap_second(dut1_table_file):
+    time_scales.load_dut1_table(dut1_table_file)
+    dt64s = np.array(['2016-12-31T12:00:00','2017-01-01T00:00:00',
+                      '2017-01-01T12:00:00'],dtype='datetime64[us]')
+    dut1s = time_scales.ut1_minus_utc(dt64s)
+    #UT1-TAI is interpolated, so half a day before the leap second
+    #UT1-UTC is the average of the tabulated values as UT1-TAI
+    nptest.assert_allclose(dut1s,[.3985,1.398,1.3975],atol=1e-9)
+    ut1s = time_scales.utc2ut1(dt64s)
+    nptest.assert_array_equal(time_scales.ut12utc(ut1s),dt64s)
+
+def test_utc_to_ut1_accepts_timeline(dut1_table_file):
+    time_scales.load_dut1_table(dut1_table_file)
+    dts = [datetime.datetime(2017,1,1,12)]
+    timeline_ut1 = time_scales.utc2ut1(Timeline.from_datetimes(dts))
+    assert isinstance(timeline_ut1,Timeline)
+    nptest.assert_allclose(_seconds(timeline_ut1.datetime64
+                                    -np.array(dts,dtype='datetime64[ns]')),
+                           1.3975,atol=1e-9)
+
+def test_utc_to_ut1_warns_outside_table(dut1_table_file,recwarn):
+    time_scales.load_dut1_table(dut1_table_file)
+    inside = np.array(['2017-01-01T12:00:00','NaT'],dtype='datetime64[us]')
+    time_scales.utc2ut1(inside)
+    time_scales.ut12utc(inside)
+    assert len(recwarn) == 0
+    for outside in ['2016-12-29T00:00:00','2017-01-05T00:00:00']:
+        dt64s = np.array([outside],dtype='datetime64[us]')
+        with pytest.warns(UserWarning,match='outside the UT1-UTC table'):
+            dut1s = time_scales.ut1_minus_utc(dt64s)
+        #The nearest table entry is used
+        nptest.assert_allclose(dut1s,.4 if outside < '2017' else 1.397,atol=1e-9)
+        with pytest.warns(UserWarning,match='outside the UT1-UTC table'):
+            time_scales.utc2ut1(dt64s)
+
+def test_utc_to_ut1_warns_without_table():
+    time_scales._dut1_table = None
+    with pytest.warns(UserWarning):
+        time_scales.utc2ut1(np.array(['2017-01-01'],dtype='datetime64[us]'))
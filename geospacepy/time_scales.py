@@ -0,0 +1,383 @@
+# (C) 2020 University of Colorado AES-CCAR-SEDA (Space Environment Data Analysis) Group
+# Written by Liam M. Kilcommons
+import numpy as np
+from warnings import warn
+from geospacepy.special_datetime import datetimearr2datetime64,Timeline
+
+#Leap seconds (IERS Bulletin C). Dates (UTC) from which TAI-UTC
+#has each value (in seconds). Before 1972 UTC was not kept within
+#whole seconds of TAI, so those times use the 1972 value
+_LEAP_SECOND_DATES = np.array(['1972-01-01','1972-07-01','1973-01-01',
+                               '1974-01-01','1975-01-01','1976-01-01',
+                               '1977-01-01','1978-01-01','1979-01-01',
+                               '1980-01-01','1981-07-01','1982-07-01',
+                               '1983-07-01','1985-07-01','1988-01-01',
+                               '1990-01-01','1991-01-01','1992-07-01',
+                               '1993-07-01','1994-07-01','1996-01-01',
+                               '1997-07-01','1999-01-01','2006-01-01',
+                               '2009-01-01','2012-07-01','2015-07-01',
+                               '2017-01-01'],dtype='datetime64[D]')
+_TAI_MINUS_UTC = np.arange(10,38,dtype=np.int64)
+
+#TT-TAI (seconds), exactly
+TT_MINUS_TAI = 32.184
+
+#MJD of the datetime64 (UNIX) epoch
+_MJD_UNIX_EPOCH = 40587.
+
+#Table of UT1-UTC (set with load_dut1_table or set_dut1_table)
+_dut1_table = None
+
+def _time_ticks(dt64s):
+    """Integer ticks since the UNIX epoch, ticks per second and
+    NaT mask of an array of datetime64 (or Python datetimes)"""
+    dt64s = datetimearr2datetime64(dt64s)
+    unit,count = np.datetime_data(dt64s.dtype)
+    ticks_per_second = 10**9 if unit == 'ns' else 10**6
+    return dt64s.view(np.int64),ticks_per_second,np.isnat(dt64s)
+
+def _ticks2datetime64(ticks,ticks_per_second,nat):
+    unit = 'ns' if ticks_per_second == 10**9 else 'us'
+    ticks = np.where(nat,np.iinfo(np.int64).min,ticks)
+    return ticks.view('datetime64[{}]'.format(unit))
+
+def _leap_second_ticks(ticks_per_second):
+    return _LEAP_SECOND_DATES.view(np.int64)*(86400*ticks_per_second)
+
+def _tai_minus_utc_at_utc_ticks(ticks,ticks_per_second):
+    """TAI-UTC (integer seconds) for UTC integer ticks"""
+    i_leap = np.searchsorted(_leap_second_ticks(ticks_per_second),ticks,
+                             side='right')-1
+    return _TAI_MINUS_UTC[np.clip(i_leap,0,None)]
+
+def _tai_minus_utc_at_tai_ticks(ticks,ticks_per_second):
+    """TAI-UTC (integer seconds) for TAI integer ticks"""
+    leap_ticks_tai = (_leap_second_ticks(ticks_per_second)
+                      +_TAI_MINUS_UTC*ticks_per_second)
+    i_leap = np.searchsorted(leap_ticks_tai,ticks,side='right')-1
+    return _TAI_MINUS_UTC[np.clip(i_leap,0,None)]
+
+def _map_times(times,ticks_func):
+    """Apply a function (ticks,ticks_per_second)->ticks to times,
+    which can be an array or list of datetimes, or a Timeline"""
+    if isinstance(times,Timeline):
+        return Timeline.from_datetimes(_map_times(times.datetime64,ticks_func))
+    ticks,ticks_per_second,nat = _time_ticks(times)
+    return _ticks2datetime64(ticks_func(ticks,ticks_per_second),
+                             ticks_per_second,nat)
+
+def tai_minus_utc(dt64s):
+    """Difference between International Atomic Time (TAI) and
+    Coordinated Universal Time (UTC) from the table of leap seconds
+
+    Parameters
+    ----------
+    dt64s : np.ndarray or list
+        UTC times (datetime64 or Python datetimes)
+
+    Returns
+    -------
+    dat : np.ndarray
+        TAI-UTC in seconds
+    """
+    ticks,ticks_per_second,nat = _time_ticks(dt64s)
+    dat = _tai_minus_utc_at_utc_ticks(ticks,ticks_per_second).astype(float)
+    dat[nat] = np.nan
+    return dat
+
+def utc2tai(times):
+    """Coordinated Universal Time (UTC) to International Atomic Time (TAI)
+
+    Parameters
+    ----------
+    times : np.ndarray or list or special_datetime.Timeline
+        UTC times (datetime64 or Python datetimes, or a Timeline)
+
+    Returns
+    -------
+    times_tai : np.ndarray or special_datetime.Timeline
+        TAI times (datetime64 with the same resolution as the input
+        (microseconds for Python datetimes), or a Timeline)
+    """
+    return _map_times(times,lambda ticks,tps : ticks
+                            +_tai_minus_utc_at_utc_ticks(ticks,tps)*tps)
+
+def tai2utc(times):
+    """International Atomic Time (TAI) to Coordinated Universal Time (UTC)
+
+    Parameters
+    ----------
+    times : np.ndarray or list or special_datetime.Timeline
+        TAI times (datetime64 or Python datetimes, or a Timeline)
+
+    Returns
+    -------
+    times_utc : np.ndarray or special_datetime.Timeline
+        UTC times
+
+    .. note::
+
+        Times during a leap second can not be represented
+        in UTC (datetime64 has no 60th second), they are mapped to
+        the first second after the leap second
+    """
+    return _map_times(times,lambda ticks,tps : ticks
+                            -_tai_minus_utc_at_tai_ticks(ticks,tps)*tps)
+
+def tai2tt(times):
+    """International Atomic Time (TAI) to Terrestrial Time (TT)
+
+    Parameters
+    ----------
+    times : np.ndarray or list or special_datetime.Timeline
+        TAI times (datetime64 or Python datetimes, or a Timeline)
+
+    Returns
+    -------
+    times_tt : np.ndarray or special_datetime.Timeline
+        TT times
+    """
+    return _map_times(times,lambda ticks,tps : ticks
+                                +int(round(TT_MINUS_TAI*tps)))
+
+def tt2tai(times):
+    """Terrestrial Time (TT) to International Atomic Time (TAI)
+
+    Parameters
+    ----------
+    times : np.ndarray or list or special_datetime.Timeline
+        TT times (datetime64 or Python datetimes, or a Timeline)
+
+    Returns
+    -------
+    times_tai : np.ndarray or special_datetime.Timeline
+        TAI times
+    """
+    return _map_times(times,lambda ticks,tps : ticks
+                                -int(round(TT_MINUS_TAI*tps)))
+
+def utc2tt(times):
+    """Coordinated Universal Time (UTC) to Terrestrial Time (TT)
+
+    Parameters
+    ----------
+    times : np.ndarray or list or special_datetime.Timeline
+        UTC times (datetime64 or Python datetimes, or a Timeline)
+
+    Returns
+    -------
+    times_tt : np.ndarray or special_datetime.Timeline
+        TT times
+    """
+    return tai2tt(utc2tai(times))
+
+def tt2utc(times):
+    """Terrestrial Time (TT) to Coordinated Universal Time (UTC)
+
+    Parameters
+    ----------
+    times : np.ndarray or list or special_datetime.Timeline
+        TT times (datetime64 or Python datetimes, or a Timeline)
+
+    Returns
+    -------
+    times_utc : np.ndarray or special_datetime.Timeline
+        UTC times
+    """
+    return tai2utc(tt2tai(times))
+
+def set_dut1_table(mjds,dut1s):
+    """Set the table of UT1-UTC values used by utc2ut1 and ut12utc
+
+    Parameters
+    ----------
+    mjds : np.ndarray
+        Modified julian dates (UTC) of the table entries
+    dut1s : np.ndarray
+        UT1-UTC (seconds) at each MJD
+    """
+    global _dut1_table
+    _dut1_table = _dut1_table_from_arrays(mjds,dut1s)
+
+def _dut1_table_from_arrays(mjds,dut1s):
+    mjds = np.asarray(mjds,dtype=float).flatten()
+    dut1s = np.asarray(dut1s,dtype=float).flatten()
+    if mjds.size != dut1s.size or mjds.size == 0:
+        raise ValueError(('UT1-UTC table must have the same (non-zero) '
+                          +'number of MJDs ({}) '.format(mjds.size)
+                          +'and UT1-UTC values ({})'.format(dut1s.size)))
+    order = np.argsort(mjds)
+    mjds,dut1s = mjds[order],dut1s[order]
+    #UT1-UTC jumps by one second at each leap second, but UT1-TAI
+    #is continuous, so interpolate that instead
+    ticks = np.rint((mjds-_MJD_UNIX_EPOCH)*86400e6).astype(np.int64)
+    ut1_minus_tai = dut1s-_tai_minus_utc_at_utc_ticks(ticks,10**6)
+    return mjds,ut1_minus_tai
+
+def load_dut1_table(filename,fmt='auto'):
+    """Load a table of UT1-UTC values from a local file, and use
+    it for utc2ut1 and ut12utc
+
+    Parameters
+    ----------
+    filename : str
+        Path to the table file
+    fmt : str, optional
+        'columns' for a whitespace delimited file with columns MJD and
+        UT1-UTC (seconds) (lines starting with # are comments),
+        'finals' for the IERS finals.all / finals2000A.all fixed
+        width format (Bulletin A values),
+        or 'auto' (default) to choose based on the line length
+
+    Returns
+    -------
+    mjds : np.ndarray
+        Modified julian dates of the table entries
+    dut1s : np.ndarray
+        UT1-UTC (seconds) at each MJD
+    """
+    with open(filename,'r') as f:
+        lines = [line.rstrip('\n') for line in f
+                 if line.strip() and not line.startswith('#')]
+    if fmt == 'auto':
+        fmt = 'finals' if len(lines[0]) >= 68 else 'columns'
+
+    if fmt == 'columns':
+        table = np.array([line.split()[:2] for line in lines],dtype=float)
+        mjds,dut1s = table[:,0],table[:,1]
+    elif fmt == 'finals':
+        #MJD in columns 8-15, UT1-UTC in columns 59-68 (blank if
+        #no value is available yet)
+        rows = [(line[7:15],line[58:68]) for line in lines
+                if len(line) >= 68 and line[58:68].strip()]
+        table = np.array(rows,dtype=float)
+        mjds,dut1s = table[:,0],table[:,1]
+    else:
+        raise ValueError(('Invalid table format {},'.format(fmt)
+                          +' valid values are auto, columns, finals'))
+    set_dut1_table(mjds,dut1s)
+    return mjds,dut1s
+
+def _ut1_minus_utc_at_utc_ticks(ticks,ticks_per_second,nat=None):
+    """UT1-UTC (float seconds) for UTC integer ticks, interpolated
+    from the UT1-UTC table (zero if no table has been loaded). Times
+    outside the table get the UT1-UTC of the first or last entry,
+    with a warning (nat is the NaT mask of the times, which are not
+    checked, by default ticks equal to the NaT value)"""
+    dat = _tai_minus_utc_at_utc_ticks(ticks,ticks_per_second)
+    if _dut1_table is None:
+        warn(('No UT1-UTC table loaded (see load_dut1_table), '
+              +'UT1 is assumed to be equal to UTC'),UserWarning)
+        return np.zeros(ticks.shape)
+    table_mjds,table_ut1_minus_tai = _dut1_table
+    mjds = ticks/(86400.*ticks_per_second)+_MJD_UNIX_EPOCH
+    if nat is None:
+        nat = ticks == np.iinfo(np.int64).min
+    outside = ((mjds < table_mjds[0]) | (mjds > table_mjds[-1])) & ~nat
+    if np.any(outside):
+        warn(('{} times are outside the UT1-UTC table '.format(np.count_nonzero(outside))
+              +'(MJD {} to {}), '.format(table_mjds[0],table_mjds[-1])
+              +'the UT1-UTC of the nearest table entry is used '
+              +'(load a more recent table with load_dut1_table)'),UserWarning)
+    return np.interp(mjds,table_mjds,table_ut1_minus_tai)+dat
+
+def ut1_minus_utc(dt64s):
+    """UT1-UTC, interpolated from the table loaded with
+    load_dut1_table (or set with set_dut1_table)
+
+    Parameters
+    ----------
+    dt64s : np.ndarray or list
+        UTC times (datetime64 or Python datetimes)
+
+    Returns
+    -------
+    dut1 : np.ndarray
+        UT1-UTC in seconds
+    """
+    ticks,ticks_per_second,nat = _time_ticks(dt64s)
+    dut1 = _ut1_minus_utc_at_utc_ticks(ticks,ticks_per_second,nat)
+    dut1[nat] = np.nan
+    return dut1
+
+def utc2ut1(times):
+    """Coordinated Universal Time (UTC) to Universal Time (UT1),
+    the time system based on earth's rotation,
+    using the table loaded with load_dut1_table
+
+    Parameters
+    ----------
+    times : np.ndarray or list or special_datetime.Timeline
+        UTC times (datetime64 or Python datetimes, or a Timeline)
+
+    Returns
+    -------
+    times_ut1 : np.ndarray or special_datetime.Timeline
+        UT1 times
+    """
+    def ticks_func(ticks,tps):
+        dut1 = _ut1_minus_utc_at_utc_ticks(ticks,tps)
+        return ticks+np.rint(dut1*tps).astype(np.int64)
+    return _map_times(times,ticks_func)
+
+def ut12utc(times):
+    """Universal Time (UT1) to Coordinated Universal Time (UTC),
+    using the table loaded with load_dut1_table
+
+    Parameters
+    ----------
+    times : np.ndarray or list or special_datetime.Timeline
+        UT1 times (datetime64 or Python datetimes, or a Timeline)
+
+    Returns
+    -------
+    times_utc : np.ndarray or special_datetime.Timeline
+        UTC times
+    """
+    def ticks_func(ticks,tps):
+        #UT1-UTC changes slowly, so evaluating it at the UTC
+        #time estimated using the UT1 time is sufficient
+        nat = ticks == np.iinfo(np.int64).min
+        dut1 = _ut1_minus_utc_at_utc_ticks(ticks,tps,nat)
+        utc_ticks = ticks-np.rint(dut1*tps).astype(np.int64)
+        dut1 = _ut1_minus_utc_at_utc_ticks(utc_ticks,tps,nat)
+        return ticks-np.rint(dut1*tps).astype(np.int64)
+    return _map_times(times,ticks_func)
+
+def convert_time_scale(times,from_scale,to_scale):
+    """Convert times between any two of the time scales
+    UTC, TAI, TT and UT1
+
+    Parameters
+    ----------
+    times : np.ndarray or list or special_datetime.Timeline
+        Times (datetime64 or Python datetimes, or a Timeline)
+    from_scale : str
+        Time scale of times ('utc','tai','tt' or 'ut1')
+    to_scale : str
+        Time scale to convert to ('utc','tai','tt' or 'ut1')
+
+    Returns
+    -------
+    converted_times : np.ndarray or special_datetime.Timeline
+        Times in to_scale
+    """
+    #Every scale is connected to the others through TAI (and UT1 through UTC)
+    to_tai = {'tai':[],'utc':[utc2tai],'tt':[tt2tai],'ut1':[ut12utc,utc2tai]}
+    from_tai = {'tai':[],'utc':[tai2utc],'tt':[tai2tt],'ut1':[tai2utc,utc2ut1]}
+    from_scale,to_scale = from_scale.lower(),to_scale.lower()
+    for scale in (from_scale,to_scale):
+        if scale not in to_tai:
+            raise ValueError(('Invalid time scale {},'.format(scale)
+                              +' valid values are {}'.format(list(to_tai.keys()))))
+    if from_scale == to_scale:
+        return times
+    if (from_scale,to_scale) == ('utc','ut1'):
+        conversions = [utc2ut1]
+    elif (from_scale,to_scale) == ('ut1','utc'):
+        conversions = [ut12utc]
+    else:
+        conversions = to_tai[from_scale]+from_tai[to_scale]
+    for conversion in conversions:
+        times = conversion(times)
+    return times